@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import DailyMetric
+
+@admin.register(DailyMetric)
+class DailyMetricAdmin(admin.ModelAdmin):
+    list_display = ('day', 'metric', 'dimension', 'value', 'updated_at')
+    list_filter = ('metric',)
+    date_hierarchy = 'day'
@@ -0,0 +1,24 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from analytics.services.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "بازسازی شاخص‌های روزانه (خرید، درآمد، اشتراک جدید، ریزش، تشخیص و چت) یک بازه از جدول‌های اصلی و تنظیم "
+        "مقدار امروز شاخص‌های لحظه‌ای؛ برای backfill پس از استقرار یا اصلاح اختلاف."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="تعداد روزهای گذشته تا امروز")
+        parser.add_argument('--start', type=date.fromisoformat, help="شروع بازه (YYYY-MM-DD)؛ به جای --days")
+        parser.add_argument('--end', type=date.fromisoformat, help="پایان بازه (پیش‌فرض امروز)")
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - timedelta(days=options['days'] - 1)
+        rows = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f"✅ {rows} ردیف شاخص روزانه برای {start} تا {end} بازسازی شد."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:52
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_gauges(apps, schema_editor):
+    # شاخص‌های لحظه‌ای از امروز به صورت افزایشی به‌روز می‌شوند؛ مقدار شروع یک بار از جدول‌های اصلی شمرده می‌شود.
+    # سابقه روزهای قبل با دستور rebuild_daily_metrics ساخته می‌شود
+    DailyMetric = apps.get_model('analytics', 'DailyMetric')
+    Subscription = apps.get_model('subscription', 'Subscription')
+    PaymentHistory = apps.get_model('subscription', 'PaymentHistory')
+    today = timezone.localdate()
+    DailyMetric.objects.bulk_create([
+        DailyMetric(day=today, metric='active_subscriptions', value=Subscription.objects.filter(is_active=True).count()),
+        DailyMetric(day=today, metric='purchases_total', value=PaymentHistory.objects.filter(is_successful=True).count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('subscription', '0008_notification_dedup_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(max_length=40)),
+                ('dimension', models.CharField(blank=True, default='', max_length=50)),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'dimension', 'day'), name='daily_metric_unique')],
+            },
+        ),
+        migrations.RunPython(seed_gauges, migrations.RunPython.noop),
+    ]
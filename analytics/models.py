@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class DailyMetric(models.Model):  # مقدار تجمیعی روزانه هر شاخص (به تفکیک پلن یا دسته)؛ به صورت افزایشی با سیگنال‌ها به‌روز می‌شود
+    PURCHASES = 'purchases'
+    REVENUE = 'revenue'
+    NEW_SUBSCRIPTIONS = 'new_subscriptions'
+    CHURNED_SUBSCRIPTIONS = 'churned_subscriptions'
+    DIAGNOSES = 'diagnoses'
+    CHAT_MESSAGES = 'chat_messages'
+    # شاخص‌های لحظه‌ای (gauge): مقدار ردیف هر روز وضعیت پایان همان روز است و روزهای بدون تغییر ردیف ندارند
+    ACTIVE_SUBSCRIPTIONS = 'active_subscriptions'
+    PURCHASES_TOTAL = 'purchases_total'
+
+    COUNTERS = (PURCHASES, REVENUE, NEW_SUBSCRIPTIONS, CHURNED_SUBSCRIPTIONS, DIAGNOSES, CHAT_MESSAGES)
+    GAUGES = (ACTIVE_SUBSCRIPTIONS, PURCHASES_TOTAL)
+
+    day = models.DateField()
+    metric = models.CharField(max_length=40)
+    dimension = models.CharField(max_length=50, blank=True, default='')  # شناسه پلن یا دسته تشخیص
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # بازه زمانی یک شاخص و آخرین مقدار gauge با همین ایندکس خوانده می‌شوند
+            models.UniqueConstraint(fields=['metric', 'dimension', 'day'], name='daily_metric_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.metric}[{self.dimension}] = {self.value}'
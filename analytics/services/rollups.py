@@ -0,0 +1,173 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from analytics.models import DailyMetric
+
+
+def dimension_key(dimension):
+    return '' if dimension is None else str(dimension)
+
+
+# ======================================================
+# به‌روزرسانی افزایشی
+def increment(metric, amount=1, dimension='', day=None):
+    """افزودن amount به شاخص شمارشی روز؛ یک UPDATE و فقط برای اولین رویداد روز یک INSERT"""
+    if not amount:
+        return
+    day = day or timezone.localdate()
+    dimension = dimension_key(dimension)
+    rows = DailyMetric.objects.filter(metric=metric, dimension=dimension, day=day)
+    if rows.update(value=F('value') + amount):
+        return
+    try:
+        with transaction.atomic():
+            DailyMetric.objects.create(metric=metric, dimension=dimension, day=day, value=amount)
+    except IntegrityError:  # درخواست همزمان دیگری ردیف روز را ساخت
+        rows.update(value=F('value') + amount)
+
+
+def adjust_gauge(metric, delta, dimension='', day=None):
+    """تغییر شاخص لحظه‌ای؛ ردیف اول هر روز از آخرین مقدار روزهای قبل ادامه پیدا می‌کند"""
+    if not delta:
+        return
+    day = day or timezone.localdate()
+    dimension = dimension_key(dimension)
+    rows = DailyMetric.objects.filter(metric=metric, dimension=dimension, day=day)
+    if rows.update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            DailyMetric.objects.create(
+                metric=metric, dimension=dimension, day=day, value=gauge_value(metric, dimension, day) + delta,
+            )
+    except IntegrityError:
+        rows.update(value=F('value') + delta)
+
+
+def record_on_commit(func, *args, **kwargs):
+    # شاخص‌ها پس از commit به‌روز می‌شوند: تراکنش برگشت‌خورده شمرده نمی‌شود و قفل ردیف روز در تراکنش اصلی نگه داشته نمی‌شود
+    transaction.on_commit(lambda: func(*args, **kwargs))
+
+
+# ======================================================
+# خواندن
+def gauge_value(metric, dimension='', day=None):
+    """مقدار شاخص لحظه‌ای در پایان روز day (یا آخرین مقدار)؛ یک کوئری روی ایندکس (metric, dimension, day)"""
+    rows = DailyMetric.objects.filter(metric=metric, dimension=dimension_key(dimension))
+    if day is not None:
+        rows = rows.filter(day__lte=day)
+    return rows.order_by('-day').values_list('value', flat=True).first() or 0
+
+
+def series(metric, start, end, dimension=None):
+    """
+    مقادیر روزانه یک شاخص در بازه [start, end] به صورت {dimension: [(day, value), ...]}.
+    برای شاخص شمارشی روزهای بدون رویداد صفر هستند؛ برای شاخص لحظه‌ای مقدار آخرین روز قبلی ادامه پیدا می‌کند.
+    """
+    rows = DailyMetric.objects.filter(metric=metric, day__gte=start, day__lte=end)
+    if dimension is not None:
+        rows = rows.filter(dimension=dimension_key(dimension))
+    values = defaultdict(dict)
+    for day, dim, value in rows.values_list('day', 'dimension', 'value'):
+        values[dim][day] = value
+
+    carried = {}
+    if metric in DailyMetric.GAUGES:
+        dimensions = [dimension_key(dimension)] if dimension is not None else (
+            DailyMetric.objects.filter(metric=metric, day__lte=end).values_list('dimension', flat=True).distinct()
+        )
+        for dim in dimensions:
+            carried[dim] = gauge_value(metric, dim, start - timedelta(days=1))
+            values.setdefault(dim, {})
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    result = {}
+    for dim, by_day in values.items():
+        last = carried.get(dim, 0)
+        points = []
+        for day in days:
+            if day in by_day:
+                last = by_day[day]
+            points.append((day, by_day.get(day, last if metric in DailyMetric.GAUGES else 0)))
+        result[dim] = points
+    return result
+
+
+# ======================================================
+# بازسازی از جدول‌های اصلی (backfill یا اصلاح اختلاف)
+def day_bounds(start, end):
+    tz = timezone.get_current_timezone()
+    return (timezone.make_aware(datetime.combine(start, datetime.min.time()), tz),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz))
+
+
+def raw_counters(start, end):
+    """شاخص‌های شمارشی بازه با GROUP BY روی جدول‌های اصلی: {(metric, dimension, day): value}"""
+    from chat.models import Message
+    from plants.models import PlantDiagnosis
+    from subscription.models import PaymentHistory, Subscription
+
+    since, until = day_bounds(start, end)
+    counters = {}
+
+    payments = (
+        PaymentHistory.objects.filter(is_successful=True, created_at__gte=since, created_at__lt=until)
+        .annotate(day=TruncDate('created_at')).values('day', 'plan_id')
+        .annotate(count=Count('id'), revenue=Sum('amount')).order_by()
+    )
+    for row in payments:
+        counters[(DailyMetric.PURCHASES, dimension_key(row['plan_id']), row['day'])] = row['count']
+        counters[(DailyMetric.REVENUE, dimension_key(row['plan_id']), row['day'])] = row['revenue']
+
+    grouped = [
+        (DailyMetric.NEW_SUBSCRIPTIONS, Subscription.objects.filter(start_at__gte=since, start_at__lt=until),
+         'start_at', 'plan_id'),
+        # تاریخ لغو ذخیره نمی‌شود؛ برای ریزش، تاریخ پایان اشتراک‌های غیرفعال ملاک است
+        (DailyMetric.CHURNED_SUBSCRIPTIONS,
+         Subscription.objects.filter(is_active=False, expired_at__gte=since, expired_at__lt=until), 'expired_at', 'plan_id'),
+        # زمان تکمیل تشخیص ذخیره نمی‌شود؛ تاریخ ایجاد ملاک است
+        (DailyMetric.DIAGNOSES,
+         PlantDiagnosis.objects.filter(status=PlantDiagnosis.STATUS_COMPLETED, created_at__gte=since, created_at__lt=until),
+         'created_at', 'category'),
+        (DailyMetric.CHAT_MESSAGES, Message.objects.filter(created_at__gte=since, created_at__lt=until), 'created_at', None),
+    ]
+    for metric, queryset, date_field, dimension_field in grouped:
+        fields = ['day'] + ([dimension_field] if dimension_field else [])
+        rows = queryset.annotate(day=TruncDate(date_field)).values(*fields).annotate(count=Count('id')).order_by()
+        for row in rows:
+            dimension = dimension_key(row[dimension_field]) if dimension_field else ''
+            counters[(metric, dimension, row['day'])] = row['count']
+    return counters
+
+
+def current_gauges():
+    from subscription.models import PaymentHistory, Subscription
+
+    return {
+        DailyMetric.ACTIVE_SUBSCRIPTIONS: Subscription.objects.filter(is_active=True).count(),
+        DailyMetric.PURCHASES_TOTAL: PaymentHistory.objects.filter(is_successful=True).count(),
+    }
+
+
+def rebuild(start, end):
+    """
+    بازنویسی شاخص‌های شمارشی روزهای [start, end] از جدول‌های اصلی و تنظیم مقدار امروز شاخص‌های لحظه‌ای.
+    خروجی: تعداد ردیف‌های نوشته‌شده.
+    """
+    counters = raw_counters(start, end)
+    today = timezone.localdate()
+    with transaction.atomic():
+        DailyMetric.objects.filter(metric__in=DailyMetric.COUNTERS, day__gte=start, day__lte=end).delete()
+        DailyMetric.objects.bulk_create(
+            [DailyMetric(metric=metric, dimension=dimension, day=day, value=value)
+             for (metric, dimension, day), value in counters.items()],
+            batch_size=1000,
+        )
+        for metric, value in current_gauges().items():
+            DailyMetric.objects.update_or_create(metric=metric, dimension='', day=today, defaults={'value': value})
+    return len(counters)
@@ -0,0 +1,89 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from chat.models import Message
+from plants.models import PlantDiagnosis
+from subscription.models import PaymentHistory, Subscription
+from subscription.services.expiry import subscriptions_expired
+from .models import DailyMetric
+from .services.rollups import adjust_gauge, increment, record_on_commit
+
+
+# ======================================================
+# وضعیت قبلی هنگام بارگذاری نگه داشته می‌شود تا post_save تغییر وضعیت را بدون کوئری اضافه تشخیص دهد.
+# فیلدهای deferred خوانده نمی‌شوند (برای جلوگیری از کوئری جداگانه هر نمونه)
+@receiver(post_init, sender=Subscription)
+def remember_subscription_state(sender, instance, **kwargs):
+    instance._rollup_was_active = instance.__dict__.get('is_active') if instance.pk else None
+
+
+@receiver(post_init, sender=PlantDiagnosis)
+def remember_diagnosis_status(sender, instance, **kwargs):
+    instance._rollup_status = instance.__dict__.get('status') if instance.pk else None
+
+
+# ======================================================
+# خرید و درآمد
+@receiver(post_save, sender=PaymentHistory)
+def count_payment(sender, instance, created, **kwargs):
+    if not created or not instance.is_successful:
+        return
+    record_on_commit(increment, DailyMetric.PURCHASES, 1, instance.plan_id)
+    record_on_commit(increment, DailyMetric.REVENUE, instance.amount, instance.plan_id)
+    record_on_commit(adjust_gauge, DailyMetric.PURCHASES_TOTAL, 1)
+
+
+# ======================================================
+# اشتراک‌های فعال، جدید و ریزش. شاخص اشتراک فعال تعداد ردیف‌های is_active است؛ اشتراک تمام‌شده تا اجرای
+# تسک ساعتی انقضا (سیگنال subscriptions_expired) فعال شمرده می‌شود
+def is_live(subscription):
+    return subscription.is_active and subscription.expired_at >= timezone.now()
+
+
+@receiver(post_save, sender=Subscription)
+def count_subscription(sender, instance, created, **kwargs):
+    was_active = instance._rollup_was_active
+    if created:
+        if is_live(instance):
+            record_on_commit(increment, DailyMetric.NEW_SUBSCRIPTIONS, 1, instance.plan_id)
+        if instance.is_active:
+            record_on_commit(adjust_gauge, DailyMetric.ACTIVE_SUBSCRIPTIONS, 1)
+    elif was_active and not instance.is_active:
+        record_on_commit(increment, DailyMetric.CHURNED_SUBSCRIPTIONS, 1, instance.plan_id)
+        record_on_commit(adjust_gauge, DailyMetric.ACTIVE_SUBSCRIPTIONS, -1)
+    elif was_active is False and instance.is_active:
+        record_on_commit(adjust_gauge, DailyMetric.ACTIVE_SUBSCRIPTIONS, 1)
+    instance._rollup_was_active = instance.is_active
+
+
+@receiver(post_delete, sender=Subscription)
+def uncount_subscription(sender, instance, **kwargs):
+    if instance.is_active:
+        record_on_commit(adjust_gauge, DailyMetric.ACTIVE_SUBSCRIPTIONS, -1)
+
+
+@receiver(subscriptions_expired)
+def count_expired(sender, rows, **kwargs):
+    by_plan = Counter(plan_id for _, _, plan_id in rows)
+    for plan_id, count in by_plan.items():
+        record_on_commit(increment, DailyMetric.CHURNED_SUBSCRIPTIONS, count, plan_id)
+    record_on_commit(adjust_gauge, DailyMetric.ACTIVE_SUBSCRIPTIONS, -len(rows))
+
+
+# ======================================================
+# تشخیص‌ها (هنگام تکمیل، به تفکیک دسته) و حجم چت
+@receiver(post_save, sender=PlantDiagnosis)
+def count_diagnosis(sender, instance, created, **kwargs):
+    completed = PlantDiagnosis.STATUS_COMPLETED
+    if instance.status == completed and instance._rollup_status != completed:
+        record_on_commit(increment, DailyMetric.DIAGNOSES, 1, instance.category)
+    instance._rollup_status = instance.status
+
+
+@receiver(post_save, sender=Message)
+def count_chat_message(sender, instance, created, **kwargs):
+    if created:
+        record_on_commit(increment, DailyMetric.CHAT_MESSAGES)
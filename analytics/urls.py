@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import MetricSeriesView
+
+urlpatterns = [
+    path('metrics/', MetricSeriesView.as_view()),
+]
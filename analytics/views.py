@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from subscription.models import SubscriptionPlan
+from .models import DailyMetric
+from .services.rollups import series
+
+PLAN_METRICS = (
+    DailyMetric.PURCHASES, DailyMetric.REVENUE, DailyMetric.NEW_SUBSCRIPTIONS, DailyMetric.CHURNED_SUBSCRIPTIONS,
+)
+
+
+# ======================================================
+# سری زمانی روزانه یک شاخص از جدول تجمیعی (بدون خواندن جدول‌های اصلی)
+class MetricSeriesView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        metric = request.query_params.get('metric')
+        if metric not in DailyMetric.COUNTERS + DailyMetric.GAUGES:
+            return Response(
+                {"error": "شاخص نامعتبر است.", "metrics": list(DailyMetric.COUNTERS + DailyMetric.GAUGES)}, status=400
+            )
+        try:
+            end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else timezone.localdate()
+            start = (date.fromisoformat(request.query_params['start']) if 'start' in request.query_params
+                     else end - timedelta(days=29))
+        except ValueError:
+            return Response({"error": "تاریخ باید به شکل YYYY-MM-DD باشد."}, status=400)
+        if start > end or (end - start).days >= settings.ANALYTICS_MAX_RANGE_DAYS:
+            return Response(
+                {"error": f"بازه باید حداکثر {settings.ANALYTICS_MAX_RANGE_DAYS} روز و start پیش از end باشد."}, status=400
+            )
+
+        points = series(metric, start, end, request.query_params.get('dimension'))
+        labels = {}
+        if metric in PLAN_METRICS:
+            labels = {str(pk): name for pk, name in SubscriptionPlan.objects.filter(
+                pk__in=[dim for dim in points if dim.isdigit()]).values_list('pk', 'name')}
+
+        result = []
+        for dimension, values in sorted(points.items()):
+            item = {
+                'dimension': dimension,
+                'label': labels.get(dimension, dimension),
+                'points': [{'day': day.isoformat(), 'value': value} for day, value in values],
+            }
+            if metric in DailyMetric.COUNTERS:
+                item['total'] = sum(value for _, value in values)
+            result.append(item)
+        return Response({
+            'metric': metric,
+            'kind': 'gauge' if metric in DailyMetric.GAUGES else 'counter',
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'series': result,
+        })
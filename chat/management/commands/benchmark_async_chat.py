@@ -0,0 +1,91 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from chat.models import Message
+from utils import http_client
+from utils.stub_upstream import StubUpstream
+
+BENCHMARK_MARKER = '[benchmark]'
+STUB_ANSWER = {"candidates": [{"content": {"parts": [{"text": "پاسخ آزمایشی"}]}}]}
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 2),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "مقایسه توان عملیاتی endpoint چت در حالت sync (تعداد محدود worker مثل gunicorn) "
+        "و async (ASGI) در برابر یک upstream محلی با تاخیر ثابت."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--sync-workers', type=int, default=4,
+                            help="تعداد worker/thread همزمان در استقرار sync")
+        parser.add_argument('--upstream-delay', type=float, default=0.5,
+                            help="تاخیر upstream شبیه‌سازی‌شده به ثانیه")
+
+    def handle(self, *args, **options):
+        with StubUpstream(delay=options['upstream_delay'], response_body=STUB_ANSWER) as upstream:
+            with override_settings(GEMINI_API_URL=upstream.url, ALLOWED_HOSTS=['*']):
+                try:
+                    sync_result = self.run_sync(options['requests'], options['sync_workers'])
+                    async_result = asyncio.run(self.run_async(options['requests'], options['concurrency']))
+                finally:
+                    Message.objects.filter(text__startswith=BENCHMARK_MARKER).delete()
+
+        self.stdout.write(f"upstream delay: {options['upstream_delay']}s, upstream requests: {upstream.requests}")
+        self.stdout.write(f"sync  ({options['sync_workers']} workers): {sync_result}")
+        self.stdout.write(f"async (concurrency {options['concurrency']}): {async_result}")
+        if sync_result['rps']:
+            self.stdout.write(self.style.SUCCESS(
+                f"async/sync throughput: {async_result['rps'] / sync_result['rps']:.1f}x"
+            ))
+
+    @staticmethod
+    def run_sync(total, workers):
+        client = Client()
+
+        def one(i):
+            started = time.perf_counter()
+            response = client.post('/chat/ask/', {'message': f'{BENCHMARK_MARKER} {i}'})
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(one, range(total)))
+        return summarize(latencies, time.perf_counter() - started)
+
+    @staticmethod
+    async def run_async(total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    '/chat/ask-async/', {'message': f'{BENCHMARK_MARKER} {i}'}, content_type='application/json'
+                )
+                assert response.status_code == 200, response.content
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+        await http_client.aclose_loop_clients()
+        return summarize(latencies, elapsed)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from chat.services.answer_cache import ChatAnswerCache
+
+
+class Command(BaseCommand):
+    help = "پر کردن کش پاسخ‌های چت از روی پرسش و پاسخ‌های ذخیره‌شده در جدول Message."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help="حداکثر تعداد پیام‌های اخیر (پیش‌فرض CHAT_ANSWER_CACHE_SEED_LIMIT)")
+
+    def handle(self, *args, **options):
+        seeded = ChatAnswerCache().seed(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"{seeded} پرسش در کش پاسخ‌های چت ذخیره شد."))
@@ -0,0 +1,234 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .text_normalization import char_ngrams, normalize_text
+
+logger = logging.getLogger(__name__)
+
+TIER_EXACT = 'exact'
+TIER_SIMILAR = 'similar'
+UNANSWERED = 'پاسخی دریافت نشد.'
+
+
+class NgramIndex:
+    """
+    ایندکس درون‌حافظه‌ای n-gram پرسش‌های نرمال‌شده برای پیدا کردن پرسش‌های هم‌معنی (سطح دوم کش).
+    اندازه ایندکس محدود است و قدیمی‌ترین پرسش استفاده‌نشده (LRU) حذف می‌شود؛ ورودی‌ها پس از TTL منقضی می‌شوند.
+    خود پاسخ‌ها در کش مشترک (Redis) هستند و ایندکس فقط متن پرسش را نگه می‌دارد.
+    """
+
+    def __init__(self, max_entries=5000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.postings = defaultdict(set)
+        self.seeded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, normalized):
+        grams = char_ngrams(normalized)
+        if not grams:
+            return
+        with self._lock:
+            if normalized in self.entries:
+                self.entries.move_to_end(normalized)
+                self.entries[normalized] = (grams, time.monotonic())
+                return
+            self.entries[normalized] = (grams, time.monotonic())
+            for gram in grams:
+                self.postings[gram].add(normalized)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, normalized):
+        grams, _ = self.entries.pop(normalized)
+        for gram in grams:
+            texts = self.postings.get(gram)
+            if texts is not None:
+                texts.discard(normalized)
+                if not texts:
+                    del self.postings[gram]
+
+    def search(self, normalized, threshold):
+        """(پرسش مشابه، شباهت Jaccard) برای نزدیک‌ترین پرسش بالای آستانه یا None"""
+        grams = char_ngrams(normalized)
+        if not grams:
+            return None
+        with self._lock:
+            shared = defaultdict(int)
+            for gram in grams:
+                for text in self.postings.get(gram, ()):
+                    shared[text] += 1
+
+            best, best_score = None, 0.0
+            now = time.monotonic()
+            for text, count in shared.items():
+                other_grams, added_at = self.entries[text]
+                if self.ttl and now - added_at > self.ttl:
+                    continue
+                score = count / (len(grams) + len(other_grams) - count)
+                if score > best_score:
+                    best, best_score = text, score
+
+            if best is None or best_score < threshold:
+                return None
+            self.entries.move_to_end(best)
+            return best, round(best_score, 4)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.postings.clear()
+            self.seeded = False
+
+
+similarity_index = NgramIndex(
+    max_entries=settings.CHAT_ANSWER_CACHE_INDEX_MAX_ENTRIES,
+    ttl=settings.CHAT_ANSWER_CACHE_TIMEOUT,
+)
+
+
+class ChatAnswerCache:
+    """
+    کش پاسخ‌های دستیار چت بر اساس متن نرمال‌شده پرسش.
+    سطح اول: تطابق دقیق متن نرمال‌شده (کلید در کش مشترک با TTL؛ حذف LRU توسط Redis).
+    سطح دوم (اختیاری): پرسش‌های هم‌معنی با شباهت n-gram حرفی از طریق similarity_index.
+    برای پاک کردن همه پاسخ‌ها، شماره نسل کلیدها افزایش داده می‌شود.
+    """
+    KEY_PREFIX = 'chat:answer:'
+    GENERATION_KEY = 'chat:answer:generation'
+    PURGED_AT_KEY = 'chat:answer:purged_at'
+    HITS_EXACT_KEY = 'chat:cache:hits_exact'
+    HITS_SIMILAR_KEY = 'chat:cache:hits_similar'
+    MISSES_KEY = 'chat:cache:misses'
+    SAVED_MS_KEY = 'chat:cache:saved_ms'
+    STATS_KEYS = (HITS_EXACT_KEY, HITS_SIMILAR_KEY, MISSES_KEY, SAVED_MS_KEY)
+
+    def __init__(self, backend=None, timeout=None, index=None, similarity_enabled=None, threshold=None):
+        self.backend = backend or cache
+        self.timeout = timeout if timeout is not None else settings.CHAT_ANSWER_CACHE_TIMEOUT
+        self.index = index if index is not None else similarity_index
+        self.similarity_enabled = (
+            settings.CHAT_ANSWER_CACHE_SIMILARITY_ENABLED if similarity_enabled is None else similarity_enabled
+        )
+        self.threshold = threshold if threshold is not None else settings.CHAT_ANSWER_CACHE_SIMILARITY_THRESHOLD
+
+    def make_key(self, normalized):
+        generation = self.backend.get(self.GENERATION_KEY, 0)
+        digest = hashlib.sha256(normalized.encode()).hexdigest()
+        return f"{self.KEY_PREFIX}{generation}:{digest}"
+
+    def lookup(self, message):
+        """(پاسخ، سطح کش) یا (None, None)"""
+        normalized = normalize_text(message)
+        if not normalized:
+            return None, None
+
+        entry = self.backend.get(self.make_key(normalized))
+        tier = TIER_EXACT
+        if entry is None and self.similarity_enabled:
+            self.ensure_seeded()
+            match = self.index.search(normalized, self.threshold)
+            if match is not None:
+                entry = self.backend.get(self.make_key(match[0]))
+                tier = TIER_SIMILAR
+                if entry is not None:
+                    logger.info(f"♻️ پاسخ چت از پرسش مشابه (شباهت {match[1]}) بازگردانده شد.")
+
+        if entry is None:
+            self._incr(self.MISSES_KEY)
+            return None, None
+
+        self._incr(self.HITS_EXACT_KEY if tier == TIER_EXACT else self.HITS_SIMILAR_KEY)
+        if entry.get('latency_ms'):
+            self._incr(self.SAVED_MS_KEY, int(entry['latency_ms']))
+        return entry['answer'], tier
+
+    def store(self, message, answer, latency_ms=None):
+        normalized = normalize_text(message)
+        if not normalized or not answer or answer == UNANSWERED:
+            return False
+        entry = {'answer': answer, 'latency_ms': round(latency_ms) if latency_ms else None}
+        self.backend.set(self.make_key(normalized), entry, timeout=self.timeout)
+        if self.similarity_enabled:
+            self.index.add(normalized)
+        return True
+
+    def seed(self, limit=None):
+        """بارگذاری پرسش و پاسخ‌های قبلی از جدول Message (جدیدترین پاسخ هر پرسش)؛ خروجی: تعداد ذخیره‌شده"""
+        from chat.models import Message
+
+        limit = limit or settings.CHAT_ANSWER_CACHE_SEED_LIMIT
+        messages = Message.objects.exclude(response__isnull=True).exclude(response='').exclude(response=UNANSWERED)
+        # پیام‌های پیش از آخرین پاک‌سازی دوباره وارد کش نمی‌شوند
+        purged_at = self.backend.get(self.PURGED_AT_KEY)
+        if purged_at is not None:
+            messages = messages.filter(created_at__gt=purged_at)
+        rows = (
+            messages.order_by('-created_at')
+            .values_list('text', 'response')[:limit]
+        )
+        seen = set()
+        for text, response in rows:
+            normalized = normalize_text(text)
+            if not normalized or normalized in seen:
+                continue
+            seen.add(normalized)
+            key = self.make_key(normalized)
+            # پاسخ‌های موجود در کش (تازه‌تر یا با زمان اندازه‌گیری‌شده) بازنویسی نمی‌شوند
+            self.backend.add(key, {'answer': response, 'latency_ms': None}, timeout=self.timeout)
+            self.index.add(normalized)
+        self.index.seeded = True
+        return len(seen)
+
+    def ensure_seeded(self):
+        # ایندکس شباهت در هر پروسه یک بار از روی پیام‌های قبلی ساخته می‌شود
+        if not self.index.seeded:
+            self.seed()
+
+    def purge(self):
+        self.backend.add(self.GENERATION_KEY, 0, timeout=None)
+        self.backend.incr(self.GENERATION_KEY)
+        self.backend.set(self.PURGED_AT_KEY, timezone.now(), timeout=None)
+        self.index.clear()
+        self.reset_stats()
+
+    def stats(self):
+        values = self.backend.get_many(self.STATS_KEYS)
+        hits_exact = values.get(self.HITS_EXACT_KEY, 0)
+        hits_similar = values.get(self.HITS_SIMILAR_KEY, 0)
+        misses = values.get(self.MISSES_KEY, 0)
+        total = hits_exact + hits_similar + misses
+        return {
+            'hits_exact': hits_exact,
+            'hits_similar': hits_similar,
+            'misses': misses,
+            'hit_rate': round((hits_exact + hits_similar) / total, 4) if total else 0.0,
+            'latency_saved_ms': values.get(self.SAVED_MS_KEY, 0),
+            'index_entries': len(self.index),
+        }
+
+    def reset_stats(self):
+        self.backend.delete_many(self.STATS_KEYS)
+
+    def _incr(self, key, delta=1):
+        # شمارنده‌ها TTL ندارند تا با سیاست volatile-lru ردیس حذف نشوند
+        self.backend.add(key, 0, timeout=None)
+        try:
+            self.backend.incr(key, delta)
+        except ValueError:
+            self.backend.set(key, delta, timeout=None)
+
+
+def get_answer_cache():
+    return ChatAnswerCache() if settings.CHAT_ANSWER_CACHE_ENABLED else None
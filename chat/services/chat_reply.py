@@ -0,0 +1,56 @@
+import time
+
+from chat.models import Message
+from chat.serializers import MessageSerializer
+from .answer_cache import get_answer_cache
+from .chat_stream import CONNECTION_ERROR, UPSTREAM_ERROR
+from .conversation import ConversationContext
+from .gemini import build_gemini_payload, extract_answer
+from .quota import release_chat_quota
+
+
+class ChatReply:
+    """
+    مراحل مشترک پاسخ غیراستریم در viewهای sync و async: بارگذاری کانتکست، جستجو در کش پاسخ، ساخت درخواست Gemini
+    و ذخیره نوبت کامل‌شده. متدها sync هستند؛ view async آن‌ها را با sync_to_async صدا می‌زند.
+    """
+
+    def __init__(self, user, user_message):
+        self.user = user if user is not None and user.is_authenticated else None
+        self.user_message = user_message
+        self.context = ConversationContext.load(user)
+        # پاسخ‌های کش مستقل از گفتگو هستند و فقط برای پرسش بدون کانتکست استفاده می‌شوند
+        self.answer_cache = get_answer_cache() if self.context is None or self.context.is_empty else None
+        self.cached_answer, self.cache_tier = (
+            self.answer_cache.lookup(user_message) if self.answer_cache else (None, None)
+        )
+        self.started = time.perf_counter()
+
+    def request_kwargs(self):
+        return {
+            'headers': {"Content-Type": "application/json"},
+            'json': build_gemini_payload(self.user_message, self.context),
+        }
+
+    def complete(self, answer):
+        """ذخیره پاسخ (در کش، کانتکست و Message) و ساخت بدنه پاسخ API"""
+        if self.cached_answer is None and self.answer_cache:
+            self.answer_cache.store(self.user_message, answer, (time.perf_counter() - self.started) * 1000)
+        if self.context is not None:
+            self.context.add_turn(self.user_message, answer)
+        message = Message.objects.create(user=self.user, text=self.user_message, response=answer)
+        body = {'answer': answer, 'chat': MessageSerializer(message).data}
+        if self.cached_answer is not None:
+            body['cached'] = self.cache_tier
+        return body
+
+    def answer_from(self, response):
+        """(بدنه، status) برای پاسخ Gemini؛ در خطا سهمیه پیام برگردانده می‌شود"""
+        if response.status_code == 200:
+            return self.complete(extract_answer(response.json())), 200
+        release_chat_quota(self.user)
+        return {'error': UPSTREAM_ERROR, 'detail': response.text}, response.status_code
+
+    def connection_error(self, error):
+        release_chat_quota(self.user)
+        return {'error': CONNECTION_ERROR, 'detail': str(error)}, 500
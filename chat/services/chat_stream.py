@@ -0,0 +1,232 @@
+import json
+import logging
+import time
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from chat.models import Message
+from chat.serializers import MessageSerializer
+from utils import http_client
+from utils.metrics import registry
+from .answer_cache import get_answer_cache
+from .conversation import ConversationContext
+from .gemini import build_gemini_payload, gemini_stream_url
+from .quota import release_chat_quota
+
+logger = logging.getLogger(__name__)
+
+TTFT_METRIC = 'chat_stream_time_to_first_token_seconds'
+DURATION_METRIC = 'chat_stream_duration_seconds'
+
+UPSTREAM_ERROR = 'خطا در ارتباط با هوش مصنوعی گیاه یار.'
+CONNECTION_ERROR = 'ارتباط با سرور چت بات ممکن نشد.'
+EMPTY_ANSWER = 'پاسخی از هوش مصنوعی دریافت نشد.'
+
+
+def parse_sse_line(line):
+    """متن یک خط «data:» از پاسخ SSE جمینای؛ برای خطوط دیگر None"""
+    if not line.startswith('data:'):
+        return None
+    payload = line[5:].strip()
+    if not payload or payload == '[DONE]':
+        return None
+    try:
+        event = json.loads(payload)
+        # تکه مسدودشده توسط فیلتر ایمنی candidates خالی دارد
+        candidates = event.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts', [])
+        return ''.join(part.get('text', '') for part in parts) or None
+    except (ValueError, IndexError, KeyError, AttributeError, TypeError) as e:
+        logger.warning(f"⚠️ خط نامعتبر استریم Gemini نادیده گرفته شد ({type(e).__name__}): {payload[:200]}")
+        return None
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+def sse_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # جلوگیری از بافر شدن پاسخ در nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class ChatStream:
+    """
+    وضعیت یک پاسخ استریم: متن تجمیع‌شده و زمان‌سنجی.
+    زمان رسیدن اولین توکن (TTFT) معیار اصلی تاخیر این endpoint است و در هیستوگرام ثبت می‌شود.
+    """
+
+    def __init__(self, user, user_message):
+        self.user = user if user is not None and user.is_authenticated else None
+        self.user_message = user_message
+        self.parts = []
+        self.started = time.perf_counter()
+        self.ttft = None
+
+    @property
+    def answer(self):
+        return ''.join(self.parts)
+
+    def feed(self, line):
+        """رویداد token برای ارسال به کاربر یا None"""
+        text = parse_sse_line(line)
+        if not text:
+            return None
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+            registry.histogram(TTFT_METRIC).observe(self.ttft)
+        self.parts.append(text)
+        return sse_event('token', {'text': text})
+
+    def feed_cached(self, answer):
+        """پاسخ کش‌شده به صورت یک رویداد token کامل"""
+        self.ttft = time.perf_counter() - self.started
+        registry.histogram(TTFT_METRIC).observe(self.ttft)
+        self.parts = [answer]
+        return sse_event('token', {'text': answer})
+
+    def remember(self, context):
+        """افزودن نوبت کامل‌شده به کانتکست گفتگوی کاربر"""
+        if context is not None and self.answer:
+            context.add_turn(self.user_message, self.answer)
+
+    def message_kwargs(self):
+        return {'user': self.user, 'text': self.user_message, 'response': self.answer}
+
+    def finish(self, message, cached=None):
+        duration = time.perf_counter() - self.started
+        registry.histogram(DURATION_METRIC).observe(duration)
+        ttft_ms = round(self.ttft * 1000, 1) if self.ttft is not None else None
+        logger.info(f"💬 استریم چت: TTFT {ttft_ms}ms، کل {round(duration * 1000, 1)}ms، {len(self.answer)} کاراکتر")
+        return sse_event('done', {
+            'answer': self.answer,
+            'chat': MessageSerializer(message).data,
+            'ttft_ms': ttft_ms,
+            'cached': cached,
+        })
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def release_quota(self):
+        """سهمیه پیامی که هیچ بخشی از پاسخش نرسید برگردانده می‌شود"""
+        if not self.answer:
+            release_chat_quota(self.user)
+
+    @staticmethod
+    def upstream_error(response):
+        return sse_event('error', {'error': UPSTREAM_ERROR, 'detail': response.text, 'status': response.status_code})
+
+    @staticmethod
+    def empty_answer():
+        return sse_event('error', {'error': UPSTREAM_ERROR, 'detail': EMPTY_ANSWER})
+
+    @staticmethod
+    def connection_error(error):
+        logger.error(f"❌ استریم Gemini قطع شد: {error}")
+        return sse_event('error', {'error': CONNECTION_ERROR, 'detail': str(error)})
+
+
+def stream_chat(user, user_message):
+    """
+    پروکسی streamGenerateContent جمینای به صورت SSE.
+    پس از پایان استریم پاسخ کامل در Message ذخیره می‌شود؛ اگر کاربر وسط کار قطع شود، همان بخش دریافت‌شده.
+    """
+    chat = ChatStream(user, user_message)
+    context = ConversationContext.load(user)
+    answer_cache = get_answer_cache() if context is None or context.is_empty else None
+    if answer_cache:
+        cached_answer, cache_tier = answer_cache.lookup(user_message)
+        if cached_answer is not None:
+            yield chat.feed_cached(cached_answer)
+            chat.remember(context)
+            yield chat.finish(Message.objects.create(**chat.message_kwargs()), cached=cache_tier)
+            return
+
+    saved = False
+    try:
+        with http_client.stream(
+            'POST', gemini_stream_url(),
+            headers={"Content-Type": "application/json"},
+            json=build_gemini_payload(user_message, context),
+        ) as response:
+            if response.status_code != 200:
+                response.read()
+                chat.release_quota()
+                yield chat.upstream_error(response)
+                return
+            for line in response.iter_lines():
+                event = chat.feed(line)
+                if event:
+                    yield event
+
+        if not chat.answer:
+            chat.release_quota()
+            yield chat.empty_answer()
+            return
+        if answer_cache:
+            answer_cache.store(user_message, chat.answer, chat.elapsed_ms)
+        chat.remember(context)
+        message = Message.objects.create(**chat.message_kwargs())
+        saved = True
+        yield chat.finish(message)
+    except httpx.HTTPError as e:
+        chat.release_quota()
+        yield chat.connection_error(e)
+    finally:
+        if not saved and chat.answer:
+            Message.objects.create(**chat.message_kwargs())
+
+
+async def astream_chat(user, user_message):
+    """نسخه async از stream_chat برای اجرا زیر ASGI"""
+    chat = ChatStream(user, user_message)
+    context = await sync_to_async(ConversationContext.load)(user)
+    answer_cache = get_answer_cache() if context is None or context.is_empty else None
+    if answer_cache:
+        cached_answer, cache_tier = await sync_to_async(answer_cache.lookup)(user_message)
+        if cached_answer is not None:
+            yield chat.feed_cached(cached_answer)
+            await sync_to_async(chat.remember)(context)
+            yield chat.finish(await Message.objects.acreate(**chat.message_kwargs()), cached=cache_tier)
+            return
+
+    saved = False
+    try:
+        async with http_client.astream(
+            'POST', gemini_stream_url(),
+            headers={"Content-Type": "application/json"},
+            json=build_gemini_payload(user_message, context),
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                await sync_to_async(chat.release_quota)()
+                yield chat.upstream_error(response)
+                return
+            async for line in response.aiter_lines():
+                event = chat.feed(line)
+                if event:
+                    yield event
+
+        if not chat.answer:
+            await sync_to_async(chat.release_quota)()
+            yield chat.empty_answer()
+            return
+        if answer_cache:
+            await sync_to_async(answer_cache.store)(user_message, chat.answer, chat.elapsed_ms)
+        await sync_to_async(chat.remember)(context)
+        message = await Message.objects.acreate(**chat.message_kwargs())
+        saved = True
+        yield chat.finish(message)
+    except httpx.HTTPError as e:
+        await sync_to_async(chat.release_quota)()
+        yield chat.connection_error(e)
+    finally:
+        if not saved and chat.answer:
+            await Message.objects.acreate(**chat.message_kwargs())
@@ -0,0 +1,152 @@
+import contextlib
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(text):
+    """تخمین ارزان تعداد توکن (حدود ۳ کاراکتر برای هر توکن در متن فارسی)"""
+    return max(1, len(text or '') // 3)
+
+
+def shorten(text, limit):
+    text = ' '.join((text or '').split())
+    if len(text) <= limit:
+        return text
+    # تا پایان اولین جمله یا حداکثر limit کاراکتر
+    for mark in ('.', '؟', '?', '!'):
+        end = text.find(mark, 0, limit)
+        if end > limit // 3:
+            return text[:end + 1]
+    return text[:limit].rstrip() + '…'
+
+
+class ConversationContext:
+    """
+    پنجره گفتگوی هر کاربر با بودجه توکن ثابت، نگهداری‌شده در کش مشترک (Redis).
+    آخرین نوبت‌ها کامل نگه داشته می‌شوند و وقتی مجموع توکن‌ها از بودجه بیشتر شود، قدیمی‌ترین نوبت
+    به یک خط خلاصه تبدیل و به summary اضافه می‌شود؛ summary هم بودجه جدا دارد و خطوط قدیمی‌اش حذف می‌شوند.
+    بنابراین حجم prompt (و هزینه و تاخیر Gemini) با طولانی شدن تاریخچه ثابت می‌ماند.
+    نوبت جدید با add_turn زیر قفل کوتاه‌مدت و روی آخرین نسخه کش اضافه می‌شود تا پیام‌های همزمان یک کاربر
+    (مثلاً endpoint عادی و استریم) نوبت همدیگر را بازنویسی نکنند.
+    """
+    KEY_PREFIX = 'chat:context:'
+    LOCK_TIMEOUT = 5
+    LOCK_WAIT = 2.0
+
+    def __init__(self, user_id, summary='', turns=None, backend=None):
+        self.user_id = user_id
+        self.summary = summary
+        self.turns = [tuple(turn) for turn in turns or []]
+        self.backend = backend or cache
+
+    @classmethod
+    def key(cls, user_id):
+        return f"{cls.KEY_PREFIX}{user_id}"
+
+    @classmethod
+    def load(cls, user, backend=None):
+        """کانتکست کاربر؛ برای کاربر ناشناس None. اگر در کش نباشد یک بار از پیام‌های اخیر ساخته می‌شود."""
+        if user is None or not user.is_authenticated:
+            return None
+        backend = backend or cache
+        data = backend.get(cls.key(user.pk))
+        if data is not None:
+            return cls(user.pk, data['summary'], data['turns'], backend=backend)
+
+        context = cls(user.pk, backend=backend)
+        context.rebuild()
+        return context
+
+    def rebuild(self):
+        from chat.models import Message
+
+        since = timezone.now() - timedelta(seconds=settings.CHAT_CONTEXT_TIMEOUT)
+        recent = list(
+            Message.objects.filter(user_id=self.user_id, created_at__gte=since)
+            .exclude(response__isnull=True).exclude(response='')
+            .order_by('-created_at')
+            .values_list('text', 'response')[:settings.CHAT_CONTEXT_REBUILD_MESSAGES]
+        )
+        for question, answer in reversed(recent):
+            self.append(question, answer)
+        self.save()
+
+    @property
+    def is_empty(self):
+        return not self.summary and not self.turns
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.summary) + self.turns_tokens()
+
+    def append(self, question, answer):
+        # یک نوبت بسیار طولانی به تنهایی نباید کل بودجه را پر کند
+        max_chars = settings.CHAT_CONTEXT_TOKEN_BUDGET * 3 // 2
+        self.turns.append((question[:max_chars], answer[:max_chars]))
+        self.compact()
+
+    def compact(self):
+        budget = settings.CHAT_CONTEXT_TOKEN_BUDGET
+        while len(self.turns) > 1 and self.turns_tokens() > budget:
+            question, answer = self.turns.pop(0)
+            line = f"- {shorten(question, 120)} ← {shorten(answer, 200)}"
+            self.summary = f"{self.summary}\n{line}".strip()
+
+        summary_budget = settings.CHAT_CONTEXT_SUMMARY_TOKEN_BUDGET
+        lines = self.summary.split('\n') if self.summary else []
+        while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > summary_budget:
+            lines.pop(0)
+        self.summary = '\n'.join(lines)
+
+    def turns_tokens(self):
+        return sum(estimate_tokens(q) + estimate_tokens(a) for q, a in self.turns)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """قفل با cache.add (SET NX در Redis)؛ اگر در LOCK_WAIT ثانیه گرفته نشود، کار بدون قفل ادامه پیدا می‌کند"""
+        lock_key = f"{self.key(self.user_id)}:lock"
+        deadline = time.monotonic() + self.LOCK_WAIT
+        acquired = self.backend.add(lock_key, 1, self.LOCK_TIMEOUT)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.02)
+            acquired = self.backend.add(lock_key, 1, self.LOCK_TIMEOUT)
+        if not acquired:
+            logger.warning(f"⚠️ قفل کانتکست گفتگوی کاربر {self.user_id} گرفته نشد؛ ذخیره بدون قفل انجام می‌شود.")
+        try:
+            yield
+        finally:
+            if acquired:
+                self.backend.delete(lock_key)
+
+    def add_turn(self, question, answer):
+        """افزودن نوبت کامل‌شده به آخرین نسخه کانتکست در کش (نه نسخه‌ای که ابتدای درخواست خوانده شد)"""
+        with self.locked():
+            data = self.backend.get(self.key(self.user_id))
+            if data is not None:
+                self.summary = data['summary']
+                self.turns = [tuple(turn) for turn in data['turns']]
+            self.append(question, answer)
+            self.save()
+
+    def save(self):
+        self.backend.set(
+            self.key(self.user_id),
+            {'summary': self.summary, 'turns': [list(turn) for turn in self.turns]},
+            timeout=settings.CHAT_CONTEXT_TIMEOUT,
+        )
+
+    def reset(self):
+        # کانتکست خالی ذخیره می‌شود (نه حذف کلید) تا از روی پیام‌های قبلی دوباره ساخته نشود
+        with self.locked():
+            self.summary = ''
+            self.turns = []
+            self.save()
+
+    def snapshot(self):
+        return {'summary': self.summary, 'turns': len(self.turns), 'tokens': self.tokens}
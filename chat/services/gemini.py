@@ -0,0 +1,42 @@
+from django.conf import settings
+
+CUSTOM_PROMPT = (
+    "توی پیام ها تا زمانی که از تو خواسته نشده نگو کی هستی"
+    "تو هوش مصنوعی مخصوص اپلیکیشن گیاه یار هستی. "
+    "خودت را هرگز Gemini یا هیچ مدل دیگر هوش مصنوعی معرفی نکن! "
+    "تو توسط تیم برنامه نویسی نکست لول در ایران ساخته شدی"
+    "گیاه یار یک اپ برای نگهداری و مراقبت گل و گیاهان است"
+)
+
+
+def gemini_url():
+    return f"{settings.GEMINI_API_URL}?key={settings.GEMINI_API_KEY}"
+
+
+def gemini_stream_url():
+    # alt=sse: هر بخش پاسخ به صورت یک خط «data: {json}» ارسال می‌شود
+    return f"{settings.GEMINI_STREAM_API_URL}?alt=sse&key={settings.GEMINI_API_KEY}"
+
+
+def build_gemini_payload(user_message, context=None):
+    """
+    بدون کانتکست همان prompt تک‌پیامی قبلی ساخته می‌شود؛ با کانتکست گفتگو، خلاصه نوبت‌های قدیمی
+    به دستورالعمل اضافه و نوبت‌های اخیر به صورت user/model پیش از پیام جدید فرستاده می‌شوند.
+    """
+    preamble = CUSTOM_PROMPT
+    contents = []
+    if context is not None:
+        if context.summary:
+            preamble = f"{preamble}\n\nخلاصه گفتگوهای قبلی کاربر:\n{context.summary}"
+        for question, answer in context.turns:
+            contents.append({"role": "user", "parts": [{"text": question}]})
+            contents.append({"role": "model", "parts": [{"text": answer}]})
+    contents.append({"role": "user", "parts": [{"text": user_message}]})
+
+    first_part = contents[0]["parts"][0]
+    first_part["text"] = f"{preamble}\n\n{first_part['text']}"
+    return {"contents": contents}
+
+
+def extract_answer(response_json):
+    return response_json.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "پاسخی دریافت نشد.")
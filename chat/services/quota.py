@@ -0,0 +1,28 @@
+from subscription.services import entitlement, metering
+
+
+def consume_chat_quota(user):
+    """
+    سهمیه روزانه چت کاربران بدون اشتراک (ENTITLEMENT_FREE_CHAT_PER_DAY) و سقف‌های پلن (metering)؛
+    در صورت اتمام سهمیه پیام خطا برمی‌گردد
+    """
+    try:
+        free_remaining = entitlement.consume(user, entitlement.KIND_CHAT)
+    except entitlement.QuotaExceeded as e:
+        return f"سقف {e.limit} پیام رایگان امروز تمام شده است. برای ادامه گفتگو اشتراک تهیه کنید."
+    try:
+        metering.consume(user, metering.FEATURE_CHAT)
+    except entitlement.QuotaExceeded as e:
+        if free_remaining is not None:
+            entitlement.refund(user.pk, entitlement.KIND_CHAT)
+        return f"سقف {e.limit} پیام {metering.WINDOW_LABELS[e.window]} پلن شما تمام شده است."
+    return None
+
+
+def release_chat_quota(user):
+    """برگرداندن سهمیه پیامی که پاسخی نگرفت (خطای Gemini یا قطع ارتباط)؛ کاربر مهمان سهمیه‌ای مصرف نکرده است"""
+    if user is None or not user.is_authenticated:
+        return
+    if entitlement.remaining(user, entitlement.KIND_CHAT) is not None:
+        entitlement.refund(user.pk, entitlement.KIND_CHAT)
+    metering.release(user, metering.FEATURE_CHAT)
@@ -0,0 +1,64 @@
+import re
+import unicodedata
+
+ZWNJ = '\u200c'
+
+# یکسان‌سازی حروف عربی با معادل فارسی و ارقام عربی/فارسی با ارقام لاتین
+CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+})
+
+# اعراب، تنوین و کشیده (ـ)
+DIACRITICS_RE = re.compile('[\u064B-\u065F\u0670\u0640]')
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+WHITESPACE_RE = re.compile(r'\s+')
+# «می خواهم»، «میخواهم» و «می‌خواهم» یکسان شوند؛ همین‌طور پسوندهای جمع و صفت
+PREFIX_SPACE_RE = re.compile(r'(?:^|(?<=\s))(ن?می) (?=\S)')
+SUFFIX_SPACE_RE = re.compile(r'(?<=\S) (ها|های|هایی|تر|ترین)(?=\s|$)')
+
+STOP_WORDS = frozenset({
+    'از', 'به', 'با', 'در', 'را', 'و', 'که', 'این', 'آن', 'یک', 'برای', 'تا', 'هم', 'یا',
+    'است', 'هست', 'هستند', 'باید', 'چه', 'چی', 'چطور', 'چگونه', 'چرا', 'آیا', 'کنم', 'کنیم',
+    'بکنم', 'میشه', 'من', 'ما', 'شما', 'لطفا', 'سلام',
+    'how', 'what', 'why', 'the', 'a', 'an', 'to', 'of', 'is', 'do', 'i', 'my', 'should', 'often',
+})
+
+
+def normalize_text(text):
+    """
+    نرمال‌سازی متن پرسش برای کلید کش: حروف عربی → فارسی، حذف اعراب و کشیده،
+    چسباندن پیشوند «می» و پسوندهای «ها/تر» (با نیم‌فاصله، فاصله یا بدون فاصله)، حذف علائم نگارشی
+    (از جمله ؟ و ،) و یکسان‌سازی فاصله‌ها.
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    text = text.translate(CHARACTER_MAP)
+    text = DIACRITICS_RE.sub('', text)
+    text = text.replace(ZWNJ, '').lower()
+    text = PUNCTUATION_RE.sub(' ', text)
+    text = WHITESPACE_RE.sub(' ', text).strip()
+    text = PREFIX_SPACE_RE.sub(r'\1', text)
+    return SUFFIX_SPACE_RE.sub(r'\1', text)
+
+
+def content_words(normalized):
+    """کلمات معنادار (بدون کلمات پرتکرار) برای مقایسه شباهت"""
+    words = [word for word in normalized.split() if word not in STOP_WORDS]
+    return words or normalized.split()
+
+
+def char_ngrams(normalized, n=3):
+    """n-gramهای حرفی هر کلمه (با علامت مرز کلمه)؛ ترتیب کلمات در شباهت اثری ندارد"""
+    grams = set()
+    for word in content_words(normalized):
+        padded = f'#{word}#'
+        if len(padded) <= n:
+            grams.add(padded)
+            continue
+        grams.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
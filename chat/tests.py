@@ -1,3 +1,182 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from subscription.services import entitlement, metering
+from utils.stub_upstream import StubUpstream
+from .models import Message
+from .services.conversation import ConversationContext
+from .services.gemini import build_gemini_payload
+from .services.answer_cache import ChatAnswerCache, NgramIndex
+from .services.text_normalization import normalize_text
+
+STUB_ANSWER = {"candidates": [{"content": {"parts": [{"text": "آب کم بدهید"}]}}]}
+
+
+class AsyncChatAPIViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_async_chat_answers_from_upstream_and_stores_message(self):
+        with StubUpstream(delay=0, response_body=STUB_ANSWER) as upstream:
+            with override_settings(GEMINI_API_URL=upstream.url):
+                response = await self.async_client.post(
+                    '/chat/ask-async/', {'message': 'برگ‌ها زرد شده‌اند'}, content_type='application/json'
+                )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['answer'], 'آب کم بدهید')
+        self.assertEqual(await Message.objects.filter(response='آب کم بدهید').acount(), 1)
+
+    async def test_async_chat_requires_message(self):
+        response = await self.async_client.post('/chat/ask-async/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+STREAM_CHUNKS = [
+    'data: {"candidates": [{"content": {"parts": [{"text": "هفته‌ای "}]}}]}\r\n\r\n',
+    'data: {"candidates": [{"content": {"parts": [{"text": "یک بار آبیاری کنید."}]}}]}\r\n\r\n',
+]
+
+
+class ChatStreamAPIViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def read_events(self, response):
+        body = b''.join(response.streaming_content).decode()
+        events = []
+        for block in body.strip().split('\n\n'):
+            name, data = block.split('\n')
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_stream_sends_tokens_then_saves_full_answer(self):
+        with StubUpstream(delay=0, chunks=STREAM_CHUNKS) as upstream:
+            with override_settings(GEMINI_STREAM_API_URL=upstream.url):
+                response = self.client.post('/chat/ask-stream/', {'message': 'کاکتوس را چند وقت یک بار آب بدهم؟'})
+                events = self.read_events(response)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual([name for name, _ in events], ['token', 'token', 'done'])
+        self.assertEqual(events[-1][1]['answer'], 'هفته‌ای یک بار آبیاری کنید.')
+        self.assertIsNotNone(events[-1][1]['ttft_ms'])
+        self.assertEqual(Message.objects.get().response, 'هفته‌ای یک بار آبیاری کنید.')
+
+
+    @override_settings(ENTITLEMENT_FREE_CHAT_PER_DAY=2)
+    def test_malformed_and_blocked_chunks_do_not_break_the_stream(self):
+        user = get_user_model().objects.create_user(username='streamer', password='pass', phone_number='09120000012')
+        client = APIClient()
+        client.force_authenticate(user)
+        malformed = 'data: {"candidates": [{"content": \r\n\r\n'
+        blocked = 'data: {"candidates": [], "promptFeedback": {"blockReason": "SAFETY"}}\r\n\r\n'
+
+        with StubUpstream(delay=0, chunks=[malformed, blocked]) as upstream:
+            with override_settings(GEMINI_STREAM_API_URL=upstream.url):
+                events = self.read_events(client.post('/chat/ask-stream/', {'message': 'سلام'}))
+        self.assertEqual([name for name, _ in events], ['error'])
+        self.assertFalse(Message.objects.exists())
+        self.assertEqual(entitlement.remaining(user, entitlement.KIND_CHAT), 2)
+
+        with StubUpstream(delay=0, chunks=[malformed, blocked] + STREAM_CHUNKS) as upstream:
+            with override_settings(GEMINI_STREAM_API_URL=upstream.url):
+                events = self.read_events(client.post('/chat/ask-stream/', {'message': 'سلام'}))
+        self.assertEqual([name for name, _ in events], ['token', 'token', 'done'])
+
+
+class ChatAnswerCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_persian_normalization_unifies_letters_zwnj_and_punctuation(self):
+        self.assertEqual(normalize_text('كاكتوس رو هر چند وقت آب بدم؟'), normalize_text('کاکتوس رو هر چند وقت آب بدم'))
+        self.assertEqual(normalize_text('می‌خواهم برگ‌ها سبز شوند'), normalize_text('می خواهم برگ ها سبز شوند!'))
+
+    def test_repeated_question_is_answered_from_cache(self):
+        with StubUpstream(delay=0, response_body=STUB_ANSWER) as upstream:
+            with override_settings(GEMINI_API_URL=upstream.url):
+                first = self.client.post('/chat/ask/', {'message': 'كاكتوس رو هر چند وقت آب بدم؟'})
+                second = self.client.post('/chat/ask/', {'message': 'کاکتوس رو هر چند وقت آب بدم'})
+
+        self.assertEqual(upstream.requests, 1)
+        self.assertNotIn('cached', first.json())
+        self.assertEqual(second.json()['cached'], 'exact')
+        self.assertEqual(second.json()['answer'], 'آب کم بدهید')
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(ChatAnswerCache().stats()['hits_exact'], 1)
+
+    def test_similarity_tier_and_purge(self):
+        answer_cache = ChatAnswerCache(index=NgramIndex(), similarity_enabled=True, threshold=0.6)
+        answer_cache.store('how often water cactus', 'Every two weeks.', latency_ms=1200)
+
+        self.assertEqual(answer_cache.lookup('cactus watering'), ('Every two weeks.', 'similar'))
+        self.assertEqual(answer_cache.stats()['latency_saved_ms'], 1200)
+
+        answer_cache.purge()
+        self.assertEqual(answer_cache.lookup('how often water cactus'), (None, None))
+
+
+class ConversationContextTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='chatter', password='pass', phone_number='09120000010')
+
+    @override_settings(CHAT_CONTEXT_TOKEN_BUDGET=100, CHAT_CONTEXT_SUMMARY_TOKEN_BUDGET=60)
+    def test_context_stays_within_budget_as_history_grows(self):
+        context = ConversationContext.load(self.user)
+        for i in range(50):
+            context.append(f'پرسش شماره {i} درباره آبیاری سانسوریا', 'پاسخ طولانی درباره نور و آبیاری. ' * 3)
+        context.save()
+
+        context = ConversationContext.load(self.user)
+        self.assertLessEqual(context.tokens, 160)
+        self.assertEqual(context.turns[-1][0], 'پرسش شماره 49 درباره آبیاری سانسوریا')
+        self.assertIn('پرسش شماره 4', context.summary)
+
+        contents = build_gemini_payload('و کود؟', context)['contents']
+        self.assertEqual(len(contents), len(context.turns) * 2 + 1)
+        self.assertIn(context.summary, contents[0]['parts'][0]['text'])
+
+    def test_concurrent_messages_keep_both_turns(self):
+        first = ConversationContext.load(self.user)
+        second = ConversationContext.load(self.user)
+        first.add_turn('پرسش اول', 'پاسخ اول')
+        second.add_turn('پرسش دوم', 'پاسخ دوم')
+
+        turns = ConversationContext.load(self.user).turns
+        self.assertEqual([question for question, _ in turns], ['پرسش اول', 'پرسش دوم'])
+
+    def test_chat_view_keeps_turns_for_authenticated_user(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with StubUpstream(delay=0, response_body=STUB_ANSWER) as upstream:
+            with override_settings(GEMINI_API_URL=upstream.url):
+                client.post('/chat/ask/', {'message': 'سانسوریا چقدر نور می‌خواهد؟'})
+                client.post('/chat/ask/', {'message': 'سانسوریا چقدر نور می‌خواهد؟'})
+
+        # پرسش دوم با کانتکست گفتگو است و از کش پاسخ مستقل استفاده نمی‌کند
+        self.assertEqual(upstream.requests, 2)
+        self.assertEqual(client.get('/chat/context/').json()['turns'], 2)
+        self.assertEqual(client.delete('/chat/context/').status_code, 204)
+        self.assertEqual(ConversationContext.load(self.user).turns, [])
+
+
+@override_settings(ENTITLEMENT_FREE_CHAT_PER_DAY=2, GEMINI_API_URL='http://127.0.0.1:9/')
+class ChatQuotaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='unanswered', password='pass', phone_number='09120000011')
+
+    def test_failed_upstream_call_gives_quota_back(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post('/chat/ask/', {'message': 'چرا برگ‌ها می‌ریزند؟'}).status_code, 500)
+
+        self.assertEqual(entitlement.remaining(self.user, entitlement.KIND_CHAT), 2)
+        usage = metering.usage(self.user)[metering.FEATURE_CHAT][metering.WINDOW_DAY]
+        self.assertEqual(usage['used'], 0)
@@ -1,6 +1,11 @@
 from django.urls import path
-from .views import ChatAPIView
+from .views import ChatAPIView, AsyncChatAPIView, ChatStreamAPIView, AsyncChatStreamAPIView, ChatAnswerCacheView, ChatContextView
 
 urlpatterns = [
     path('ask/', ChatAPIView.as_view(), name='chat-ask'),
+    path('ask-async/', AsyncChatAPIView.as_view(), name='chat-ask-async'),
+    path('ask-stream/', ChatStreamAPIView.as_view(), name='chat-ask-stream'),
+    path('ask-stream-async/', AsyncChatStreamAPIView.as_view(), name='chat-ask-stream-async'),
+    path('cache/', ChatAnswerCacheView.as_view(), name='chat-answer-cache'),
+    path('context/', ChatContextView.as_view(), name='chat-context'),
 ]
@@ -1,55 +1,145 @@
+import json
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-import requests
-from django.conf import settings
-from .models import Message
-from .serializers import MessageSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from utils import http_client
+from utils.async_auth import aauthenticate, error_response
+from .services.answer_cache import ChatAnswerCache
+from .services.chat_reply import ChatReply
+from .services.conversation import ConversationContext
+from .services.quota import consume_chat_quota
+from .services.chat_stream import astream_chat, sse_response, stream_chat
+from .services.gemini import gemini_url
 
 
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash-002:generateContent"
+def check_chat_request(user, user_message):
+    """(بدنه خطا، status) برای پیام خالی یا اتمام سهمیه؛ None یعنی درخواست قابل پاسخ است"""
+    if not user_message:
+        return {'error': 'متن پیام اجباری است.'}, 400
+    if user.is_authenticated:
+        quota_error = consume_chat_quota(user)
+        if quota_error:
+            return {'error': quota_error}, 403
+    return None
+
+
+def read_message(request):
+    """متن پیام از بدنه JSON یا فرم (برای viewهای async خارج از DRF)"""
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or b'{}')
+    else:
+        data = request.POST
+    return str(data.get('message', '')).strip()
+
+
+async def read_async_chat_request(request):
+    """احراز هویت، خواندن پیام و بررسی سهمیه در viewهای async: (user، پیام، پاسخ خطا یا None)"""
+    try:
+        user = await aauthenticate(request)
+    except AuthenticationFailed as e:
+        return None, None, error_response(str(e.detail), status=401)
+    try:
+        user_message = read_message(request)
+    except ValueError:
+        return user, None, error_response({'error': 'بدنه درخواست JSON معتبر نیست.'}, status=400)
+    error = await sync_to_async(check_chat_request)(user, user_message)
+    if error:
+        return user, user_message, error_response(*error)
+    return user, user_message, None
 
-CUSTOM_PROMPT = (
-    "توی پیام ها تا زمانی که از تو خواسته نشده نگو کی هستی"
-    "تو هوش مصنوعی مخصوص اپلیکیشن گیاه یار هستی. "
-    "خودت را هرگز Gemini یا هیچ مدل دیگر هوش مصنوعی معرفی نکن! "
-    "تو توسط تیم برنامه نویسی نکست لول در ایران ساخته شدی"
-    "گیاه یار یک اپ برای نگهداری و مراقبت گل و گیاهان است"
-)
 
 class ChatAPIView(APIView):
     permission_classes = [permissions.AllowAny]  
 
     def post(self, request):
         user_message = request.data.get('message', '').strip()
-        if not user_message:
-            return Response({'error': 'متن پیام اجباری است.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        full_prompt = f"{CUSTOM_PROMPT}\n\n{user_message}"
-
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": full_prompt}
-                    ]
-                }
-            ]
-        }
+        error = check_chat_request(request.user, user_message)
+        if error:
+            return Response(error[0], status=error[1])
+
+        reply = ChatReply(request.user, user_message)
+        if reply.cached_answer is not None:
+            return Response(reply.complete(reply.cached_answer))
+        try:
+            body, status_code = reply.answer_from(http_client.post(gemini_url(), **reply.request_kwargs()))
+        except Exception as e:
+            body, status_code = reply.connection_error(e)
+        return Response(body, status=status_code)
+
+
+# نسخه async همان endpoint برای اجرا زیر ASGI (uvicorn/daphne):
+# در زمان انتظار برای Gemini هیچ thread یا workerی اشغال نمی‌شود.
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatAPIView(View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        user, user_message, error = await read_async_chat_request(request)
+        if error:
+            return error
+
+        reply = await sync_to_async(ChatReply)(user, user_message)
+        if reply.cached_answer is not None:
+            return JsonResponse(await sync_to_async(reply.complete)(reply.cached_answer))
         try:
-            gemini_response = requests.post(
-                f"{GEMINI_API_URL}?key={settings.GEMINI_API_KEY}",
-                headers={"Content-Type": "application/json"},
-                json=data,
-                timeout=20
-            )
-            if gemini_response.status_code == 200:
-                g_response = gemini_response.json().get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "پاسخی دریافت نشد.")
-                
-                msg = Message.objects.create(user=request.user if request.user.is_authenticated else None,
-                                            text=user_message, response=g_response)
-                return Response({'answer': g_response, 'chat': MessageSerializer(msg).data})
-            else:
-                return Response({'error': 'خطا در ارتباط با هوش مصنوعی گیاه یار.', 'detail': gemini_response.text}, status=gemini_response.status_code)
+            response = await http_client.apost(gemini_url(), **reply.request_kwargs())
+            body, status_code = await sync_to_async(reply.answer_from)(response)
         except Exception as e:
-            return Response({'error': 'ارتباط با سرور چت بات ممکن نشد.', 'detail': str(e)}, status=500)
+            body, status_code = await sync_to_async(reply.connection_error)(e)
+        return JsonResponse(body, status=status_code)
+
+
+# پاسخ استریم (SSE): رویدادهای token به محض رسیدن از Gemini ارسال می‌شوند و در پایان رویداد done
+# شامل پاسخ کامل و پیام ذخیره‌شده. زیر gunicorn هر استریم یک worker را تا پایان پاسخ نگه می‌دارد؛
+# برای تعداد زیاد کاربر همزمان از نسخه async زیر ASGI استفاده شود.
+class ChatStreamAPIView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        user_message = request.data.get('message', '').strip()
+        error = check_chat_request(request.user, user_message)
+        if error:
+            return Response(error[0], status=error[1])
+        return sse_response(stream_chat(request.user, user_message))
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatStreamAPIView(View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        user, user_message, error = await read_async_chat_request(request)
+        if error:
+            return error
+        return sse_response(astream_chat(user, user_message))
+
+
+# آمار کش پاسخ‌های چت (نرخ hit و زمان صرفه‌جویی‌شده) و پاک کردن کامل کش برای ادمین
+class ChatAnswerCacheView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(ChatAnswerCache().stats())
+
+    def delete(self, request):
+        ChatAnswerCache().purge()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# وضعیت کانتکست گفتگوی کاربر جاری و شروع گفتگوی جدید
+class ChatContextView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(ConversationContext.load(request.user).snapshot())
+
+    def delete(self, request):
+        ConversationContext(request.user.pk).reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
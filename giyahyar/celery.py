@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import task_postrun
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'giyahyar.settings')
@@ -13,3 +14,8 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@task_postrun.connect
+def flush_metrics(**kwargs):
+    # متریک‌های worker سلری هم مثل workerهای وب به مجموع مشترک در کش اضافه می‌شوند
+    from utils.metrics import registry
+    registry.maybe_flush()
@@ -13,7 +13,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from datetime import timedelta
+from celery.schedules import crontab
 from decouple import config, Csv
 from dotenv import load_dotenv
 
@@ -31,6 +33,25 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config('SECRET_KEY')
 
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+GEMINI_API_URL = config(
+    'GEMINI_API_URL',
+    default='https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash-002:generateContent'
+)
+# نسخه استریم (SSE) برای endpoint چت استریم
+GEMINI_STREAM_API_URL = config(
+    'GEMINI_STREAM_API_URL',
+    default='https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash-002:streamGenerateContent'
+)
+
+AI_API_KEY = config('AI_API_KEY', default='')
+PLANT_ID_API_URL = config('PLANT_ID_API_URL', default='https://api.plant.id/v2/identify')
+
+# اگر فعال باشد، تشخیص هوش مصنوعی در صف Celery اجرا می‌شود و endpoint پاسخ 202 برمی‌گرداند
+AI_DIAGNOSIS_ASYNC = config('AI_DIAGNOSIS_ASYNC', default=False, cast=bool)
+
+# Plant.id چند تصویر از یک گیاه را در یک درخواست می‌پذیرد
+AI_DIAGNOSIS_MAX_IMAGES = config('AI_DIAGNOSIS_MAX_IMAGES', default=5, cast=int)
+AI_DIAGNOSIS_BULK_MAX_PLANTS = config('AI_DIAGNOSIS_BULK_MAX_PLANTS', default=20, cast=int)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=False, cast=bool)
@@ -62,11 +83,12 @@ INSTALLED_APPS = [
     'subscription',
     'notifications',
     'chat',
+    'analytics',
 
 ]
 
 MIDDLEWARE = [
-
+    'utils.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,11 +99,24 @@ MIDDLEWARE = [
 
 ]
 
+# پروفایل درخواست‌ها (utils/profiling.py): زمان همه درخواست‌ها ثبت می‌شود؛ کوئری‌ها، سرویس‌های بیرونی و حجم پاسخ
+# فقط برای نمونه‌ای با این نرخ. اجرای یک کوئری یکسان به تعداد آستانه یا بیشتر در یک درخواست، N+1 گزارش می‌شود.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.1, cast=float)
+PROFILING_N_PLUS_ONE_THRESHOLD = config('PROFILING_N_PLUS_ONE_THRESHOLD', default=5, cast=int)
+# توکن scraper پرومتئوس برای /metrics/؛ خالی یعنی فقط کاربران staff
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# هر پروسه متریک‌هایش را هر چند ثانیه به مجموع مشترک در کش اضافه می‌کند (/metrics/ مجموع همه workerها را نشان می‌دهد)
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
 }
+# اندازه صفحه صفحه‌بندی cursor در endpointهای لیستی (utils/pagination.py)؛ با ?page_size= تا سقف قابل تغییر است
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=20, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=100, cast=int)
 
 # Celery settings
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
@@ -91,6 +126,156 @@ CELERY_TIMEZONE = 'Asia/Tehran'
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# ارسال FCM: firebase (واقعی) یا fake (ترنسپورت محلی برای تست و بنچمارک بدون Google)
+FCM_TRANSPORT = config('FCM_TRANSPORT', default='firebase')
+FCM_FAKE_LATENCY = config('FCM_FAKE_LATENCY', default=0.0, cast=float)
+# تعداد دسته‌های ۵۰۰تایی که همزمان ارسال می‌شوند
+FCM_MAX_CONCURRENT_BATCHES = config('FCM_MAX_CONCURRENT_BATCHES', default=4, cast=int)
+
+# اعلان‌های تاپیکی (outbox): سرعت ارسال، تعداد برداشت در هر اجرا، lease و سیاست تلاش مجدد
+BROADCAST_RATE_PER_SECOND = config('BROADCAST_RATE_PER_SECOND', default=5.0, cast=float)
+BROADCAST_BATCH_SIZE = config('BROADCAST_BATCH_SIZE', default=50, cast=int)
+BROADCAST_LEASE_SECONDS = config('BROADCAST_LEASE_SECONDS', default=300, cast=int)
+BROADCAST_MAX_ATTEMPTS = config('BROADCAST_MAX_ATTEMPTS', default=5, cast=int)
+BROADCAST_RETRY_DELAY = config('BROADCAST_RETRY_DELAY', default=60, cast=int)
+
+# زمان‌بندی یادآوری آبیاری:
+# sweep: یک تسک دوره‌ای گیاهان سررسیدشده را با کوئری بازه‌ای روی next_watering پیدا می‌کند
+# periodic_task: روش قدیمی با یک PeriodicTask جداگانه برای هر گیاه
+WATERING_SCHEDULER = config('WATERING_SCHEDULER', default='sweep')
+WATERING_SWEEP_INTERVAL_MINUTES = config('WATERING_SWEEP_INTERVAL_MINUTES', default=15, cast=int)
+WATERING_SWEEP_BATCH_SIZE = config('WATERING_SWEEP_BATCH_SIZE', default=500, cast=int)
+
+# شمارنده‌های مصرف قابلیت‌ها در کش (subscription/services/metering) و ذخیره گروهی آن‌ها در دیتابیس هر چند ثانیه
+METERING_FLUSH_INTERVAL = config('METERING_FLUSH_INTERVAL', default=60, cast=int)
+METERING_FLUSH_BATCH_SIZE = config('METERING_FLUSH_BATCH_SIZE', default=1000, cast=int)
+# لاگ شمارنده‌های تغییرکرده چند بازه flush نگه داشته می‌شود (اگر worker مدتی از کار بیفتد)
+METERING_LOG_RETENTION_EPOCHS = config('METERING_LOG_RETENTION_EPOCHS', default=60, cast=int)
+# شمارنده هر بازه پس از پایان آن تا این مدت در کش می‌ماند تا مقدار نهایی ذخیره شود
+METERING_COUNTER_GRACE = config('METERING_COUNTER_GRACE', default=60 * 60 * 24 * 2, cast=int)
+METERING_QUOTA_CACHE_TIMEOUT = config('METERING_QUOTA_CACHE_TIMEOUT', default=60 * 60, cast=int)
+
+# یادآوری و انقضای اشتراک‌ها (ساعتی) در دسته‌های با اندازه ثابت
+SUBSCRIPTION_SWEEP_CHUNK_SIZE = config('SUBSCRIPTION_SWEEP_CHUNK_SIZE', default=1000, cast=int)
+
+# حداکثر طول بازه API سری زمانی شاخص‌های روزانه (analytics)
+ANALYTICS_MAX_RANGE_DAYS = config('ANALYTICS_MAX_RANGE_DAYS', default=366, cast=int)
+
+# پیش‌بینی فاصله آبیاری از WateringLog: ضریب کاهش وزن فاصله‌های قدیمی‌تر، وزن prior (تعداد مشاهده فرضی)،
+# بازه فاصله‌های معتبر (روز) و حداقل تعداد گیاه دارای سابقه برای prior هر گونه
+WATERING_PREDICTION_ENABLED = config('WATERING_PREDICTION_ENABLED', default=True, cast=bool)
+WATERING_PREDICTION_DECAY = config('WATERING_PREDICTION_DECAY', default=0.8, cast=float)
+WATERING_PREDICTION_PRIOR_WEIGHT = config('WATERING_PREDICTION_PRIOR_WEIGHT', default=2.0, cast=float)
+WATERING_PREDICTION_MIN_INTERVAL = config('WATERING_PREDICTION_MIN_INTERVAL', default=0.5, cast=float)
+WATERING_PREDICTION_MAX_INTERVAL = config('WATERING_PREDICTION_MAX_INTERVAL', default=90.0, cast=float)
+WATERING_PREDICTION_SPECIES_MIN_PLANTS = config('WATERING_PREDICTION_SPECIES_MIN_PLANTS', default=3, cast=int)
+WATERING_PREDICTION_BATCH_SIZE = config('WATERING_PREDICTION_BATCH_SIZE', default=20000, cast=int)
+
+# ورودی‌های ثابت beat؛ DatabaseScheduler آن‌ها را هنگام شروع در جدول PeriodicTask همگام می‌کند
+CELERY_BEAT_SCHEDULE = {
+    'sweep-due-waterings': {
+        'task': 'notifications.tasks.sweep_due_waterings',
+        'schedule': timedelta(minutes=WATERING_SWEEP_INTERVAL_MINUTES),
+    },
+    'recompute-watering-predictions': {
+        'task': 'plants.tasks.recompute_watering_predictions',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'drain-broadcast-outbox': {
+        'task': 'notifications.tasks.drain_broadcast_outbox',
+        'schedule': timedelta(minutes=1),
+    },
+    'sync-region-topics': {
+        'task': 'notifications.tasks.sync_topic_subscriptions_task',
+        'schedule': timedelta(hours=6),
+        'args': ('region',),
+    },
+    'send-subscription-reminders': {
+        'task': 'subscription.tasks.send_subscription_reminders',
+        'schedule': crontab(minute=0),
+    },
+    'flush-usage-counters': {
+        'task': 'subscription.tasks.flush_usage_counters',
+        'schedule': timedelta(seconds=METERING_FLUSH_INTERVAL),
+    },
+    'sync-species-topics': {
+        'task': 'notifications.tasks.sync_topic_subscriptions_task',
+        'schedule': timedelta(hours=6),
+        'args': ('species',),
+    },
+}
+
+# Cache
+# شمارنده‌های سهمیه و metering و کش پاسخ‌ها باید بین همه پروسه‌های web و celery مشترک باشند؛ کش حافظه محلی
+# (جدا برای هر پروسه) فقط در DEBUG یا هنگام اجرای تست‌ها مجاز است
+REDIS_URL = config('REDIS_URL', default='')
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+if not REDIS_URL and not (DEBUG or TESTING):
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured("REDIS_URL باید تنظیم شود (مثلاً redis://redis:6379/1).")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 1000},
+        }
+    }
+
+# کش نتایج Plant.id بر اساس هش محتوای تصویر
+AI_DIAGNOSIS_CACHE_ENABLED = config('AI_DIAGNOSIS_CACHE_ENABLED', default=True, cast=bool)
+AI_DIAGNOSIS_CACHE_TIMEOUT = config('AI_DIAGNOSIS_CACHE_TIMEOUT', default=60 * 60 * 24 * 7, cast=int)
+AI_DIAGNOSIS_CACHE_MAX_ITEM_BYTES = config('AI_DIAGNOSIS_CACHE_MAX_ITEM_BYTES', default=512 * 1024, cast=int)
+
+# کش پاسخ‌های دستیار چت بر اساس متن نرمال‌شده پرسش؛ سطح شباهت (n-gram) اختیاری است
+CHAT_ANSWER_CACHE_ENABLED = config('CHAT_ANSWER_CACHE_ENABLED', default=True, cast=bool)
+CHAT_ANSWER_CACHE_TIMEOUT = config('CHAT_ANSWER_CACHE_TIMEOUT', default=60 * 60 * 24 * 7, cast=int)
+CHAT_ANSWER_CACHE_SIMILARITY_ENABLED = config('CHAT_ANSWER_CACHE_SIMILARITY_ENABLED', default=False, cast=bool)
+CHAT_ANSWER_CACHE_SIMILARITY_THRESHOLD = config('CHAT_ANSWER_CACHE_SIMILARITY_THRESHOLD', default=0.75, cast=float)
+CHAT_ANSWER_CACHE_INDEX_MAX_ENTRIES = config('CHAT_ANSWER_CACHE_INDEX_MAX_ENTRIES', default=5000, cast=int)
+CHAT_ANSWER_CACHE_SEED_LIMIT = config('CHAT_ANSWER_CACHE_SEED_LIMIT', default=5000, cast=int)
+
+# کانتکست گفتگوی چت برای هر کاربر با بودجه توکن ثابت (در کش مشترک)
+CHAT_CONTEXT_TOKEN_BUDGET = config('CHAT_CONTEXT_TOKEN_BUDGET', default=1500, cast=int)
+CHAT_CONTEXT_SUMMARY_TOKEN_BUDGET = config('CHAT_CONTEXT_SUMMARY_TOKEN_BUDGET', default=400, cast=int)
+CHAT_CONTEXT_TIMEOUT = config('CHAT_CONTEXT_TIMEOUT', default=60 * 60 * 24, cast=int)
+CHAT_CONTEXT_REBUILD_MESSAGES = config('CHAT_CONTEXT_REBUILD_MESSAGES', default=10, cast=int)
+
+# رکورد کش‌شده اشتراک و شمارنده‌های سهمیه هر کاربر (subscription/services/entitlement)؛ 0 یعنی نامحدود
+ENTITLEMENT_CACHE_TIMEOUT = config('ENTITLEMENT_CACHE_TIMEOUT', default=60 * 60, cast=int)
+ENTITLEMENT_FREE_DIAGNOSES = config('ENTITLEMENT_FREE_DIAGNOSES', default=3, cast=int)
+ENTITLEMENT_FREE_CHAT_PER_DAY = config('ENTITLEMENT_FREE_CHAT_PER_DAY', default=0, cast=int)
+
+# استفاده مجدد از تشخیص‌های اخیر برای تصاویر تقریباً تکراری (فاصله همینگ هش ادراکی)
+AI_DIAGNOSIS_NEAR_DUPLICATE_ENABLED = config('AI_DIAGNOSIS_NEAR_DUPLICATE_ENABLED', default=True, cast=bool)
+AI_DIAGNOSIS_NEAR_DUPLICATE_MAX_DISTANCE = config('AI_DIAGNOSIS_NEAR_DUPLICATE_MAX_DISTANCE', default=10, cast=int)
+AI_DIAGNOSIS_NEAR_DUPLICATE_DHASH_MAX_DISTANCE = config('AI_DIAGNOSIS_NEAR_DUPLICATE_DHASH_MAX_DISTANCE', default=16,
+                                                        cast=int)
+AI_DIAGNOSIS_REUSE_DAYS = config('AI_DIAGNOSIS_REUSE_DAYS', default=30, cast=int)
+
+# پیش‌پردازش تصویر پیش از ارسال به Plant.id (کوچک‌سازی، حذف EXIF و فشرده‌سازی مجدد)
+AI_IMAGE_PREPROCESS_ENABLED = config('AI_IMAGE_PREPROCESS_ENABLED', default=True, cast=bool)
+AI_IMAGE_MAX_SIDE = config('AI_IMAGE_MAX_SIDE', default=1024, cast=int)
+AI_IMAGE_FORMAT = config('AI_IMAGE_FORMAT', default='JPEG')
+AI_IMAGE_QUALITY = config('AI_IMAGE_QUALITY', default=85, cast=int)
+
+# کلاینت HTTP مشترک برای سرویس‌های بیرونی (Plant.id، Gemini)
+OUTBOUND_HTTP_POOL_SIZE = config('OUTBOUND_HTTP_POOL_SIZE', default=20, cast=int)
+# در مسیر ASGI یک پروسه صدها درخواست هم‌زمان دارد، پس pool بزرگ‌تری لازم است
+OUTBOUND_HTTP_ASYNC_POOL_SIZE = config('OUTBOUND_HTTP_ASYNC_POOL_SIZE', default=200, cast=int)
+OUTBOUND_HTTP_KEEPALIVE = config('OUTBOUND_HTTP_KEEPALIVE', default=10, cast=int)
+OUTBOUND_HTTP_CONNECT_TIMEOUT = config('OUTBOUND_HTTP_CONNECT_TIMEOUT', default=5.0, cast=float)
+OUTBOUND_HTTP_READ_TIMEOUT = config('OUTBOUND_HTTP_READ_TIMEOUT', default=30.0, cast=float)
+OUTBOUND_HTTP2 = config('OUTBOUND_HTTP2', default=True, cast=bool)
+
 # JWT (Simple JWT) Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
@@ -254,6 +439,16 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'utils.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'httpx': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
         'django': {
             'handlers': ['console'],
             'level': 'INFO',
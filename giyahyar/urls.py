@@ -7,6 +7,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from utils.views import metrics_view
+
 
 # Swagger
 schema_view = get_schema_view(
@@ -29,6 +31,8 @@ urlpatterns = [
     path('subscription/', include('subscription.urls')),
     path('chat/', include('chat.urls')),
     path('fcm/', include('notifications.urls')),
+    path('analytics/', include('analytics.urls')),
+    path('metrics/', metrics_view, name='metrics'),
     
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -1,12 +1,20 @@
 from django.contrib import admin
-from .models import FCMDevice
+from .models import Broadcast, FCMDevice
 
 @admin.register(FCMDevice)
 class FCMDeviceAdmin(admin.ModelAdmin):
-    list_display = ('user', 'registration_id', 'is_active', 'created_at')
-    list_filter = ('is_active', 'created_at')
+    list_display = ('user', 'registration_id', 'region', 'is_active', 'created_at')
+    list_filter = ('is_active', 'region', 'created_at')
     search_fields = ('registration_id', 'user__username')
     readonly_fields = ('created_at',)
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
\ No newline at end of file
+        return super().get_queryset(request).select_related('user')
+
+
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ('topic', 'title', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('topic', 'title', 'idempotency_key')
+    readonly_fields = ('status', 'attempts', 'message_id', 'last_error', 'created_at', 'sent_at')
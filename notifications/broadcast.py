@@ -0,0 +1,151 @@
+import logging
+import uuid
+from collections import defaultdict
+from urllib.parse import quote
+
+from django.db import transaction
+
+from plants.models import Plant
+from .firebase_service import (
+    FCM_TOPIC_BATCH_LIMIT, deactivate_invalid_tokens, is_invalid_token_error, subscribe_to_topic,
+    unsubscribe_from_topic,
+)
+from .models import Broadcast, FCMDevice, TopicSubscription
+
+logger = logging.getLogger(__name__)
+
+TOPIC_REGION = 'region'
+TOPIC_SPECIES = 'species'
+TOPIC_KINDS = (TOPIC_REGION, TOPIC_SPECIES)
+
+
+def topic_name(kind, value):
+    """
+    نام تاپیک FCM برای منطقه یا گونه گیاه، مثل region-tehran یا species-%D8%B1%D8%B2.
+    FCM فقط [a-zA-Z0-9-_.~%] را می‌پذیرد؛ نام‌های فارسی percent-encode می‌شوند.
+    """
+    normalized = '-'.join((value or '').strip().lower().split())
+    if not normalized:
+        return None
+    return f"{kind}-{quote(normalized, safe='')}"
+
+
+def topic_values(kind):
+    """{topic: [مقادیر خام]}؛ چند مقدار (مثلاً «Tehran» و «tehran») ممکن است به یک تاپیک برسند"""
+    if kind == TOPIC_REGION:
+        values = FCMDevice.objects.filter(is_active=True).exclude(region='').values_list('region', flat=True)
+    else:
+        values = Plant.objects.filter(is_active=True).exclude(species='').values_list('species', flat=True)
+    topics = defaultdict(list)
+    for value in values.order_by().distinct().iterator(chunk_size=5000):
+        topic = topic_name(kind, value)
+        if topic:
+            topics[topic].append(value)
+    return topics
+
+
+def desired_devices(kind, values):
+    """(device_id, token) دستگاه‌های فعالی که باید عضو تاپیک مقادیر values باشند"""
+    devices = FCMDevice.objects.filter(is_active=True)
+    if kind == TOPIC_REGION:
+        devices = devices.filter(region__in=values)
+    else:
+        devices = devices.filter(user__plants__is_active=True, user__plants__species__in=values)
+    return devices.values_list('id', 'registration_id').distinct()
+
+
+def sync_topic(topic, wanted_rows, current_rows, chunk_size=FCM_TOPIC_BATCH_LIMIT):
+    """
+    همگام‌سازی یک تاپیک در پنجره‌های پشت‌سرهم شناسه دستگاه (keyset): در هر پنجره حداکثر chunk_size ردیف از
+    دستگاه‌های مورد نیاز و عضویت‌های فعلی خوانده و مقایسه می‌شود، پس حافظه مستقل از تعداد اعضای تاپیک است.
+    نوشتن‌های هر پنجره فقط شناسه‌های همان پنجره را تغییر می‌دهند و روی پنجره‌های بعدی اثری ندارند.
+    """
+    added = removed = 0
+    cursor = 0
+    while True:
+        wanted = list(wanted_rows.filter(id__gt=cursor).order_by('id')[:chunk_size])
+        existing = list(current_rows.filter(device_id__gt=cursor).order_by('device_id')[:chunk_size])
+        if not wanted and not existing:
+            break
+        # پنجره تا جایی است که هر دو جریان کامل خوانده شده‌اند
+        ends = [rows[-1][0] for rows in (wanted, existing) if len(rows) == chunk_size]
+        end = min(ends) if ends else None
+        if end is not None:
+            wanted = [row for row in wanted if row[0] <= end]
+            existing = [row for row in existing if row[0] <= end]
+
+        wanted_tokens = dict(wanted)
+        existing_by_device = {device_id: (subscription_id, token) for device_id, subscription_id, token in existing}
+
+        new_devices = [device_id for device_id in wanted_tokens if device_id not in existing_by_device]
+        if new_devices:
+            tokens = [wanted_tokens[device_id] for device_id in new_devices]
+            results = subscribe_to_topic(tokens, topic)
+            TopicSubscription.objects.bulk_create(
+                [TopicSubscription(device_id=device_id, topic=topic)
+                 for device_id, (ok, _) in zip(new_devices, results) if ok],
+                ignore_conflicts=True,
+            )
+            added += sum(1 for ok, _ in results if ok)
+            deactivate_invalid_tokens(tokens, results)
+
+        stale = [row for device_id, row in existing_by_device.items() if device_id not in wanted_tokens]
+        if stale:
+            tokens = [token for _, token in stale]
+            results = unsubscribe_from_topic(tokens, topic)
+            # توکن نامعتبر عملاً عضو تاپیک نیست؛ ردیف آن هم حذف می‌شود
+            done = [subscription_id for (subscription_id, _), (ok, error_msg) in zip(stale, results)
+                    if ok or is_invalid_token_error(error_msg)]
+            TopicSubscription.objects.filter(id__in=done).delete()
+            removed += len(done)
+
+        if end is None:
+            break
+        cursor = end
+    return added, removed
+
+
+def sync_topic_subscriptions(kind):
+    """
+    همگام‌سازی گروهی عضویت تاپیک‌ها با وضعیت فعلی دیتابیس: تاپیک‌ها یکی‌یکی و هر کدام در پنجره‌های
+    FCM_TOPIC_BATCH_LIMIT تایی مقایسه می‌شوند و فقط تفاوت‌ها (عضویت‌های جدید و منسوخ) به FCM فرستاده می‌شوند.
+    خروجی: تعداد عضویت‌های اضافه‌شده و حذف‌شده.
+    """
+    if kind not in TOPIC_KINDS:
+        raise ValueError(f"Unknown topic kind: {kind}")
+
+    values_by_topic = topic_values(kind)
+    current_topics = set(
+        TopicSubscription.objects.filter(topic__startswith=f"{kind}-").values_list('topic', flat=True).distinct()
+    )
+
+    added = removed = 0
+    for topic in sorted(values_by_topic.keys() | current_topics):
+        values = values_by_topic.get(topic)
+        wanted = desired_devices(kind, values) if values else FCMDevice.objects.none().values_list('id', 'registration_id')
+        current = TopicSubscription.objects.filter(topic=topic).values_list('device_id', 'id', 'device__registration_id')
+        topic_added, topic_removed = sync_topic(topic, wanted, current)
+        added += topic_added
+        removed += topic_removed
+
+    logger.info(f"📡 همگام‌سازی تاپیک‌های {kind}: {added} عضویت جدید، {removed} عضویت حذف شد.")
+    return {'added': added, 'removed': removed, 'topics': len(values_by_topic)}
+
+
+def enqueue_broadcast(topic, title, body, data=None, idempotency_key=None, send_at=None, created_by=None):
+    """
+    ثبت اعلان تاپیکی در outbox در همان تراکنش فراخواننده؛ ارسال پس از commit توسط drain_broadcast_outbox انجام می‌شود.
+    با idempotency_key تکراری ردیف قبلی برگردانده می‌شود و پیام دوباره ارسال نمی‌شود. خروجی: (broadcast, created)
+    """
+    from .tasks import drain_broadcast_outbox
+
+    defaults = {'topic': topic, 'title': title, 'body': body, 'data': data or {}, 'created_by': created_by}
+    if send_at is not None:
+        defaults['available_at'] = send_at
+    with transaction.atomic():
+        broadcast, created = Broadcast.objects.get_or_create(
+            idempotency_key=idempotency_key or uuid.uuid4().hex, defaults=defaults,
+        )
+        if created:
+            transaction.on_commit(drain_broadcast_outbox.delay)
+    return broadcast, created
@@ -1,8 +1,14 @@
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, messaging
 from decouple import config
+from django.conf import settings
+
+from utils.profiling import timed_outbound
 
 
 logger = logging.getLogger(__name__)
@@ -14,38 +20,281 @@ NOTIFICATION_TITLE = config('NOTIFICATION_TITLE', default='پیام جدید ا
 NOTIFICATION_BODY = config('NOTIFICATION_BODY', default='شما یک پیام مهم دارید!')
 
 
+# برچسب میزبان در متریک تاخیر سرویس‌های بیرونی (Firebase Admin SDK از http_client عبور نمی‌کند)
+FCM_HOST = 'fcm.googleapis.com'
+
+_firebase_ready = False
+_firebase_lock = threading.Lock()
+
+
 def initialize_firebase():
-    if not firebase_admin._apps:
-        try:
-            cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
-            firebase_admin.initialize_app(cred)
-            logger.info("✅ Firebase initialized")
-        except Exception as e:
-            logger.error(f"❌ Firebase initialization failed: {e}")
-    else:
-        logger.info("🔄 Firebase was already initialized")
+    """مقداردهی اولیه یک‌باره؛ فراخوانی‌های بعدی فقط یک بررسی flag هستند"""
+    global _firebase_ready
+    if _firebase_ready:
+        return
+    with _firebase_lock:
+        if _firebase_ready:
+            return
+        if not firebase_admin._apps:
+            try:
+                cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+                firebase_admin.initialize_app(cred)
+                logger.info("✅ Firebase initialized")
+            except Exception as e:
+                logger.error(f"❌ Firebase initialization failed: {e}")
+                return
+        _firebase_ready = True
 
 
-def send_notification(token, title, body, data=None):
-    initialize_firebase()
+# محدودیت FCM برای تعداد پیام در هر درخواست send_each / send_each_for_multicast
+FCM_BATCH_LIMIT = 500
+
+# محدودیت FCM برای تعداد توکن در هر درخواست subscribe_to_topic / unsubscribe_from_topic
+FCM_TOPIC_BATCH_LIMIT = 1000
+
+# خطاهایی که یعنی توکن دیگر معتبر نیست و دستگاه باید غیرفعال شود
+INVALID_TOKEN_ERRORS = (
+    "InvalidRegistrationToken", "NotRegistered", "BadDeviceToken", "UnregisteredError", "SenderIdMismatchError",
+    "registration-token-not-registered", "NOT_FOUND",
+)
+
+
+class FirebaseTransport:
+    """ارسال واقعی از طریق Firebase Admin SDK"""
+
+    def send(self, message):
+        initialize_firebase()
+        return messaging.send(message)
+
+    def send_each(self, messages):
+        initialize_firebase()
+        return messaging.send_each(messages)
+
+    def send_each_for_multicast(self, multicast_message):
+        initialize_firebase()
+        return messaging.send_each_for_multicast(multicast_message)
+
+    def subscribe_to_topic(self, tokens, topic):
+        initialize_firebase()
+        return messaging.subscribe_to_topic(tokens, topic)
+
+    def unsubscribe_from_topic(self, tokens, topic):
+        initialize_firebase()
+        return messaging.unsubscribe_from_topic(tokens, topic)
+
+
+class FakeTransport:
+    """
+    ترنسپورت محلی برای تست و بنچمارک بدون تماس با Google: هر درخواست latency ثانیه طول می‌کشد و
+    توکن‌هایی که با INVALID_PREFIX شروع شوند یا در invalid_tokens باشند با UnregisteredError رد می‌شوند.
+    """
+    INVALID_PREFIX = 'invalid-'
+
+    def __init__(self, latency=0.0, invalid_tokens=()):
+        self.latency = latency
+        self.invalid_tokens = set(invalid_tokens)
+        self.requests = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def _response(self, token):
+        if token and (token.startswith(self.INVALID_PREFIX) or token in self.invalid_tokens):
+            return messaging.SendResponse(None, messaging.UnregisteredError('Requested entity was not found.'))
+        return messaging.SendResponse({'name': f'projects/fake/messages/{token}'}, None)
+
+    def _batch(self, tokens):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            self.messages += len(tokens)
+        return messaging.BatchResponse([self._response(token) for token in tokens])
+
+    def send(self, message):
+        response = self._batch([message.token]).responses[0]
+        if not response.success:
+            raise response.exception
+        return response.message_id
+
+    def send_each(self, messages):
+        return self._batch([message.token for message in messages])
+
+    def send_each_for_multicast(self, multicast_message):
+        return self._batch(multicast_message.tokens)
+
+    def _topic_management(self, tokens):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+        return messaging.TopicManagementResponse({'results': [
+            {'error': 'NOT_FOUND'} if token.startswith(self.INVALID_PREFIX) or token in self.invalid_tokens else {}
+            for token in tokens
+        ]})
+
+    def subscribe_to_topic(self, tokens, topic):
+        return self._topic_management(tokens)
+
+    def unsubscribe_from_topic(self, tokens, topic):
+        return self._topic_management(tokens)
+
+
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        if settings.FCM_TRANSPORT == 'fake':
+            _transport = FakeTransport(latency=settings.FCM_FAKE_LATENCY)
+        else:
+            _transport = FirebaseTransport()
+    return _transport
+
+
+def set_transport(transport):
+    """جایگزینی ترنسپورت (مثلاً FakeTransport در تست و بنچمارک)؛ None یعنی بازگشت به تنظیمات"""
+    global _transport
+    _transport = transport
 
+
+def is_invalid_token_error(error_msg):
+    return bool(error_msg) and any(code in error_msg for code in INVALID_TOKEN_ERRORS)
+
+
+def build_message(token, title, body, data=None):
+    return messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        data=data or {},
+        token=token if not token.startswith("/topics/") else None,
+        topic=token[8:] if token.startswith("/topics/") else None,
+    )
+
+
+@timed_outbound(FCM_HOST)
+def send_notification(token, title, body, data=None):
+    """خروجی: (ارسال موفق، پیام خطا)"""
     try:
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            data=data or {},
-            token=token if not token.startswith("/topics/") else None,
-            topic=token[8:] if token.startswith("/topics/") else None,
-        )
-
-        response = messaging.send(message)
+        message = build_message(token, title, body, data)
+
+        response = get_transport().send(message)
         logger.info(f"✅ Message sent successfully to {token}: {response}")
-        return True
+        return True, None
 
     except Exception as e:
         logger.error(f"❌ Failed to send message to {token}: {e}", exc_info=True)
-        return False
+        return False, f"{type(e).__name__}: {e}"
+
+
+def _batch_results(batch):
+    return [
+        (True, None) if response.success else (False, f"{type(response.exception).__name__}: {response.exception}")
+        for response in batch.responses
+    ]
+
+
+def _run_batches(send_batch, chunks):
+    """اجرای دسته‌ها به صورت همزمان (حداکثر FCM_MAX_CONCURRENT_BATCHES) با حفظ ترتیب نتایج"""
+    def run(chunk):
+        try:
+            batch = send_batch(chunk)
+        except Exception as e:
+            logger.error(f"❌ Failed to send FCM batch of {len(chunk)} messages: {e}", exc_info=True)
+            return [(False, f"{type(e).__name__}: {e}")] * len(chunk)
+        logger.info(f"📨 FCM batch: {batch.success_count} sent, {batch.failure_count} failed")
+        return _batch_results(batch)
+
+    workers = min(settings.FCM_MAX_CONCURRENT_BATCHES, len(chunks))
+    if workers <= 1:
+        batches = [run(chunk) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(run, chunks))
+    return [result for batch in batches for result in batch]
+
+
+def _chunks(items):
+    return [items[start:start + FCM_BATCH_LIMIT] for start in range(0, len(items), FCM_BATCH_LIMIT)]
+
+
+@timed_outbound(FCM_HOST)
+def send_each(notifications):
+    """
+    ارسال گروهی پیام‌های متفاوت با send_each در دسته‌های حداکثر FCM_BATCH_LIMIT تایی.
+    notifications: لیست (token, title, body, data)؛ خروجی: لیست (ارسال موفق، پیام خطا) به همان ترتیب.
+    """
+    if not notifications:
+        return []
+    transport = get_transport()
+    return _run_batches(
+        lambda chunk: transport.send_each([build_message(*notification) for notification in chunk]),
+        _chunks(list(notifications)),
+    )
+
+
+@timed_outbound(FCM_HOST)
+def send_multicast(tokens, title, body, data=None):
+    """
+    ارسال یک پیام به چند توکن با send_each_for_multicast (هر درخواست حداکثر FCM_BATCH_LIMIT توکن)
+    خروجی: لیست (ارسال موفق، پیام خطا) به ترتیب tokens.
+    """
+    if not tokens:
+        return []
+    transport = get_transport()
+    notification = messaging.Notification(title=title, body=body)
+    return _run_batches(
+        lambda chunk: transport.send_each_for_multicast(
+            messaging.MulticastMessage(tokens=chunk, notification=notification, data=data or {})
+        ),
+        _chunks(list(tokens)),
+    )
+
+
+@timed_outbound(FCM_HOST)
+def send_to_topic(topic, title, body, data=None):
+    """ارسال یک پیام به همه مشترکان تاپیک با یک درخواست؛ خطا به فراخواننده (outbox) سپرده می‌شود"""
+    return get_transport().send(build_message(f"/topics/{topic}", title, body, data))
+
+
+@timed_outbound(FCM_HOST)
+def _manage_topic(operation, tokens, topic):
+    """اجرای subscribe/unsubscribe در دسته‌های FCM_TOPIC_BATCH_LIMIT تایی؛ خروجی: لیست (موفق، پیام خطا)"""
+    transport = get_transport()
+    results = []
+    for start in range(0, len(tokens), FCM_TOPIC_BATCH_LIMIT):
+        chunk = tokens[start:start + FCM_TOPIC_BATCH_LIMIT]
+        try:
+            response = getattr(transport, operation)(chunk, topic)
+        except Exception as e:
+            logger.error(f"❌ {operation} for {len(chunk)} tokens on topic '{topic}' failed: {e}", exc_info=True)
+            results.extend([(False, f"{type(e).__name__}: {e}")] * len(chunk))
+            continue
+        chunk_results = [(True, None)] * len(chunk)
+        for error in response.errors:
+            chunk_results[error.index] = (False, error.reason)
+        results.extend(chunk_results)
+    return results
+
+
+def subscribe_to_topic(tokens, topic):
+    return _manage_topic('subscribe_to_topic', list(tokens), topic)
+
+
+def unsubscribe_from_topic(tokens, topic):
+    return _manage_topic('unsubscribe_from_topic', list(tokens), topic)
+
+
+def deactivate_invalid_tokens(tokens, results):
+    """غیرفعال‌سازی دستگاه‌های دارای توکن نامعتبر با یک UPDATE؛ خروجی: تعداد دستگاه‌های غیرفعال‌شده"""
+    from .models import FCMDevice
 
-config("FIREBASE_CREDENTIAL_PATH")
\ No newline at end of file
+    dead_tokens = [token for token, (sent, error_msg) in zip(tokens, results)
+                   if not sent and is_invalid_token_error(error_msg)]
+    if not dead_tokens:
+        return 0
+    deactivated = FCMDevice.objects.filter(registration_id__in=dead_tokens, is_active=True).update(is_active=False)
+    logger.warning(f"⚠️ {deactivated} توکن FCM نامعتبر غیرفعال شد.")
+    return deactivated
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from notifications.firebase_service import FakeTransport, send_multicast, set_transport
+
+
+class Command(BaseCommand):
+    help = (
+        "اندازه‌گیری توان ارسال send_multicast (پیام در ثانیه) با ترنسپورت FCM ساختگی محلی "
+        "برای تعداد مختلف دسته‌های همزمان. به Google درخواستی ارسال نمی‌شود."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=10000)
+        parser.add_argument('--latency', type=float, default=0.2, help="تاخیر هر درخواست دسته‌ای (ثانیه)")
+        parser.add_argument('--invalid-ratio', type=float, default=0.02)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+
+    def handle(self, *args, **options):
+        invalid_every = int(1 / options['invalid_ratio']) if options['invalid_ratio'] > 0 else 0
+        tokens = [
+            f"{FakeTransport.INVALID_PREFIX if invalid_every and i % invalid_every == 0 else ''}bench-token-{i}"
+            for i in range(options['tokens'])
+        ]
+
+        self.stdout.write(f"{'batches':>8} {'requests':>9} {'sent':>7} {'failed':>7} {'seconds':>8} {'msg/s':>9}")
+        for concurrency in options['concurrency']:
+            transport = FakeTransport(latency=options['latency'])
+            set_transport(transport)
+            try:
+                with override_settings(FCM_MAX_CONCURRENT_BATCHES=concurrency):
+                    started = time.perf_counter()
+                    results = send_multicast(tokens, 'Benchmark', 'FCM throughput')
+                    seconds = time.perf_counter() - started
+            finally:
+                set_transport(None)
+
+            sent = sum(1 for ok, _ in results if ok)
+            self.stdout.write(
+                f"{concurrency:>8} {transport.requests:>9} {sent:>7} {len(results) - sent:>7} "
+                f"{seconds:>8.2f} {len(results) / seconds:>9.0f}"
+            )
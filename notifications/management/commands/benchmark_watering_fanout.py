@@ -0,0 +1,85 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from notifications.firebase_service import FakeTransport, set_transport
+from notifications.models import FCMDevice
+from notifications.tasks import water_plants, water_plants_batch
+from plants.models import Plant, WateringLog
+
+
+class Command(BaseCommand):
+    help = (
+        "مقایسه تعداد تسک، کوئری و push برای هر ۱۰۰۰ گیاه سررسیدشده بین water_plants (هر گیاه یک تسک) "
+        "و water_plants_batch (گروه‌بندی بر اساس کاربر). داده‌ها ساختگی هستند و در پایان rollback می‌شوند؛ "
+        "FCM واقعی فراخوانی نمی‌شود."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plants', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--devices', type=int, default=2, help="تعداد دستگاه فعال هر کاربر")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            plant_ids = self.seed(options['plants'], options['users'], options['devices'])
+            batch_size = settings.WATERING_SWEEP_BATCH_SIZE
+            batches = [plant_ids[i:i + batch_size] for i in range(0, len(plant_ids), batch_size)]
+
+            before = self.measure(lambda: [water_plants.apply(args=(plant_id,)) for plant_id in plant_ids],
+                                  tasks=len(plant_ids))
+            self.reset(plant_ids)
+            after = self.measure(lambda: [water_plants_batch(batch) for batch in batches], tasks=len(batches))
+            transaction.set_rollback(True)
+
+        scale = 1000 / len(plant_ids)
+        self.stdout.write(f"{'':>10} {'tasks':>8} {'queries':>9} {'pushes':>8} {'seconds':>8}   (per 1000 due plants)")
+        for label, result in (('before', before), ('after', after)):
+            self.stdout.write(
+                f"{label:>10} {result['tasks'] * scale:>8.0f} {result['queries'] * scale:>9.0f} "
+                f"{result['pushes'] * scale:>8.0f} {result['seconds'] * scale:>8.2f}"
+            )
+
+    @staticmethod
+    def seed(plant_count, user_count, devices_per_user):
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f'fanout-bench-{i}', phone_number=f'0999{i:07d}') for i in range(user_count)
+        ])
+        FCMDevice.objects.bulk_create([
+            FCMDevice(user=user, registration_id=f'fanout-bench-token-{user.id}-{d}-{"x" * 20}')
+            for user in users for d in range(devices_per_user)
+        ])
+        # bulk_create بدون سیگنال post_save (محاسبه هش تصویر) انجام می‌شود
+        plants = Plant.objects.bulk_create([
+            Plant(user=users[i % user_count], name=f'Bench plant {i}', image='plants/bench.png',
+                  watering_frequency=7, next_watering=date.today(), reminder_enqueued_for=date.today())
+            for i in range(plant_count)
+        ])
+        return [plant.id for plant in plants]
+
+    @staticmethod
+    def reset(plant_ids):
+        Plant.objects.filter(id__in=plant_ids).update(
+            last_watered=None, next_watering=date.today(), reminder_enqueued_for=date.today(),
+        )
+        WateringLog.objects.filter(plant_id__in=plant_ids).delete()
+
+    @staticmethod
+    def measure(run, tasks):
+        transport = FakeTransport()
+        set_transport(transport)
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                run()
+                seconds = time.perf_counter() - started
+        finally:
+            set_transport(None)
+
+        return {'tasks': tasks, 'queries': len(queries), 'pushes': transport.messages, 'seconds': seconds}
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from notifications.broadcast import TOPIC_KINDS, sync_topic_subscriptions
+
+
+class Command(BaseCommand):
+    help = "همگام‌سازی گروهی عضویت دستگاه‌ها در تاپیک‌های FCM منطقه و گونه گیاه (در دسته‌های ۱۰۰۰ توکنی)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=TOPIC_KINDS, action='append',
+                            help="پیش‌فرض: همه انواع تاپیک")
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or TOPIC_KINDS:
+            result = sync_topic_subscriptions(kind)
+            self.stdout.write(self.style.SUCCESS(
+                f"{kind}: {result['topics']} تاپیک، {result['added']} عضویت جدید، {result['removed']} عضویت حذف شد."
+            ))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fcmdevice',
+            name='region',
+            field=models.CharField(blank=True, db_index=True, max_length=50, verbose_name='Region'),
+        ),
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=100, unique=True, verbose_name='Idempotency Key')),
+                ('topic', models.CharField(max_length=255, verbose_name='Topic')),
+                ('title', models.CharField(max_length=255, verbose_name='Title')),
+                ('body', models.TextField(verbose_name='Body')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='Data')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Available At')),
+                ('message_id', models.CharField(blank=True, max_length=255, verbose_name='FCM Message ID')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent At')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='broadcasts', to=settings.AUTH_USER_MODEL, verbose_name='Created By')),
+            ],
+            options={
+                'verbose_name': 'Broadcast',
+                'verbose_name_plural': 'Broadcasts',
+                'ordering': ['available_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='broadcast_status_available_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TopicSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(db_index=True, max_length=255, verbose_name='Topic')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_subscriptions', to='notifications.fcmdevice', verbose_name='FCM Device')),
+            ],
+            options={
+                'verbose_name': 'Topic Subscription',
+                'verbose_name_plural': 'Topic Subscriptions',
+                'constraints': [models.UniqueConstraint(fields=('device', 'topic'), name='unique_device_topic')],
+            },
+        ),
+    ]
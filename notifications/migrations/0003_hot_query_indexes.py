@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_broadcast_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fcmdevice',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user'], name='fcmdevice_user_active_idx'),
+        ),
+    ]
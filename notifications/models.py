@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
@@ -20,10 +21,76 @@ class FCMDevice(models.Model):
         default=True,
         verbose_name=_("Is Active")
     )
+    region = models.CharField(
+        max_length=50,
+        blank=True,
+        db_index=True,
+        verbose_name=_("Region")
+    )
 
     def __str__(self):
         return f"{self.user.username}'s FCM Device"
 
     class Meta:
         verbose_name = _("FCM Device")
-        verbose_name_plural = _("FCM Devices")
\ No newline at end of file
+        verbose_name_plural = _("FCM Devices")
+        indexes = [
+            # دستگاه‌های فعال کاربر برای ارسال push
+            models.Index(fields=['user'], condition=models.Q(is_active=True), name='fcmdevice_user_active_idx'),
+        ]
+
+
+class TopicSubscription(models.Model):  # عضویت ثبت‌شده هر دستگاه در تاپیک‌های FCM (برای همگام‌سازی گروهی)
+    device = models.ForeignKey(FCMDevice, on_delete=models.CASCADE, related_name='topic_subscriptions',
+                               verbose_name=_("FCM Device"))
+    topic = models.CharField(max_length=255, db_index=True, verbose_name=_("Topic"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+
+    def __str__(self):
+        return f"{self.device_id} → {self.topic}"
+
+    class Meta:
+        verbose_name = _("Topic Subscription")
+        verbose_name_plural = _("Topic Subscriptions")
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'topic'], name='unique_device_topic'),
+        ]
+
+
+class Broadcast(models.Model):  # صندوق خروجی (outbox) اعلان‌های تاپیکی؛ توسط تسک drain_broadcast_outbox ارسال می‌شود
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_SENDING, _("Sending")),
+        (STATUS_SENT, _("Sent")),
+        (STATUS_FAILED, _("Failed")),
+    ]
+
+    idempotency_key = models.CharField(max_length=100, unique=True, verbose_name=_("Idempotency Key"))
+    topic = models.CharField(max_length=255, verbose_name=_("Topic"))
+    title = models.CharField(max_length=255, verbose_name=_("Title"))
+    body = models.TextField(verbose_name=_("Body"))
+    data = models.JSONField(default=dict, blank=True, verbose_name=_("Data"))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name=_("Status"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Attempts"))
+    available_at = models.DateTimeField(default=timezone.now, verbose_name=_("Available At"))
+    message_id = models.CharField(max_length=255, blank=True, verbose_name=_("FCM Message ID"))
+    last_error = models.TextField(blank=True, verbose_name=_("Last Error"))
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='broadcasts', verbose_name=_("Created By"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Sent At"))
+
+    def __str__(self):
+        return f"{self.topic}: {self.title} ({self.status})"
+
+    class Meta:
+        verbose_name = _("Broadcast")
+        verbose_name_plural = _("Broadcasts")
+        ordering = ['available_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='broadcast_status_available_idx'),
+        ]
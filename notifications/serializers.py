@@ -1,11 +1,12 @@
 from rest_framework import serializers
-from .models import FCMDevice
+from .models import Broadcast, FCMDevice
+from .broadcast import TOPIC_KINDS, topic_name
 
 
 class FCMDeviceSerializer(serializers.ModelSerializer):
     class Meta:
         model = FCMDevice
-        fields = ['registration_id']
+        fields = ['registration_id', 'region']
 
     def validate_registration_id(self, value):
         if len(value) < 20:
@@ -23,3 +24,31 @@ class FCMNotificationSerializer(serializers.Serializer):
     title = serializers.CharField()
     body = serializers.CharField()
     data = serializers.DictField(required=False)
+
+
+# -------------------------------------------
+#   اعلان تاپیکی (broadcast) برای منطقه یا گونه گیاه
+
+
+class BroadcastSerializer(serializers.ModelSerializer):
+    kind = serializers.ChoiceField(choices=TOPIC_KINDS, write_only=True, required=False)
+    value = serializers.CharField(write_only=True, required=False)
+    topic = serializers.CharField(required=False)
+    idempotency_key = serializers.CharField(required=False, max_length=100)
+    send_at = serializers.DateTimeField(write_only=True, required=False)
+
+    class Meta:
+        model = Broadcast
+        fields = ['id', 'kind', 'value', 'topic', 'title', 'body', 'data', 'idempotency_key', 'send_at',
+                  'status', 'attempts', 'available_at', 'message_id', 'sent_at']
+        read_only_fields = ['status', 'attempts', 'available_at', 'message_id', 'sent_at']
+
+    def validate(self, attrs):
+        kind, value = attrs.pop('kind', None), attrs.pop('value', None)
+        if kind and value:
+            attrs['topic'] = topic_name(kind, value)
+        if not attrs.get('topic'):
+            raise serializers.ValidationError("یکی از topic یا (kind و value) الزامی است.")
+        # مقادیر data در FCM باید رشته باشند
+        attrs['data'] = {str(key): str(val) for key, val in (attrs.get('data') or {}).items()}
+        return attrs
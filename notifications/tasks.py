@@ -1,12 +1,70 @@
-from celery import shared_task
-from plants.models import Plant
-from .models import FCMDevice
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from celery import Task, shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+from plants.models import Plant, WateringLog
+from plants.services.care_dashboard import mark_stale as mark_dashboards_stale
+from .models import Broadcast, FCMDevice
 import logging
-from .firebase_service import send_notification
+from .firebase_service import deactivate_invalid_tokens, send_each, send_multicast, send_to_topic
 
 logger = logging.getLogger(__name__)
 
 
+def active_devices():
+    return FCMDevice.objects.filter(is_active=True)
+
+
+def due_plants(today=None):
+    """گیاهان سررسیدشده‌ای که هنوز برای این نوبت در صف نرفته‌اند (روی ایندکس is_active, next_watering)"""
+    return (
+        Plant.objects.filter(is_active=True, next_watering__lte=today or date.today())
+        .exclude(reminder_enqueued_for=F('next_watering'))
+    )
+
+
+def stamped_plants(plant_ids):
+    """گیاهان دسته که هنوز در همان نوبت صف‌شده هستند؛ پس از ثبت آبیاری next_watering عوض می‌شود و تکرار تسک بی‌اثر است"""
+    return Plant.objects.filter(id__in=plant_ids, is_active=True, reminder_enqueued_for=F('next_watering'))
+
+
+def due_broadcasts(now):
+    return Broadcast.objects.filter(
+        Q(status=Broadcast.STATUS_PENDING) | Q(status=Broadcast.STATUS_SENDING), available_at__lte=now,
+    ).order_by('available_at', 'id')
+
+
+def send_watering_reminder(plant, fcm_devices):
+    """ارسال یادآوری آبیاری یک گیاه به دستگاه‌های فعال کاربر و علامت‌گذاری آن به عنوان آبیاری‌شده"""
+    tokens = [fcm_device.registration_id for fcm_device in fcm_devices if fcm_device.registration_id]
+    if len(tokens) < len(fcm_devices):
+        logger.warning(
+            f"توکن ثبت FCM برای یک دستگاه کاربر {plant.user.username} (گیاه: {plant.name}) خالی است. این دستگاه نادیده گرفته شد."
+        )
+
+    # پیام‌هایی که به کاربر نمایش داده می‌شوند
+    title, body, data = watering_summary([plant])
+    results = send_multicast(tokens, title, body, data)
+
+    for token, (sent, error_msg) in zip(tokens, results):
+        if sent:
+            logger.debug(f"✅ اعلان FCM با موفقیت به توکن '{token}' برای گیاه {plant.name} ارسال شد.")
+        else:
+            logger.error(
+                f"❌ ارسال اعلان FCM به توکن '{token}' برای گیاه {plant.name} (کاربر: {plant.user.username}) با خطا مواجه شد: {error_msg}"
+            )
+    deactivate_invalid_tokens(tokens, results)
+
+    plant.mark_watered_today(note="Automated watering reminder sent via FCM", source=WateringLog.SOURCE_REMINDER)
+    logger.info(
+        f"گیاه {plant.name} برای کاربر {plant.user.username} پس از تلاش(های) اعلان FCM، به عنوان آبیاری شده علامت‌گذاری شد."
+    )
+
+
 @shared_task(bind=True, default_retry_delay=300, max_retries=5)
 def water_plants(self, plant_id):
     try:
@@ -16,7 +74,7 @@ def water_plants(self, plant_id):
         )
 
         try:
-            fcm_devices = FCMDevice.objects.filter(user=plant.user, is_active=True)
+            fcm_devices = active_devices().filter(user=plant.user)
 
             if not fcm_devices.exists():
                 logger.warning(
@@ -24,44 +82,7 @@ def water_plants(self, plant_id):
                 )
                 return
 
-            for fcm_device in fcm_devices:
-                token = fcm_device.registration_id
-
-                if not token:
-                    logger.warning(
-                        f"توکن ثبت FCM برای یک دستگاه کاربر {plant.user.username} (گیاه: {plant.name}) خالی است. این دستگاه نادیده گرفته شد."
-                    )
-                    continue
-
-                # پیام‌هایی که به کاربر نمایش داده می‌شوند
-                title = f"زمان آبیاری {plant.name}!"
-                body = f"گیاه زیبای {plant.name} نیاز به آبیاری دارد. فراموش نکنید!"
-                data = {
-                    "plant_id": str(plant.id),
-                    "notification_type": "watering_reminder",
-                    "plant_name": plant.name,
-                }
-
-                sent, error_msg = send_notification(token, title, body, data)
-
-                if sent:
-                    logger.debug(f"✅ اعلان FCM با موفقیت به توکن '{token}' برای گیاه {plant.name} ارسال شد.")
-                else:
-                    logger.error(
-                        f"❌ ارسال اعلان FCM به توکن '{token}' برای گیاه {plant.name} (کاربر: {plant.user.username}) با خطا مواجه شد: {error_msg}"
-                    )
-                    if error_msg and (
-                            "InvalidRegistrationToken" in error_msg or "NotRegistered" in error_msg or "BadDeviceToken" in error_msg):
-                        fcm_device.is_active = False
-                        fcm_device.save()
-                        logger.warning(
-                            f"⚠️ توکن FCM '{token}' برای کاربر '{plant.user.username}' غیرفعال شد (به دلیل نامعتبر بودن)."
-                        )
-
-            plant.mark_watered_today(note="Automated watering reminder sent via FCM")
-            logger.info(
-                f"گیاه {plant.name} برای کاربر {plant.user.username} پس از تلاش(های) اعلان FCM، به عنوان آبیاری شده علامت‌گذاری شد."
-            )
+            send_watering_reminder(plant, fcm_devices)
 
         except Exception as fcm_e:
             logger.error(
@@ -79,4 +100,255 @@ def water_plants(self, plant_id):
         try:
             self.retry(exc=e)
         except self.MaxRetriesExceededError:
-            logger.error(f"حداکثر دفعات تلاش مجدد برای وظیفه water_plants برای شناسه گیاه {plant_id} از حد مجاز گذشت.")
\ No newline at end of file
+            logger.error(f"حداکثر دفعات تلاش مجدد برای وظیفه water_plants برای شناسه گیاه {plant_id} از حد مجاز گذشت.")
+
+
+@shared_task
+def sweep_due_waterings():
+    """
+    جایگزین PeriodicTask جداگانه برای هر گیاه: یک تسک دوره‌ای همه گیاهان سررسیدشده را با کوئری بازه‌ای
+    روی ایندکس (is_active, next_watering) پیدا می‌کند و در دسته‌های WATERING_SWEEP_BATCH_SIZE تایی در صف می‌گذارد.
+    هر دسته پیش از صف شدن با reminder_enqueued_for علامت می‌خورد تا sweep بعدی آن را دوباره برندارد؛ اگر صف در
+    دسترس نباشد یا تسک دسته پس از همه تلاش‌های مجدد شکست بخورد، علامت برداشته می‌شود. گیاهان کاربران بدون
+    دستگاه تا ثبت دستگاه علامت‌دار می‌مانند.
+    """
+    if settings.WATERING_SCHEDULER != 'sweep':
+        return 0
+
+    due = due_plants()
+    batch_size = settings.WATERING_SWEEP_BATCH_SIZE
+    last_id = 0
+    enqueued = 0
+    while True:
+        with transaction.atomic():
+            plant_ids = list(
+                due.filter(id__gt=last_id).order_by('id')
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not plant_ids:
+                break
+            Plant.objects.filter(id__in=plant_ids).update(reminder_enqueued_for=F('next_watering'))
+            transaction.on_commit(lambda ids=plant_ids: enqueue_watering_batch(ids))
+
+        last_id = plant_ids[-1]
+        enqueued += len(plant_ids)
+
+    if enqueued:
+        logger.info(f"🌊 {enqueued} یادآوری آبیاری در صف قرار گرفت.")
+    return enqueued
+
+
+def release_reminders(plant_ids):
+    """برداشتن علامت reminder_enqueued_for تا sweep بعدی این گیاهان را دوباره در صف بگذارد"""
+    return Plant.objects.filter(id__in=plant_ids).update(reminder_enqueued_for=None)
+
+
+def release_user_reminders(user):
+    """
+    گیاهان سررسید کاربری که دستگاه نداشت علامت صف را نگه می‌دارند تا sweep هر بار آن‌ها را برندارد؛
+    با ثبت دستگاه علامت برداشته می‌شود و sweep بعدی یادآوری را می‌فرستد.
+    """
+    return Plant.objects.filter(user=user, is_active=True, reminder_enqueued_for=F('next_watering')).update(
+        reminder_enqueued_for=None
+    )
+
+
+def enqueue_watering_batch(plant_ids):
+    try:
+        water_plants_batch.delay(plant_ids)
+    except Exception as e:
+        logger.error(f"❌ صف کردن یادآوری آبیاری {len(plant_ids)} گیاه ناموفق بود: {e}", exc_info=True)
+        release_reminders(plant_ids)
+
+
+class WateringBatchTask(Task):
+    """
+    پس از شکست نهایی (تمام شدن تلاش‌های مجدد) گیاهان دسته برای sweep بعدی آزاد می‌شوند. خطا فقط پیش از ارسال
+    ممکن است (خواندن یا ثبت آبیاری در یک تراکنش)، پس تکرار تسک اعلانی را دوباره نمی‌فرستد.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        plant_ids = kwargs.get('plant_ids', args[0] if args else [])
+        released = release_reminders(plant_ids)
+        logger.error(f"❌ یادآوری آبیاری {len(plant_ids)} گیاه پس از همه تلاش‌ها ناموفق بود؛ {released} گیاه آزاد شد: {exc}")
+
+
+def watering_summary(plants):
+    """عنوان، متن و داده اعلان خلاصه برای همه گیاهان سررسیدشده یک کاربر"""
+    if len(plants) == 1:
+        plant = plants[0]
+        return (
+            f"زمان آبیاری {plant.name}!",
+            f"گیاه زیبای {plant.name} نیاز به آبیاری دارد. فراموش نکنید!",
+            {
+                "plant_id": str(plant.id),
+                "notification_type": "watering_reminder",
+                "plant_name": plant.name,
+            },
+        )
+
+    names = "، ".join(plant.name for plant in plants[:3])
+    if len(plants) > 3:
+        names = f"{names} و {len(plants) - 3} گیاه دیگر"
+    return (
+        f"زمان آبیاری {len(plants)} گیاه!",
+        f"{names} نیاز به آبیاری دارند. فراموش نکنید!",
+        {
+            "plant_ids": ",".join(str(plant.id) for plant in plants),
+            "notification_type": "watering_reminder",
+            "plant_count": str(len(plants)),
+        },
+    )
+
+
+@shared_task(bind=True, base=WateringBatchTask, autoretry_for=(Exception,), default_retry_delay=300, max_retries=5)
+def water_plants_batch(self, plant_ids):
+    """
+    یادآوری آبیاری گروهی: گیاهان دسته بر اساس کاربر گروه‌بندی می‌شوند و به هر دستگاه کاربر فقط یک اعلان
+    خلاصه می‌رسد. آبیاری و WateringLog پیش از ارسال ثبت می‌شوند و همه پیام‌ها با یک send_each فرستاده می‌شوند؛
+    اگر send_each خطا بدهد فقط ارسال با send_watering_notifications تکرار می‌شود.
+    """
+    plants = list(
+        stamped_plants(plant_ids)
+        .select_related('user')
+        .prefetch_related(
+            Prefetch('user__fcm_devices', queryset=active_devices(), to_attr='active_devices')
+        )
+        .order_by('id')
+    )
+    plants_by_user = defaultdict(list)
+    for plant in plants:
+        plants_by_user[plant.user_id].append(plant)
+
+    notifications, notified_plants = [], []
+    for user_plants in plants_by_user.values():
+        user = user_plants[0].user
+        user_devices = [device for device in user.active_devices if device.registration_id]
+        if not user_devices:
+            # علامت صف می‌ماند تا sweepها این گیاهان را دوباره برندارند؛ ثبت دستگاه آن را برمی‌دارد
+            logger.warning(f"هیچ توکن FCM فعالی برای کاربر {user.username} یافت نشد. {len(user_plants)} یادآوری نادیده گرفته شد.")
+            continue
+        title, body, data = watering_summary(user_plants)
+        for device in user_devices:
+            notifications.append((device.registration_id, title, body, data))
+        notified_plants.extend(user_plants)
+
+    if not notifications:
+        return {'plants': len(plants), 'pushes': 0}
+
+    with transaction.atomic():
+        mark_plants_watered(notified_plants, note="Automated watering reminder sent via FCM")
+
+    try:
+        results = send_each(notifications)
+    except Exception as e:
+        logger.error(f"❌ ارسال {len(notifications)} یادآوری آبیاری ناموفق بود؛ ارسال دوباره در صف قرار گرفت: {e}")
+        send_watering_notifications.apply_async(
+            args=(notifications,), countdown=send_watering_notifications.default_retry_delay,
+        )
+        return {'plants': len(plants), 'pushes': len(notifications), 'sent': 0}
+
+    sent_count = finish_watering_notifications(notifications, results)
+    logger.info(
+        f"🌊 یادآوری آبیاری: {len(notified_plants)} گیاه، {len(plants_by_user)} کاربر، "
+        f"{sent_count}/{len(notifications)} اعلان ارسال شد."
+    )
+    return {'plants': len(plants), 'pushes': len(notifications), 'sent': sent_count}
+
+
+@shared_task(bind=True, default_retry_delay=300, max_retries=5)
+def send_watering_notifications(self, notifications):
+    """تکرار فقط مرحله ارسال یادآوری‌ها؛ پس از برگشتن send_each دیگر تکرار نمی‌شود"""
+    notifications = [tuple(notification) for notification in notifications]
+    try:
+        results = send_each(notifications)
+    except Exception as e:
+        raise self.retry(exc=e)
+    return {'pushes': len(notifications), 'sent': finish_watering_notifications(notifications, results)}
+
+
+def finish_watering_notifications(notifications, results):
+    """غیرفعال‌سازی توکن‌های نامعتبر پس از ارسال؛ خطای آن به تکرار ارسال منجر نمی‌شود. خروجی: تعداد ارسال موفق"""
+    try:
+        deactivate_invalid_tokens([notification[0] for notification in notifications], results)
+    except Exception as e:
+        logger.error(f"❌ غیرفعال‌سازی توکن‌های نامعتبر پس از یادآوری آبیاری ناموفق بود: {e}", exc_info=True)
+    return sum(1 for sent, _ in results if sent)
+
+
+def mark_plants_watered(plants, note=""):
+    """معادل گروهی Plant.mark_watered_today: یک UPDATE برای هر فاصله آبیاری و یک bulk_create برای لاگ‌ها"""
+    today = date.today()
+    ids_by_interval = defaultdict(list)
+    for plant in plants:
+        ids_by_interval[plant.effective_interval].append(plant.id)
+
+    for interval, ids in ids_by_interval.items():
+        Plant.objects.filter(id__in=ids).update(
+            last_watered=today,
+            next_watering=today + timedelta(days=interval) if interval else None,
+        )
+    WateringLog.objects.bulk_create([
+        WateringLog(plant_id=plant.id, note=note, source=WateringLog.SOURCE_REMINDER) for plant in plants
+    ])
+    # UPDATE گروهی سیگنال ندارد؛ داشبورد این کاربران هنگام خواندن بعدی دوباره ساخته می‌شود
+    mark_dashboards_stale(user_ids={plant.user_id for plant in plants})
+
+
+@shared_task
+def drain_broadcast_outbox():
+    """
+    ارسال اعلان‌های تاپیکی صف‌شده در Broadcast. هر ردیف پیش از ارسال با select_for_update(skip_locked)
+    برداشته و برای BROADCAST_LEASE_SECONDS به حالت sending می‌رود تا workerهای همزمان آن را تکراری نفرستند؛
+    اگر worker وسط کار از بین برود، پس از پایان lease دوباره برداشته می‌شود.
+    سرعت ارسال به BROADCAST_RATE_PER_SECOND محدود است و خطاها با تاخیر افزایشی تا BROADCAST_MAX_ATTEMPTS تکرار می‌شوند.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        broadcasts = list(
+            due_broadcasts(now).select_for_update(skip_locked=True)[:settings.BROADCAST_BATCH_SIZE]
+        )
+        Broadcast.objects.filter(id__in=[broadcast.id for broadcast in broadcasts]).update(
+            status=Broadcast.STATUS_SENDING,
+            attempts=F('attempts') + 1,
+            available_at=now + timedelta(seconds=settings.BROADCAST_LEASE_SECONDS),
+        )
+
+    interval = 1 / settings.BROADCAST_RATE_PER_SECOND
+    sent = 0
+    for broadcast in broadcasts:
+        started = time.monotonic()
+        attempts = broadcast.attempts + 1
+        data = {**broadcast.data, 'broadcast_id': str(broadcast.id)}  # برای حذف نمایش تکراری در اپ
+        try:
+            message_id = send_to_topic(broadcast.topic, broadcast.title, broadcast.body, data)
+        except Exception as e:
+            failed = attempts >= settings.BROADCAST_MAX_ATTEMPTS
+            Broadcast.objects.filter(id=broadcast.id).update(
+                status=Broadcast.STATUS_FAILED if failed else Broadcast.STATUS_PENDING,
+                available_at=timezone.now() + timedelta(seconds=settings.BROADCAST_RETRY_DELAY * 2 ** (attempts - 1)),
+                last_error=f"{type(e).__name__}: {e}",
+            )
+            logger.error(f"❌ ارسال اعلان تاپیک '{broadcast.topic}' (شناسه {broadcast.id}، تلاش {attempts}) ناموفق بود: {e}")
+        else:
+            Broadcast.objects.filter(id=broadcast.id).update(
+                status=Broadcast.STATUS_SENT, message_id=message_id or '', sent_at=timezone.now(), last_error='',
+            )
+            sent += 1
+            logger.info(f"📣 اعلان تاپیک '{broadcast.topic}' (شناسه {broadcast.id}) ارسال شد: {message_id}")
+
+        remaining = interval - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+    if len(broadcasts) == settings.BROADCAST_BATCH_SIZE:
+        drain_broadcast_outbox.delay()
+    return {'claimed': len(broadcasts), 'sent': sent}
+
+
+@shared_task
+def sync_topic_subscriptions_task(kind):
+    from .broadcast import sync_topic_subscriptions
+
+    return sync_topic_subscriptions(kind)
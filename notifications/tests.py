@@ -1,6 +1,20 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
-from .models import FCMDevice
+from django_celery_beat.models import PeriodicTask
+from rest_framework.test import APIClient
+from plants.models import Plant, WateringLog, WateringSchedule
+from .firebase_service import FakeTransport, deactivate_invalid_tokens, send_multicast, set_transport
+from .broadcast import (
+    TOPIC_REGION, TOPIC_SPECIES, desired_devices, enqueue_broadcast, sync_topic, sync_topic_subscriptions, topic_name,
+)
+from .models import Broadcast, FCMDevice, TopicSubscription
+from .tasks import drain_broadcast_outbox, send_watering_notifications, sweep_due_waterings, water_plants_batch
 
 User = get_user_model()
 
@@ -15,4 +29,199 @@ class FCMDeviceModelTest(TestCase):
     def test_fcm_device_creation(self):
         self.assertEqual(self.device.user, self.user)
         self.assertEqual(self.device.registration_id, 'unique_token')
-        self.assertTrue(self.device.is_active)
\ No newline at end of file
+        self.assertTrue(self.device.is_active)
+
+class WateringSweepTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sweeper', password='pass', phone_number='09120000020')
+        today = date.today()
+        self.due = Plant.objects.create(user=self.user, name='Due', image='plants/a.png', next_watering=today)
+        self.overdue = Plant.objects.create(user=self.user, name='Overdue', image='plants/b.png',
+                                            next_watering=today - timedelta(days=3))
+        Plant.objects.create(user=self.user, name='Later', image='plants/c.png', next_watering=today + timedelta(days=2))
+        Plant.objects.create(user=self.user, name='Inactive', image='plants/d.png', next_watering=today, is_active=False)
+
+    @override_settings(WATERING_SCHEDULER='sweep', WATERING_SWEEP_BATCH_SIZE=1)
+    def test_sweep_enqueues_due_plants_in_batches_once(self):
+        with mock.patch('notifications.tasks.water_plants_batch.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(sweep_due_waterings(), 2)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(sweep_due_waterings(), 0)
+
+        self.assertEqual(sorted(call.args[0] for call in delay.call_args_list), [[self.due.id], [self.overdue.id]])
+
+    @override_settings(WATERING_SCHEDULER='periodic_task')
+    def test_legacy_periodic_tasks_are_migrated_to_sweep(self):
+        schedule = WateringSchedule.objects.create(plant=self.due, frequency=5)
+        schedule.create_schedule()
+        self.assertEqual(PeriodicTask.objects.filter(task='notifications.tasks.water_plants').count(), 1)
+
+        call_command('migrate_watering_schedules', stdout=StringIO())
+
+        self.assertFalse(PeriodicTask.objects.filter(task='notifications.tasks.water_plants').exists())
+        schedule.refresh_from_db()
+        self.due.refresh_from_db()
+        self.assertIsNone(schedule.schedule)
+        self.assertEqual(self.due.watering_frequency, 5)
+
+
+class BatchedWateringReminderTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='grower', password='pass', phone_number='09120000021')
+        self.plants = [
+            Plant.objects.create(user=self.user, name=f'Plant {i}', image='plants/a.png', next_watering=date.today(),
+                                 reminder_enqueued_for=date.today())
+            for i in range(4)
+        ]
+        self.plant_ids = [plant.id for plant in self.plants]
+        self.phone = FCMDevice.objects.create(user=self.user, registration_id='phone-token-' + 'x' * 20)
+        self.stale = FCMDevice.objects.create(user=self.user, registration_id='stale-token-' + 'x' * 20)
+
+    def test_one_summary_push_per_device_and_dead_tokens_deactivated(self):
+        results = [(True, None), (False, 'UnregisteredError: Requested entity was not found.')]
+        with mock.patch('notifications.tasks.send_each', return_value=results) as send_each:
+            summary = water_plants_batch(self.plant_ids)
+            # اجرای دوباره همان دسته (تکرار تسک) اعلانی نمی‌فرستد
+            self.assertEqual(water_plants_batch(self.plant_ids)['pushes'], 0)
+
+        self.assertEqual(send_each.call_count, 1)
+        notifications = send_each.call_args.args[0]
+        self.assertEqual(len(notifications), 2)
+        self.assertEqual(notifications[0][1], 'زمان آبیاری 4 گیاه!')
+        self.assertEqual(summary['pushes'], 2)
+
+        self.stale.refresh_from_db()
+        self.assertFalse(self.stale.is_active)
+        self.assertEqual(Plant.objects.filter(last_watered=date.today()).count(), 4)
+
+    def test_only_the_send_step_is_retried(self):
+        with mock.patch('notifications.tasks.send_each', side_effect=RuntimeError('unavailable')), \
+                mock.patch('notifications.tasks.send_watering_notifications.apply_async') as resend:
+            self.assertEqual(water_plants_batch.apply(args=(self.plant_ids,)).state, 'SUCCESS')
+        self.assertEqual(len(resend.call_args.kwargs['args'][0]), 2)
+        self.assertEqual(WateringLog.objects.filter(plant_id__in=self.plant_ids).count(), 4)
+
+        notifications = resend.call_args.kwargs['args'][0]
+        with mock.patch('notifications.tasks.send_each', side_effect=RuntimeError('unavailable')) as send_each:
+            self.assertEqual(send_watering_notifications.apply(args=(notifications,)).state, 'FAILURE')
+        self.assertEqual(send_each.call_count, send_watering_notifications.max_retries + 1)
+
+        # پس از برگشتن send_each خطای بعدی ارسال را تکرار نمی‌کند
+        with mock.patch('notifications.tasks.send_each', return_value=[(True, None)] * 2) as send_each, \
+                mock.patch('notifications.tasks.deactivate_invalid_tokens', side_effect=DatabaseError('down')):
+            self.assertEqual(send_watering_notifications.apply(args=(notifications,)).state, 'SUCCESS')
+        self.assertEqual(send_each.call_count, 1)
+
+    def test_failed_batch_is_released_before_anything_is_sent(self):
+        with mock.patch('notifications.tasks.mark_plants_watered', side_effect=DatabaseError('down')), \
+                mock.patch('notifications.tasks.send_each') as send_each:
+            self.assertEqual(water_plants_batch.apply(args=(self.plant_ids,)).state, 'FAILURE')
+        send_each.assert_not_called()
+        self.assertFalse(Plant.objects.exclude(reminder_enqueued_for=None).exists())
+
+    @override_settings(WATERING_SCHEDULER='sweep')
+    def test_deviceless_plants_stay_stamped_until_a_device_registers(self):
+        FCMDevice.objects.update(is_active=False)
+        self.assertEqual(water_plants_batch(self.plant_ids)['pushes'], 0)
+        with mock.patch('notifications.tasks.water_plants_batch.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(sweep_due_waterings(), 0)
+        delay.assert_not_called()
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/fcm/fcm-device/', {'registration_id': 'new-phone-' + 'x' * 20})
+        self.assertEqual(response.status_code, 201)
+        with mock.patch('notifications.tasks.water_plants_batch.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(sweep_due_waterings(), 4)
+
+
+class MulticastSendTest(TestCase):
+    def setUp(self):
+        self.transport = FakeTransport()
+        set_transport(self.transport)
+        self.addCleanup(set_transport, None)
+
+    @override_settings(FCM_MAX_CONCURRENT_BATCHES=3)
+    def test_tokens_chunked_and_dead_tokens_deactivated_in_bulk(self):
+        user = User.objects.create_user(username='multicast', password='pass', phone_number='09120000031')
+        dead = FCMDevice.objects.create(user=user, registration_id='invalid-token-' + 'x' * 20)
+        tokens = [f'token-{i}' for i in range(1200)] + [dead.registration_id]
+
+        results = send_multicast(tokens, 'title', 'body')
+
+        self.assertEqual(self.transport.requests, 3)
+        self.assertEqual(len(results), len(tokens))
+        self.assertTrue(all(sent for sent, _ in results[:-1]))
+        self.assertFalse(results[-1][0])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(deactivate_invalid_tokens(tokens, results), 1)
+        dead.refresh_from_db()
+        self.assertFalse(dead.is_active)
+
+
+class BroadcastOutboxTest(TestCase):
+    def setUp(self):
+        self.transport = FakeTransport()
+        set_transport(self.transport)
+        self.addCleanup(set_transport, None)
+        self.user = User.objects.create_user(username='farmer', password='pass', phone_number='09120000041')
+
+    def test_region_topic_sync_subscribes_in_chunks_and_removes_stale(self):
+        FCMDevice.objects.bulk_create([
+            FCMDevice(user=self.user, registration_id=f'region-token-{i}', region='Tehran') for i in range(1500)
+        ] + [FCMDevice(user=self.user, registration_id='invalid-region-token', region='Tehran')])
+
+        result = sync_topic_subscriptions(TOPIC_REGION)
+
+        self.assertEqual(result['added'], 1500)
+        self.assertEqual(self.transport.requests, 2)
+        self.assertFalse(FCMDevice.objects.get(registration_id='invalid-region-token').is_active)
+        self.assertEqual(TopicSubscription.objects.filter(topic='region-tehran').count(), 1500)
+
+        FCMDevice.objects.filter(registration_id='region-token-0').update(region='Gilan')
+        result = sync_topic_subscriptions(TOPIC_REGION)
+        self.assertEqual((result['added'], result['removed']), (1, 1))
+        self.assertEqual(topic_name(TOPIC_SPECIES, 'گل رز'), 'species-%DA%AF%D9%84-%D8%B1%D8%B2')
+
+    def test_species_topic_sync_diffs_in_small_windows(self):
+        devices = FCMDevice.objects.bulk_create([
+            FCMDevice(user=User.objects.create_user(username=f'grower{i}', password='pass', phone_number=f'0912000005{i}'),
+                      registration_id=f'species-token-{i}') for i in range(5)
+        ])
+        for device in devices[1:]:
+            Plant.objects.create(user=device.user, name='Rose', image='plants/a.png', species='Rose')
+        topic = topic_name(TOPIC_SPECIES, 'rose')
+        TopicSubscription.objects.bulk_create([TopicSubscription(device=devices[i], topic=topic) for i in (0, 2)])
+
+        wanted = desired_devices(TOPIC_SPECIES, ['Rose'])
+        current = TopicSubscription.objects.filter(topic=topic).values_list('device_id', 'id', 'device__registration_id')
+        self.assertEqual(sync_topic(topic, wanted, current, chunk_size=2), (3, 1))
+        self.assertEqual(
+            sorted(TopicSubscription.objects.filter(topic=topic).values_list('device_id', flat=True)),
+            [device.id for device in devices[1:]],
+        )
+        self.assertEqual(sync_topic_subscriptions(TOPIC_SPECIES), {'added': 0, 'removed': 0, 'topics': 1})
+
+    def test_outbox_is_idempotent_and_retries_failed_sends(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            broadcast, created = enqueue_broadcast('region-tehran', 'Frost', 'Cover your plants', idempotency_key='frost-1')
+            _, created_again = enqueue_broadcast('region-tehran', 'Frost', 'Cover your plants', idempotency_key='frost-1')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+
+        with override_settings(BROADCAST_RATE_PER_SECOND=1000), \
+                mock.patch('notifications.tasks.send_to_topic', side_effect=[RuntimeError('unavailable'), 'msg-1']):
+            self.assertEqual(drain_broadcast_outbox()['sent'], 0)
+            broadcast.refresh_from_db()
+            self.assertEqual((broadcast.status, broadcast.attempts), (Broadcast.STATUS_PENDING, 1))
+
+            self.assertEqual(drain_broadcast_outbox()['claimed'], 0)  # هنوز در تاخیر تلاش مجدد
+            Broadcast.objects.filter(id=broadcast.id).update(available_at=broadcast.created_at)
+            self.assertEqual(drain_broadcast_outbox()['sent'], 1)
+
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.message_id, broadcast.attempts), (Broadcast.STATUS_SENT, 'msg-1', 2))
@@ -1,9 +1,11 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from .models import FCMDevice
-from .serializers import FCMDeviceSerializer, FCMNotificationSerializer
+from .serializers import BroadcastSerializer, FCMDeviceSerializer, FCMNotificationSerializer
+from .broadcast import enqueue_broadcast
 from django.utils.translation import gettext_lazy as _
-from .firebase_service import send_notification
+from .firebase_service import deactivate_invalid_tokens, send_multicast
+from .tasks import release_user_reminders
 import logging
 from django.http import HttpResponse
 from firebase_admin import firestore
@@ -23,11 +25,16 @@ class FCMDeviceCreateUpdateView(generics.CreateAPIView):
         user = self.request.user
 
 
+        defaults = {'user': user, 'is_active': True}
+        if 'region' in serializer.validated_data:
+            defaults['region'] = serializer.validated_data['region']
         fcm_device, created = FCMDevice.objects.update_or_create(
             registration_id=registration_id,
-            defaults={'user': user, 'is_active': True}
+            defaults=defaults
         )
         serializer.instance = fcm_device
+        # یادآوری‌هایی که به خاطر نداشتن دستگاه فرستاده نشدند در sweep بعدی ارسال می‌شوند
+        release_user_reminders(user)
 
         if created:
             logger.info(f"✅ توکن جدید FCM '{registration_id}' برای کاربر '{user.username}' ثبت شد.")
@@ -106,24 +113,20 @@ class SendFCMNotificationView(generics.CreateAPIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        success_count, failure_count = 0, 0
+        tokens = list(devices.values_list('registration_id', flat=True))
+        results = send_multicast(tokens, title, body, data)
+        success_count = sum(1 for sent, _ in results if sent)
+        failure_count = len(results) - success_count
 
-        for device in devices:
-            sent, error_msg = send_notification(device.registration_id, title, body, data)
-            if sent:
-                success_count += 1
-            else:
-                failure_count += 1
+        for token, (sent, error_msg) in zip(tokens, results):
+            if not sent:
                 notification_logger.error(
-                    f"❌ ارسال FCM به توکن '{device.registration_id}' کاربر '{request.user.username}' ناموفق بود: {error_msg}"
+                    f"❌ ارسال FCM به توکن '{token}' کاربر '{request.user.username}' ناموفق بود: {error_msg}"
                 )
-                if error_msg and (
-                        "InvalidRegistrationToken" in error_msg or "NotRegistered" in error_msg or "BadDeviceToken" in error_msg):
-                    device.is_active = False
-                    device.save()
-                    notification_logger.warning(
-                        f"⚠️ توکن FCM '{device.registration_id}' برای کاربر '{request.user.username}' غیرفعال شد (به دلیل نامعتبر بودن)."
-                    )
+        if deactivate_invalid_tokens(tokens, results):
+            notification_logger.warning(
+                f"⚠️ توکن‌های FCM نامعتبر کاربر '{request.user.username}' غیرفعال شدند."
+            )
 
         notification_logger.info(
             f"📨 ارسال FCM برای کاربر «{request.user.username}»: موفق={success_count}, ناموفق={failure_count}"
@@ -135,5 +138,26 @@ class SendFCMNotificationView(generics.CreateAPIView):
         }, status=status.HTTP_200_OK)
 
 
+class BroadcastCreateView(generics.CreateAPIView):
+    """ثبت اعلان تاپیکی در outbox (فقط ادمین)؛ ارسال در پس‌زمینه انجام می‌شود"""
+
+    serializer_class = BroadcastSerializer
+    permission_classes = [permissions.IsAdminUser]
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
+        broadcast, created = enqueue_broadcast(
+            data['topic'], data['title'], data['body'], data.get('data'),
+            idempotency_key=data.get('idempotency_key'), send_at=data.get('send_at'), created_by=request.user,
+        )
+        if created:
+            notification_logger.info(
+                f"📣 اعلان تاپیک '{broadcast.topic}' توسط '{request.user.username}' در صف قرار گرفت (شناسه {broadcast.id})."
+            )
+        return Response(
+            BroadcastSerializer(broadcast).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+        )
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Plant, PlantDiagnosis, WateringLog, WateringSchedule
+from .models import Plant, PlantDiagnosis, PlantDiagnosisImage, WateringLog, WateringSchedule
 
 # ==========================
 # 🔧 Base Admin with Image Preview
@@ -35,18 +35,27 @@ class PlantDiagnosisInline(admin.TabularInline):
     can_delete = True
     show_change_link = True
 
+# ==========================
+# 🖼️ Inline: Plant Diagnosis Images
+# ==========================
+class PlantDiagnosisImageInline(admin.TabularInline):
+    model = PlantDiagnosisImage
+    extra = 0
+    readonly_fields = ('position', 'result')
+    ordering = ('position',)
+
 # ==========================
 # 🌼 Admin: Plant
 # ==========================
 class PlantAdmin(BaseAdmin):
     list_display = (
         'name', 'user', 'species', 'uploaded_at', 'watering_frequency',
-        'last_watered', 'next_watering', 'is_active', 'image_preview',
+        'last_watered', 'next_watering', 'predicted_interval', 'is_active', 'image_preview',
     )
     list_filter = ('uploaded_at', 'is_active', 'user')
     search_fields = ['name', 'species', 'user__username']
     list_editable = ('watering_frequency', 'is_active')
-    readonly_fields = ('image_preview', 'uploaded_at', 'next_watering')
+    readonly_fields = ('image_preview', 'uploaded_at', 'next_watering', 'predicted_interval')
     inlines = [WateringLogInline, PlantDiagnosisInline]
     autocomplete_fields = ['user']
 
@@ -55,21 +64,22 @@ class PlantAdmin(BaseAdmin):
 # ==========================
 class PlantDiagnosisAdmin(BaseAdmin):
     list_display = (
-        'plant', 'category', 'confidence', 'created_at', 'image_preview',
+        'plant', 'category', 'confidence', 'status', 'created_at', 'image_preview',
     )
     search_fields = ('diagnosis', 'plant__name', 'plant__user__username')
-    list_filter = ('category', 'created_at')
+    list_filter = ('category', 'status', 'created_at')
     readonly_fields = (
         'created_at', 'diagnosis', 'care_instructions', 'confidence', 'image_preview'
     )
     autocomplete_fields = ['plant']
+    inlines = [PlantDiagnosisImageInline]
 
 # ==========================
 # 💧 Admin: Watering Log
 # ==========================
 class WateringLogAdmin(admin.ModelAdmin):
-    list_display = ('plant', 'watered_at', 'note')
-    list_filter = ('watered_at', 'plant__user')
+    list_display = ('plant', 'watered_at', 'source', 'note')
+    list_filter = ('source', 'watered_at', 'plant__user')
     search_fields = ('plant__name', 'note', 'plant__user__username')
     ordering = ('-watered_at',)
     autocomplete_fields = ('plant',)
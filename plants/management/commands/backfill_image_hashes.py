@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from plants.models import Plant, PlantDiagnosis
+from plants.services.near_duplicate_index import hash_image_field
+
+
+class Command(BaseCommand):
+    help = "محاسبه هش ادراکی (pHash/dHash) برای رکوردهای قدیمی Plant و PlantDiagnosis که هنوز هش ندارند."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (Plant, PlantDiagnosis):
+            updated = 0
+            last_id = 0
+            while True:
+                batch = list(
+                    model.objects.filter(id__gt=last_id, image_phash='')
+                    .exclude(image='')
+                    .order_by('id')
+                    .only('id', 'image')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                for obj in batch:
+                    hashes = hash_image_field(obj.image)
+                    if hashes:
+                        obj.image_phash = hashes['phash']
+                        obj.image_dhash = hashes['dhash']
+                        updated += 1
+                model.objects.bulk_update(
+                    [obj for obj in batch if obj.image_phash], ['image_phash', 'image_dhash']
+                )
+                last_id = batch[-1].id
+
+            self.stdout.write(self.style.SUCCESS(f"{model.__name__}: {updated} رکورد هش شد."))
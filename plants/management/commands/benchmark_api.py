@@ -0,0 +1,144 @@
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from celery import current_app
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from notifications.firebase_service import FakeTransport, set_transport
+from utils import http_client
+from utils.benchmark import (
+    STUB_GEMINI, STUB_GEMINI_STREAM, STUB_PLANT_ID, BenchmarkData, BenchmarkRunner, build_report, compare_reports,
+)
+from utils.seed import SeedVolumes
+from utils.stub_upstream import StubUpstream
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک کل API: seed داده ساختگی با حجم قابل تنظیم، اجرای ترکیب وزنی درخواست‌ها روی همه URLهای پروژه "
+        "با سرورهای محلی به جای Plant.id و Gemini و ترنسپورت ساختگی FCM، گزارش p50/p95/p99، توان عملیاتی و "
+        "تعداد کوئری هر endpoint و ذخیره نتیجه به صورت JSON برای مقایسه بین commitها. اجرا روی یک دیتابیس موقت "
+        "(مثل تست‌ها) و کلیدهای کش با prefix جدا انجام می‌شود و دیتابیس در پایان حذف می‌شود."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--plants-per-user', type=int, default=5)
+        parser.add_argument('--logs-per-plant', type=int, default=10)
+        parser.add_argument('--diagnoses-per-plant', type=int, default=1)
+        parser.add_argument('--devices-per-user', type=int, default=2)
+        parser.add_argument('--payments-per-user', type=int, default=2)
+        parser.add_argument('--messages-per-user', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=1000, help="تعداد کل درخواست‌ها")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="تعداد thread همزمان؛ روی SQLite فقط ۱ قابل اعتماد است")
+        parser.add_argument('--upstream-delay', type=float, default=0.05,
+                            help="تاخیر Plant.id و Gemini شبیه‌سازی‌شده به ثانیه")
+        parser.add_argument('--random-seed', type=int, default=42)
+        parser.add_argument('--output', help="مسیر فایل JSON نتیجه (پیش‌فرض benchmark-results/)")
+        parser.add_argument('--compare', help="فایل JSON اجرای قبلی برای نمایش تغییرات")
+        parser.add_argument('--i-know-this-is-not-production', action='store_true', dest='not_production',
+                            help="اجرا با DEBUG=False (دیتابیس موقت روی همان سرور دیتابیس ساخته می‌شود)")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['not_production']:
+            raise CommandError(
+                "بنچمارک فقط با DEBUG=True یا --i-know-this-is-not-production اجرا می‌شود؛ "
+                "هزاران ردیف ساختگی در دیتابیس موقت و کلیدهای کش ساخته می‌شود."
+            )
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # کلیدهای کش (شمارنده‌های مصرف، کش پاسخ چت، متریک‌ها) با کلیدهای واقعی مخلوط نمی‌شوند
+            prefix = f'bench{int(time.time())}'
+            with override_settings(CACHES={
+                alias: {**config, 'KEY_PREFIX': f"{prefix}:{config.get('KEY_PREFIX', '')}"}
+                for alias, config in settings.CACHES.items()
+            }):
+                report = self.benchmark(prefix, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.print_report(report)
+        path = self.write_report(report, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"✅ نتیجه در {path} ذخیره شد."))
+        if options['compare']:
+            self.print_comparison(compare_reports(report, json.loads(Path(options['compare']).read_text())))
+
+    def benchmark(self, prefix, options):
+        volumes = SeedVolumes(
+            users=options['users'], plants_per_user=options['plants_per_user'],
+            logs_per_plant=options['logs_per_plant'], diagnoses_per_plant=options['diagnoses_per_plant'],
+            devices_per_user=options['devices_per_user'], payments_per_user=options['payments_per_user'],
+            messages_per_user=options['messages_per_user'],
+        )
+        media_root = tempfile.mkdtemp()
+        delay = options['upstream_delay']
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True  # تسک‌های on_commit بدون broker در همان درخواست اجرا می‌شوند
+        set_transport(FakeTransport())
+
+        self.stdout.write(f"🌱 seed: {volumes}")
+        bench = BenchmarkData(prefix, volumes)
+        try:
+            with StubUpstream(delay=delay, response_body=STUB_PLANT_ID) as plant_id, \
+                    StubUpstream(delay=delay, response_body=STUB_GEMINI) as gemini, \
+                    StubUpstream(delay=delay / len(STUB_GEMINI_STREAM), chunks=STUB_GEMINI_STREAM) as gemini_stream, \
+                    override_settings(PLANT_ID_API_URL=plant_id.url, GEMINI_API_URL=gemini.url,
+                                      GEMINI_STREAM_API_URL=gemini_stream.url, MEDIA_ROOT=media_root,
+                                      ALLOWED_HOSTS=['*']):
+                runner = BenchmarkRunner(bench, random_seed=options['random_seed'])
+                result = runner.run(options['requests'], options['concurrency'])
+                http_client.close_all()
+        finally:
+            set_transport(None)
+            current_app.conf.task_always_eager = eager
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        return build_report(result, volumes, {
+            key: options[key] for key in ('requests', 'concurrency', 'upstream_delay', 'random_seed')
+        })
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'endpoint':<24} {'reqs':>5} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}"
+        )
+        rows = list(report['endpoints'].items()) + [('TOTAL', report['total'])]
+        for name, stats in rows:
+            self.stdout.write(
+                f"{name:<24} {stats['requests']:>5} {stats['errors']:>4} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+                f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['queries_mean']:>8.1f}"
+            )
+        if report['uncovered_routes']:
+            self.stdout.write(self.style.WARNING(f"⚠️ URLهای بدون سناریو: {', '.join(report['uncovered_routes'])}"))
+
+    def print_comparison(self, rows):
+        self.stdout.write(f"{'endpoint':<24} {'p95 before':>11} {'p95 after':>10} {'Δ%':>7} {'rps Δ%':>7} {'queries':>13}")
+        for name, row in rows.items():
+            before, after, change = row['p95_ms']
+            rps_change = row['rps'][2]
+            self.stdout.write(
+                f"{name:<24} {before:>11.1f} {after:>10.1f} {self.percent(change):>7} {self.percent(rps_change):>7} "
+                f"{row['queries_mean'][0]:>6.1f}→{row['queries_mean'][1]:<6.1f}"
+            )
+
+    @staticmethod
+    def percent(value):
+        return '-' if value is None else f'{value:+.1f}'
+
+    @staticmethod
+    def write_report(report, output):
+        if output:
+            path = Path(output)
+        else:
+            stamp = report['created_at'][:19].replace(':', '').replace('-', '')
+            path = Path(settings.BASE_DIR) / 'benchmark-results' / f"{stamp}-{report['commit'] or 'nocommit'}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        return path
@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django_celery_beat.models import PeriodicTask, PeriodicTasks
+from plants.models import Plant, WateringSchedule
+from plants.services.care_dashboard import mark_stale
+
+LEGACY_TASK = 'notifications.tasks.water_plants'
+
+
+class Command(BaseCommand):
+    help = (
+        "انتقال زمان‌بندی آبیاری از PeriodicTaskهای جداگانه هر گیاه به حالت sweep: "
+        "فاصله و تاریخ آبیاری بعدی روی Plant ثبت و PeriodicTaskهای قدیمی حذف می‌شوند."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        today = date.today()
+        migrated = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                WateringSchedule.objects.filter(id__gt=last_id, schedule__isnull=False)
+                .select_related('plant', 'schedule')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            plants = []
+            for watering_schedule in batch:
+                plant = watering_schedule.plant
+                plant.watering_frequency = watering_schedule.frequency
+                if plant.next_watering is None:
+                    plant.next_watering = self.next_run(watering_schedule, today)
+                plants.append(plant)
+
+            migrated += len(batch)
+            if dry_run:
+                continue
+
+            with transaction.atomic():
+                Plant.objects.bulk_update(plants, ['watering_frequency', 'next_watering'])
+                task_ids = [watering_schedule.schedule_id for watering_schedule in batch]
+                WateringSchedule.objects.filter(id__in=[ws.id for ws in batch]).update(schedule=None)
+                PeriodicTask.objects.filter(id__in=task_ids).delete()
+                mark_stale(plant_ids=[plant.id for plant in plants])
+
+        # PeriodicTaskهای یتیم (بدون WateringSchedule) هم حذف می‌شوند
+        orphans = PeriodicTask.objects.filter(task=LEGACY_TASK, wateringschedule__isnull=True)
+        orphan_count = orphans.count()
+        if not dry_run:
+            orphans.delete()
+            # حذف گروهی سیگنال ندارد؛ beat باید از تغییر جدول باخبر شود
+            PeriodicTasks.update_changed()
+
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{migrated} زمان‌بندی منتقل شد و {orphan_count} PeriodicTask یتیم حذف شد."
+        ))
+
+    @staticmethod
+    def next_run(watering_schedule, today):
+        """تاریخ اجرای بعدی PeriodicTask قدیمی بر اساس آخرین اجرا یا زمان شروع آن"""
+        task = watering_schedule.schedule
+        every = timedelta(days=watering_schedule.frequency)
+        if task.last_run_at:
+            return max(today, task.last_run_at.date() + every)
+        if task.start_time:
+            return max(today, task.start_time.date())
+        return today
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from plants.services.watering_prediction import recompute_predictions
+
+
+class Command(BaseCommand):
+    help = "بازمحاسبه فاصله آبیاری پیش‌بینی‌شده همه گیاهان و prior گونه‌ها از روی WateringLog (همان تسک شبانه)."
+
+    def handle(self, *args, **options):
+        summary = recompute_predictions()
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['updated']}/{summary['plants']} گیاه به‌روز شد، {summary['species']} گونه با prior، "
+            f"{summary['logs']} لاگ در {summary['seconds']} ثانیه."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0005_alter_plant_options_alter_plantdiagnosis_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantdiagnosis',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='completed', max_length=20, verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0006_plantdiagnosis_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plant',
+            name='image_dhash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Image dHash'),
+        ),
+        migrations.AddField(
+            model_name='plant',
+            name='image_phash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Image pHash'),
+        ),
+        migrations.AddField(
+            model_name='plantdiagnosis',
+            name='image_dhash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Image dHash'),
+        ),
+        migrations.AddField(
+            model_name='plantdiagnosis',
+            name='image_phash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Image pHash'),
+        ),
+    ]
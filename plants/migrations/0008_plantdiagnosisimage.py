@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0007_image_perceptual_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantDiagnosisImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='diagnoses/', verbose_name='Image')),
+                ('position', models.PositiveSmallIntegerField(default=0, verbose_name='Position')),
+                ('result', models.JSONField(blank=True, default=dict, verbose_name='Per-image Result')),
+                ('diagnosis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='plants.plantdiagnosis', verbose_name='Diagnosis')),
+            ],
+            options={
+                'verbose_name': 'Plant Diagnosis Image',
+                'verbose_name_plural': 'Plant Diagnosis Images',
+                'ordering': ['diagnosis', 'position'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0008_plantdiagnosisimage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plant',
+            name='reminder_enqueued_for',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Reminder Enqueued For'),
+        ),
+        migrations.AddIndex(
+            model_name='plant',
+            index=models.Index(fields=['is_active', 'next_watering'], name='plant_active_next_watering_idx'),
+        ),
+    ]
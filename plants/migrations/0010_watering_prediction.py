@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+def mark_reminder_logs(apps, schema_editor):
+    # لاگ‌هایی که یادآوری خودکار ثبت کرده آبیاری واقعی نیستند و در پیش‌بینی شمرده نمی‌شوند
+    WateringLog = apps.get_model('plants', 'WateringLog')
+    WateringLog.objects.filter(note__startswith='Automated watering reminder').update(source='reminder')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0009_watering_sweep'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeciesWateringPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('species', models.CharField(max_length=100, unique=True, verbose_name='Normalized Species')),
+                ('mean_interval', models.FloatField(verbose_name='Mean Interval (days)')),
+                ('plant_count', models.PositiveIntegerField(default=0, verbose_name='Plant Count')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Species Watering Prior',
+                'verbose_name_plural': 'Species Watering Priors',
+            },
+        ),
+        migrations.AddField(
+            model_name='plant',
+            name='interval_sum',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='plant',
+            name='interval_weight',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='plant',
+            name='predicted_interval',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Predicted Watering Interval'),
+        ),
+        migrations.AddField(
+            model_name='wateringlog',
+            name='source',
+            field=models.CharField(choices=[('manual', 'Recorded by user'), ('reminder', 'Automated reminder')], default='manual', max_length=10, verbose_name='Source'),
+        ),
+        migrations.AddIndex(
+            model_name='wateringlog',
+            index=models.Index(fields=['source', 'plant', 'watered_at'], name='wateringlog_source_plant_idx'),
+        ),
+        migrations.RunPython(mark_reminder_logs, migrations.RunPython.noop),
+    ]
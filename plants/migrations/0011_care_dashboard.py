@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0010_watering_prediction'),
+        ('users', '0002_remove_customuser_subscription_end_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CareDashboard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='care_dashboard', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+                ('plants', models.JSONField(default=dict, verbose_name='Plants Summary')),
+                ('is_stale', models.BooleanField(default=False, verbose_name='Is Stale')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Care Dashboard',
+                'verbose_name_plural': 'Care Dashboards',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0011_care_dashboard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plant',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='plant_user_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plantdiagnosis',
+            index=models.Index(fields=['plant', '-created_at', '-id'], name='diagnosis_plant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wateringlog',
+            index=models.Index(fields=['plant', '-watered_at', '-id'], name='wateringlog_plant_watered_idx'),
+        ),
+    ]
@@ -19,6 +19,8 @@ class Plant(models.Model):
     species = models.CharField(max_length=100, blank=True, verbose_name=_("Species"))
     description = models.TextField(blank=True, verbose_name=_("Description"))
     image = models.ImageField(upload_to='plants/', verbose_name=_("Image"))
+    image_phash = models.CharField(max_length=16, blank=True, editable=False, verbose_name=_("Image pHash"))
+    image_dhash = models.CharField(max_length=16, blank=True, editable=False, verbose_name=_("Image dHash"))
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Uploaded At"))
 
     # آبیاری
@@ -26,36 +28,80 @@ class Plant(models.Model):
                                              verbose_name=_("Watering Frequency"))
     last_watered = models.DateField(null=True, blank=True, verbose_name=_("Last Watered"))
     next_watering = models.DateField(null=True, blank=True, verbose_name=_("Next Watering"))
+    # تاریخ next_wateringی که یادآوری آن در صف قرار گرفته؛ جلوی ارسال تکراری در sweepهای بعدی را می‌گیرد
+    reminder_enqueued_for = models.DateField(null=True, blank=True, editable=False,
+                                             verbose_name=_("Reminder Enqueued For"))
     is_active = models.BooleanField(default=True, verbose_name=_("Is Active"))
+    # فاصله آبیاری یادگرفته‌شده از WateringLogهای کاربر (services/watering_prediction)؛
+    # interval_sum و interval_weight آماره‌های کافی میانگین وزنی نمایی برای به‌روزرسانی افزایشی هستند
+    predicted_interval = models.FloatField(null=True, blank=True, editable=False,
+                                           verbose_name=_("Predicted Watering Interval"))
+    interval_sum = models.FloatField(default=0.0, editable=False)
+    interval_weight = models.FloatField(default=0.0, editable=False)
 
     class Meta:
         ordering = ['-uploaded_at']
         verbose_name = _("Plant")
         verbose_name_plural = _("Plants")
+        indexes = [
+            # کوئری بازه‌ای sweep یادآوری آبیاری
+            models.Index(fields=['is_active', 'next_watering'], name='plant_active_next_watering_idx'),
+            # صفحه‌بندی cursor لیست گیاهان کاربر
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='plant_user_uploaded_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def effective_interval(self):
+        """فاصله آبیاری مورد استفاده برای next_watering: مقدار پیش‌بینی‌شده یا فاصله واردشده توسط کاربر"""
+        if settings.WATERING_PREDICTION_ENABLED and self.predicted_interval:
+            return max(1, round(self.predicted_interval))
+        return self.watering_frequency
+
     def update_next_watering(self):
         """محاسبه زمان آبیاری بعدی بر اساس آخرین آبیاری و فاصله آبیاری"""
-        if self.last_watered and self.watering_frequency:
-            self.next_watering = self.last_watered + timedelta(days=self.watering_frequency)
+        interval = self.effective_interval
+        if self.last_watered and interval:
+            self.next_watering = self.last_watered + timedelta(days=interval)
         else:
             self.next_watering = None
         self.save(update_fields=['next_watering'])
 
-    def mark_watered_today(self, note=""):
+    def mark_watered_today(self, note="", source=None):
         """ثبت آبیاری امروز و به‌روزرسانی زمان بعدی و ثبت لاگ"""
-        self.last_watered = date.today()
+        from .services.watering_prediction import record_watering
+
+        source = source or WateringLog.SOURCE_MANUAL
+        today = date.today()
+        # فقط آبیاری ثبت‌شده توسط کاربر فاصله واقعی را نشان می‌دهد، نه یادآوری خودکار
+        if source == WateringLog.SOURCE_MANUAL:
+            record_watering(self)
+        self.last_watered = today
+        self.save(update_fields=['last_watered', 'predicted_interval', 'interval_sum', 'interval_weight'])
         self.update_next_watering()
-        WateringLog.objects.create(plant=self, note=note)
+        WateringLog.objects.create(plant=self, note=note, source=source)
 
 
 
 # =======================================================
 class PlantDiagnosis(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_PROCESSING, _('Processing')),
+        (STATUS_COMPLETED, _('Completed')),
+        (STATUS_FAILED, _('Failed')),
+    ]
+
     plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='diagnoses', verbose_name=_("Plant"))
     image = models.ImageField(upload_to='diagnoses/', verbose_name=_("Diagnosis Image"))
+    image_phash = models.CharField(max_length=16, blank=True, editable=False, verbose_name=_("Image pHash"))
+    image_dhash = models.CharField(max_length=16, blank=True, editable=False, verbose_name=_("Image dHash"))
     diagnosis = models.TextField(verbose_name=_("Diagnosis Result"))
     category = models.CharField(
         max_length=50,
@@ -71,28 +117,70 @@ class PlantDiagnosis(models.Model):
     )
     confidence = models.FloatField(default=0.0, verbose_name=_("Confidence"))
     care_instructions = models.TextField(verbose_name=_("Care Instructions"))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_COMPLETED,
+                              verbose_name=_("Status"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = _("Plant Diagnosis")
         verbose_name_plural = _("Plant Diagnoses")
+        indexes = [
+            models.Index(fields=['plant', '-created_at', '-id'], name='diagnosis_plant_created_idx'),
+        ]
 
     def __str__(self):
         return f"Diagnosis for {self.plant.name} - {self.created_at.strftime('%Y-%m-%d')}"
 
+    def add_images(self, uploaded_images):
+        """ثبت همه تصاویر آپلودشده؛ تصویر اول همان فایل فیلد image است و دوباره ذخیره نمی‌شود"""
+        images = [PlantDiagnosisImage(diagnosis=self, image=self.image.name, position=0)]
+        for position, uploaded in enumerate(uploaded_images[1:], start=1):
+            image = PlantDiagnosisImage(diagnosis=self, position=position)
+            image.image.save(uploaded.name, uploaded, save=False)
+            images.append(image)
+        return PlantDiagnosisImage.objects.bulk_create(images)
+
+
+# =======================================================
+class PlantDiagnosisImage(models.Model):  # تصاویر یک تشخیص چندتصویری؛ همه در یک فراخوانی Plant.id ارسال می‌شوند
+    diagnosis = models.ForeignKey(PlantDiagnosis, on_delete=models.CASCADE, related_name='images',
+                                  verbose_name=_("Diagnosis"))
+    image = models.ImageField(upload_to='diagnoses/', verbose_name=_("Image"))
+    position = models.PositiveSmallIntegerField(default=0, verbose_name=_("Position"))
+    result = models.JSONField(default=dict, blank=True, verbose_name=_("Per-image Result"))
+
+    class Meta:
+        ordering = ['diagnosis', 'position']
+        verbose_name = _("Plant Diagnosis Image")
+        verbose_name_plural = _("Plant Diagnosis Images")
+
+    def __str__(self):
+        return f"Image {self.position} of diagnosis {self.diagnosis_id}"
+
 
 # ======================================================
 class WateringLog(models.Model):    #  برای ثبت سوابق آبیاری گیاهان و داده‌های تاریخی استفاده می‌شود
+    SOURCE_MANUAL = 'manual'
+    SOURCE_REMINDER = 'reminder'
+    SOURCE_CHOICES = [
+        (SOURCE_MANUAL, _("Recorded by user")),
+        (SOURCE_REMINDER, _("Automated reminder")),
+    ]
 
     plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='watering_logs', verbose_name=_("Plant"))
     watered_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Watered At"))
     note = models.TextField(blank=True,
                             help_text=_("Optional note about watering (e.g., water type or special conditions)"),
                             verbose_name=_("Note"))
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_MANUAL, verbose_name=_("Source"))
 
     class Meta:
         ordering = ['-watered_at']
+        indexes = [
+            models.Index(fields=['source', 'plant', 'watered_at'], name='wateringlog_source_plant_idx'),
+            models.Index(fields=['plant', '-watered_at', '-id'], name='wateringlog_plant_watered_idx'),
+        ]
         verbose_name = _("Watering Log")
         verbose_name_plural = _("Watering Logs")
 
@@ -114,6 +202,10 @@ class WateringSchedule(models.Model):  #  برای مدیریت و تعیین ز
         if self.schedule:
             self.schedule.delete()
 
+        if settings.WATERING_SCHEDULER == 'sweep':
+            self.sync_plant_for_sweep()
+            return
+
         schedule, created = IntervalSchedule.objects.get_or_create(every=self.frequency, period=IntervalSchedule.DAYS)
 
         task = PeriodicTask.objects.create(
@@ -128,10 +220,62 @@ class WateringSchedule(models.Model):  #  برای مدیریت و تعیین ز
         self.schedule = task
         self.save()
 
+    def sync_plant_for_sweep(self):
+        """
+        در حالت sweep به‌جای PeriodicTask جداگانه، فاصله آبیاری روی خود گیاه ثبت می‌شود و
+        تسک sweep_due_waterings گیاهان سررسیدشده را از روی next_watering پیدا می‌کند.
+        """
+        plant = self.plant
+        plant.watering_frequency = self.frequency
+        if plant.last_watered:
+            plant.next_watering = plant.last_watered + timedelta(days=self.frequency)
+        elif plant.next_watering is None:
+            plant.next_watering = date.today()
+        plant.save(update_fields=['watering_frequency', 'next_watering'])
+        if self.schedule_id:
+            self.schedule = None
+            self.save(update_fields=['schedule'])
+
     def __str__(self):
         return f"{self.plant.name} watering schedule every {self.frequency} days"
 
     def delete(self, *args, **kwargs):
         if self.schedule:
             self.schedule.delete()
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        super().delete(*args, **kwargs)
+
+
+# ======================================================
+class SpeciesWateringPrior(models.Model):  # فاصله آبیاری تجمیعی هر گونه از همه کاربران؛ prior پیش‌بینی برای گیاهان کم‌سابقه
+
+    species = models.CharField(max_length=100, unique=True, verbose_name=_("Normalized Species"))
+    mean_interval = models.FloatField(verbose_name=_("Mean Interval (days)"))
+    plant_count = models.PositiveIntegerField(default=0, verbose_name=_("Plant Count"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        verbose_name = _("Species Watering Prior")
+        verbose_name_plural = _("Species Watering Priors")
+
+    def __str__(self):
+        return f"{self.species}: {self.mean_interval:.1f} days ({self.plant_count} plants)"
+
+
+# ======================================================
+class CareDashboard(models.Model):  # خلاصه از پیش محاسبه‌شده صفحه اصلی هر کاربر؛ با سیگنال‌ها به‌روز می‌شود (services/care_dashboard)
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='care_dashboard', verbose_name=_("User"))
+    # {plant_id: {name, species, image, next_watering, last_watered, last_manual_watering, interval, streak,
+    #             last_diagnosis}}
+    plants = models.JSONField(default=dict, verbose_name=_("Plants Summary"))
+    # به‌روزرسانی‌های گروهی (بدون سیگنال) فقط این فلگ را می‌زنند و داشبورد هنگام خواندن دوباره ساخته می‌شود
+    is_stale = models.BooleanField(default=False, verbose_name=_("Is Stale"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        verbose_name = _("Care Dashboard")
+        verbose_name_plural = _("Care Dashboards")
+
+    def __str__(self):
+        return f"Care dashboard of user {self.user_id}"
@@ -1,10 +1,11 @@
 from rest_framework import serializers
-from .models import Plant, PlantDiagnosis, WateringLog, WateringSchedule
+from .models import Plant, PlantDiagnosis, PlantDiagnosisImage, WateringLog, WateringSchedule
 from django.db import transaction
+from utils.serializers import SparseFieldsetMixin
 
 
 # =========================================================
-class PlantSerializer(serializers.ModelSerializer):
+class PlantSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Plant
         fields = (
@@ -28,30 +29,64 @@ class PlantSerializer(serializers.ModelSerializer):
         return plant
 
     def update(self, instance, validated_data):
+        if 'image' in validated_data:
+            # هش ادراکی تصویر جدید پس از ذخیره دوباره محاسبه می‌شود
+            instance.image_phash = ''
+            instance.image_dhash = ''
         return super().update(instance, validated_data)
 
 
 # =========================================================
-class PlantDiagnosisSerializer(serializers.ModelSerializer):
+class PlantDiagnosisImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlantDiagnosisImage
+        fields = ('id', 'image', 'position', 'result')
+        read_only_fields = fields
+
+
+# =========================================================
+class PlantDiagnosisSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    images = PlantDiagnosisImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = PlantDiagnosis
+        fields = (
+            'id', 'plant', 'image', 'images', 'diagnosis', 'category', 'confidence',
+            'care_instructions', 'status', 'created_at',
+        )
+        read_only_fields = ('diagnosis', 'category', 'confidence', 'care_instructions', 'status', 'created_at')
+
+    def update(self, instance, validated_data):
+        if 'image' in validated_data:
+            # هش ادراکی تصویر جدید پس از ذخیره دوباره محاسبه می‌شود
+            instance.image_phash = ''
+            instance.image_dhash = ''
+        return super().update(instance, validated_data)
+
+
+# =========================================================
+class PlantDiagnosisStatusSerializer(serializers.ModelSerializer):
+    images = PlantDiagnosisImageSerializer(many=True, read_only=True)
+
     class Meta:
         model = PlantDiagnosis
         fields = (
-            'id', 'plant', 'image', 'diagnosis', 'category', 'confidence',
-            'care_instructions', 'created_at',
+            'id', 'plant', 'status', 'diagnosis', 'category', 'confidence', 'care_instructions', 'images',
+            'created_at',
         )
-        read_only_fields = ('diagnosis', 'category', 'confidence', 'care_instructions', 'created_at')
+        read_only_fields = fields
 
 
 # =========================================================
-class WateringLogSerializer(serializers.ModelSerializer):
+class WateringLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     plant_name = serializers.CharField(source='plant.name', read_only=True)
 
     class Meta:
         model = WateringLog
         fields = (
-            'id', 'plant', 'plant_name', 'watered_at', 'note',
+            'id', 'plant', 'plant_name', 'watered_at', 'note', 'source',
         )
-        read_only_fields = ('id', 'watered_at', 'plant_name')
+        read_only_fields = ('id', 'watered_at', 'plant_name', 'source')
 
     def create(self, validated_data):
         return super().create(validated_data)
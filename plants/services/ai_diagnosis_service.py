@@ -1,75 +1,368 @@
 import base64
-import requests
+import httpx
 import logging
 from django.core.files.images import ImageFile
 import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from utils import http_client
+from .diagnosis_cache import DiagnosisResultCache
+from .image_preprocessing import ImagePreprocessor
+from .near_duplicate_index import find_reusable_diagnosis
 
 logger = logging.getLogger(__name__)
 
 class PlantDiagnosisService:
-    def __init__(self, image_field, api_key):
+    MODIFIERS = ["crops_fast", "similar_images"]
+    PLANT_LANGUAGE = "fa"
+    PLANT_DETAILS = ["common_names", "url", "wiki_description", "health_assessment"]
+
+    # مضربی از ۳ تا هر تکه به‌تنهایی و بدون padding میانی base64 شود
+    BODY_CHUNK_SIZE = 3 * 16 * 1024
+
+    def __init__(self, image_field, api_key, result_cache=None, preprocessor=None, extra_images=None):
         self.image_field = image_field
         self.api_key = api_key
         self.image_path = getattr(image_field, 'path', None)
+        # تصاویر دیگری از همین گیاه که همراه تصویر اصلی در یک درخواست ارسال می‌شوند
+        self.extra_image_paths = [image.path for image in extra_images or []]
+        if result_cache is None and settings.AI_DIAGNOSIS_CACHE_ENABLED:
+            result_cache = DiagnosisResultCache()
+        self.result_cache = result_cache
+        if preprocessor is None and settings.AI_IMAGE_PREPROCESS_ENABLED:
+            preprocessor = ImagePreprocessor(
+                max_side=settings.AI_IMAGE_MAX_SIDE,
+                image_format=settings.AI_IMAGE_FORMAT,
+                quality=settings.AI_IMAGE_QUALITY,
+            )
+        self.preprocessor = preprocessor
+        self.stats = {}
 
-    def encode_image(self):
-        if not self.image_path:
+    @property
+    def image_paths(self):
+        return [self.image_path] + self.extra_image_paths
+
+    def read_image(self, path=None):
+        """بایت‌های تصویری که ارسال می‌شود؛ در صورت فعال بودن پیش‌پردازش، نسخه کوچک‌شده و بدون EXIF"""
+        path = path or self.image_path
+        if not path:
             raise ValueError("Image path is not valid for encoding.")
         try:
-            with open(self.image_path, "rb") as f:
-                return base64.b64encode(f.read()).decode("utf-8")
+            if self.preprocessor is not None:
+                data, stats = self.preprocessor.process(path)
+            else:
+                with open(path, "rb") as f:
+                    data = f.read()
+                stats = {'original_bytes': len(data), 'processed_bytes': len(data), 'bytes_saved': 0}
+            for key in ('original_bytes', 'processed_bytes', 'bytes_saved', 'preprocess_ms'):
+                self.stats[key] = self.stats.get(key, 0) + stats.get(key, 0)
+            return data
         except FileNotFoundError:
-            raise FileNotFoundError(f"Image file not found at {self.image_path}")
+            raise FileNotFoundError(f"Image file not found at {path}")
         except Exception as e:
             raise Exception(f"Error encoding image: {e}")
 
+    def read_images(self):
+        return [self.read_image(path) for path in self.image_paths]
+
+    def encode_image(self):
+        return base64.b64encode(self.read_image()).decode("utf-8")
+
+    def iter_request_body(self, images):
+        """
+        بدنه JSON درخواست به صورت تکه‌تکه؛ base64 هر تصویر در حین ارسال ساخته می‌شود
+        و هیچ‌وقت رشته کامل base64 یا دیکشنری payload در حافظه ساخته نمی‌شود.
+        """
+        head = json.dumps({"api_key": self.api_key, **self.payload_options()}, ensure_ascii=False)
+        yield head[:-1].encode("utf-8") + b', "images": ['
+        for index, data in enumerate(images):
+            yield b'"' if index == 0 else b', "'
+            view = memoryview(data)
+            for offset in range(0, len(view), self.BODY_CHUNK_SIZE):
+                yield base64.b64encode(view[offset:offset + self.BODY_CHUNK_SIZE])
+            yield b'"'
+        yield b']}'
+
+    def payload_options(self):
+        """بخش‌هایی از payload که روی پاسخ اثر دارند (بدون کلید API و تصاویر)"""
+        return {
+            "modifiers": list(self.MODIFIERS),
+            "plant_language": self.PLANT_LANGUAGE,
+            "plant_details": list(self.PLANT_DETAILS),
+        }
+
     def build_payload(self, image_base64):
         return {
             "api_key": self.api_key,
             "images": [image_base64],
-            "modifiers": ["crops_fast", "similar_images"],
-            "plant_language": "fa",
-            "plant_details": ["common_names", "url", "wiki_description", "health_assessment"]
+            **self.payload_options(),
         }
 
+    def cache_key(self):
+        image_digests = [DiagnosisResultCache.hash_file(path) for path in self.image_paths]
+        options = self.payload_options()
+        if self.preprocessor is not None:
+            options["preprocessing"] = self.preprocessor.options()
+        return DiagnosisResultCache.make_key(image_digests, options)
+
+    @staticmethod
+    def request_kwargs(payload):
+        """payload می‌تواند دیکشنری یا iterable از بایت‌ها (بدنه استریم‌شده) باشد"""
+        body = {"json": payload} if isinstance(payload, dict) else {"content": payload}
+        return {
+            "headers": {"Content-Type": "application/json"},
+            **body,
+        }
+
+    @staticmethod
+    def api_error(error, response=None):
+        """تبدیل خطای httpx به پیام قابل نمایش؛ برای مسیر sync و async یکسان است"""
+        if isinstance(error, httpx.TimeoutException):
+            logger.error("❌ Plant.id request timed out.", exc_info=True)
+            return Exception("AI service connection timed out.")
+        if isinstance(error, httpx.TransportError):
+            logger.error("❌ Could not connect to Plant.id service.", exc_info=True)
+            return Exception("Could not connect to AI diagnosis service.")
+        if isinstance(error, httpx.HTTPStatusError):
+            logger.error(f"❌ Plant.id service returned an HTTP error: {error} - {response.text}", exc_info=True)
+            return Exception(f"AI service returned an error: {error} - {response.text}")
+        if isinstance(error, json.JSONDecodeError):
+            logger.error("❌ Plant.id service returned an invalid JSON response.", exc_info=True)
+            return Exception("AI service returned an invalid JSON response.")
+        if isinstance(error, httpx.HTTPError):
+            logger.error(f"❌ Plant.id request failed: {error}", exc_info=True)
+            return Exception(f"An unexpected request error occurred: {error}")
+        logger.error(f"❌ An unexpected error occurred during API call: {error}", exc_info=True)
+        return Exception(f"An unexpected error occurred: {error}")
+
     def call_api(self, payload):
+        response = None
         try:
-            response = requests.post(
-                "https://api.plant.id/v2/identify",
-                headers={"Content-Type": "application/json"},
-                json=payload,
-                timeout=30
-            )
+            response = http_client.post(settings.PLANT_ID_API_URL, **self.request_kwargs(payload))
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            raise self.api_error(e, response)
+
+    async def acall_api(self, payload):
+        response = None
+        if not isinstance(payload, dict):
+            payload = _aiter_chunks(payload)
+        try:
+            response = await http_client.apost(settings.PLANT_ID_API_URL, **self.request_kwargs(payload))
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.Timeout:
-            logger.error("❌ Plant.id request timed out.", exc_info=True)
-            raise Exception("AI service connection timed out.")
-        except requests.exceptions.ConnectionError:
-            logger.error("❌ Could not connect to Plant.id service.", exc_info=True)
-            raise Exception("Could not connect to AI diagnosis service.")
-        except requests.exceptions.HTTPError as http_err:
-            logger.error(f"❌ Plant.id service returned an HTTP error: {http_err} - {response.text}", exc_info=True)
-            raise Exception(f"AI service returned an error: {http_err} - {response.text}")
-        except json.JSONDecodeError:
-            logger.error("❌ Plant.id service returned an invalid JSON response.", exc_info=True)
-            raise Exception("AI service returned an invalid JSON response.")
-        except requests.RequestException as e:
-            logger.error(f"❌ Plant.id request failed: {e}", exc_info=True)
-            raise Exception(f"An unexpected request error occurred: {e}")
         except Exception as e:
-            logger.error(f"❌ An unexpected error occurred during API call: {e}", exc_info=True)
-            raise Exception(f"An unexpected error occurred: {e}")
+            raise self.api_error(e, response)
+
+    def cached_result(self):
+        """(کلید کش، نتیجه کش‌شده یا None)"""
+        if not self.result_cache:
+            return None, None
+        cache_key = self.cache_key()
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            logger.info("♻️ نتیجه تشخیص از کش (هش تصویر) بازگردانده شد.")
+        return cache_key, cached
+
+    def store_result(self, cache_key, result, started):
+        self.stats['upload_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(
+            "📦 Plant.id request: {original_bytes} → {processed_bytes} bytes "
+            "(saved {bytes_saved}), preprocess {preprocess_ms}ms, api {upload_ms}ms".format(
+                **{'preprocess_ms': 0, **self.stats}
+            )
+        )
+        if cache_key is not None and result:
+            self.result_cache.set(cache_key, result)
 
     def diagnose(self):
         if not self.image_path:
             logger.warning("تصویر یا مسیر تصویر معتبر نیست.")
             return None
         try:
-            base64_img = self.encode_image()
-            payload = self.build_payload(base64_img)
-            result = self.call_api(payload)
+            cache_key, cached = self.cached_result()
+            if cached is not None:
+                return cached
+
+            images = self.read_images()
+            started = time.perf_counter()
+            result = self.call_api(self.iter_request_body(images))
+            self.store_result(cache_key, result, started)
+            return result
+        except Exception as e:
+            logger.error(f"❌ خطای داخلی در diagnosis: {e}", exc_info=True)
+            raise
+
+    async def adiagnose(self):
+        """نسخه async از diagnose؛ کارهای CPU و دیسک در thread جدا و فراخوانی API روی event loop"""
+        if not self.image_path:
+            logger.warning("تصویر یا مسیر تصویر معتبر نیست.")
+            return None
+        try:
+            cache_key, cached = await sync_to_async(self.cached_result, thread_sensitive=False)()
+            if cached is not None:
+                return cached
+
+            images = await sync_to_async(self.read_images, thread_sensitive=False)()
+            started = time.perf_counter()
+            result = await self.acall_api(self.iter_request_body(images))
+            await sync_to_async(self.store_result, thread_sensitive=False)(cache_key, result, started)
             return result
         except Exception as e:
             logger.error(f"❌ خطای داخلی در diagnosis: {e}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def per_image_results(ai_output, count):
+        """
+        Plant.id همه تصاویر یک درخواست را یک گیاه در نظر می‌گیرد؛ برای هر تصویر مشخصات همان تصویر
+        در پاسخ (نام فایل و آدرس) به همراه شناسایی برتر ذخیره می‌شود.
+        """
+        ai_output = ai_output or {}
+        response_images = ai_output.get('images') or []
+        suggestions = ai_output.get('suggestions') or []
+        best = suggestions[0] if suggestions else {}
+        results = []
+        for index in range(count):
+            image_info = response_images[index] if index < len(response_images) else {}
+            results.append({
+                'file_name': image_info.get('file_name'),
+                'url': image_info.get('url'),
+                'plant_name': best.get('plant_name'),
+                'probability': best.get('probability', 0.0),
+            })
+        return results
+
+    @staticmethod
+    def interpret(ai_output):
+        """تبدیل خروجی خام Plant.id به فیلدهای مدل PlantDiagnosis"""
+        diagnosis_text = "مشکل خاصی پیدا نشد."
+        care_instructions_text = "توصیه‌های کلی برای مراقبت از گیاه."
+        category_text = "سایر"
+        confidence_score = 0.0
+
+        if ai_output and 'suggestions' in ai_output and ai_output['suggestions']:
+            best_suggestion = ai_output['suggestions'][0]
+            confidence_score = best_suggestion.get('probability', 0.0)
+
+            if 'health_assessment' in ai_output and not ai_output['health_assessment'].get('is_healthy', True):
+                problems = ai_output['health_assessment'].get('diseases', []) + ai_output['health_assessment'].get(
+                    'pests', [])
+                if problems:
+                    first_problem = problems[0]
+                    diagnosis_text = f"مشکل احتمالی: {first_problem.get('name', 'ناشناخته')}"
+                    care_instructions_text = best_suggestion.get('details', {}).get('wiki_description',
+                                                                                    'دستورالعمل مراقبتی خاصی ارائه نشده است.')
+                    category_text = "بیماری"
+                else:
+                    diagnosis_text = "سلامت گیاه تایید نشد، اما مشکل خاصی شناسایی نشد."
+                    category_text = "ناسالم_ناشناخته"
+
+            elif best_suggestion.get('plant_name'):
+                plant_details = best_suggestion.get('plant_details', {})
+                common_names = plant_details.get('common_names', [])
+                if common_names:
+                    plant_name = common_names[0]
+                else:
+                    plant_name = best_suggestion.get('plant_name', 'ناشناخته')
+
+                diagnosis_text = f"شناسایی گیاه: {plant_name}"
+                care_instructions_text = plant_details.get('wiki_description', {}).get('value', '')
+                category_text = "شناسایی_شده"
+        else:
+            diagnosis_text = "تشخیص هوش مصنوعی امکان‌پذیر نبود. لطفاً تصویر واضح‌تری آپلود کنید."
+            care_instructions_text = "لطفاً با کارشناس گیاه مشورت کنید."
+            category_text = "سایر"
+
+        return {
+            'diagnosis': diagnosis_text,
+            'care_instructions': care_instructions_text,
+            'category': category_text,
+            'confidence': confidence_score,
+        }
+
+
+REUSABLE_FIELDS = ('diagnosis', 'care_instructions', 'category', 'confidence')
+
+
+def run_diagnosis(diagnosis_instance):
+    """
+    اجرای تشخیص برای یک رکورد PlantDiagnosis و ذخیره نتیجه روی همان رکورد.
+    هم در مسیر همگام (view) و هم در تسک Celery استفاده می‌شود؛ خطاها به فراخواننده برگردانده می‌شوند.
+    """
+    images, ai_service = prepare_diagnosis(diagnosis_instance)
+    if ai_service is None:
+        return diagnosis_instance
+
+    ai_output = ai_service.diagnose()
+    return apply_ai_output(diagnosis_instance, images, ai_output)
+
+
+async def arun_diagnosis(diagnosis_instance):
+    """نسخه async از run_diagnosis برای viewهای ASGI"""
+    images, ai_service = await sync_to_async(prepare_diagnosis)(diagnosis_instance)
+    if ai_service is None:
+        return diagnosis_instance
+
+    ai_output = await ai_service.adiagnose()
+    return await sync_to_async(apply_ai_output)(diagnosis_instance, images, ai_output)
+
+
+def prepare_diagnosis(diagnosis_instance):
+    """
+    خروجی: (تصاویر رکورد، سرویس تشخیص). اگر تشخیص مشابه اخیری پیدا شود همان ذخیره می‌شود
+    و سرویس None است.
+    """
+    from plants.models import PlantDiagnosis
+
+    images = list(diagnosis_instance.images.all())
+    extra_images = [image.image for image in images if image.position > 0]
+
+    reusable = None if extra_images else find_reusable_diagnosis(diagnosis_instance)
+    if reusable is not None:
+        logger.info(f"♻️ تشخیص {reusable.pk} برای تصویر تقریباً مشابه رکورد {diagnosis_instance.pk} استفاده شد.")
+        for field in REUSABLE_FIELDS:
+            setattr(diagnosis_instance, field, getattr(reusable, field))
+        diagnosis_instance.status = PlantDiagnosis.STATUS_COMPLETED
+        diagnosis_instance.save()
+        return images, None
+
+    ai_service = PlantDiagnosisService(
+        image_field=diagnosis_instance.image,
+        api_key=settings.AI_API_KEY,
+        extra_images=extra_images,
+    )
+    return images, ai_service
+
+
+def apply_ai_output(diagnosis_instance, images, ai_output):
+    from plants.models import PlantDiagnosis, PlantDiagnosisImage
+
+    for field, value in PlantDiagnosisService.interpret(ai_output).items():
+        setattr(diagnosis_instance, field, value)
+    diagnosis_instance.status = PlantDiagnosis.STATUS_COMPLETED
+    diagnosis_instance.save()
+
+    if images:
+        for image, result in zip(images, PlantDiagnosisService.per_image_results(ai_output, len(images))):
+            image.result = result
+        PlantDiagnosisImage.objects.bulk_update(images, ['result'])
+    return diagnosis_instance
+
+
+async def _aiter_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def mark_diagnosis_failed(diagnosis_instance, error):
+    from plants.models import PlantDiagnosis
+
+    diagnosis_instance.diagnosis = f"تشخیص هوش مصنوعی ناموفق بود: {error}. لطفا از وضوح تصویر اطمینان حاصل کرده و دوباره امتحان کنید."
+    diagnosis_instance.care_instructions = "لطفا تصویر واضح‌تری آپلود کنید یا به صورت دستی با یک کارشناس گیاه مشورت کنید."
+    diagnosis_instance.category = "سایر"
+    diagnosis_instance.confidence = 0.0
+    diagnosis_instance.status = PlantDiagnosis.STATUS_FAILED
+    diagnosis_instance.save()
@@ -0,0 +1,242 @@
+import logging
+from collections import defaultdict
+from datetime import date
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+logger = logging.getLogger(__name__)
+
+# آبیاری تا این تعداد روز پس از موعد هنوز «به‌موقع» حساب می‌شود و رکورد پیاپی را قطع نمی‌کند
+STREAK_GRACE_DAYS = 1
+
+# فیلدهایی از Plant که در داشبورد نمایش داده می‌شوند؛ ذخیره‌های دیگر (مثل هش تصویر) داشبورد را تغییر نمی‌دهند
+PLANT_FIELDS = frozenset({
+    'name', 'species', 'image', 'next_watering', 'last_watered', 'watering_frequency', 'predicted_interval',
+    'is_active',
+})
+
+STATUS_OVERDUE = 'overdue'
+STATUS_DUE_TODAY = 'due_today'
+STATUS_UPCOMING = 'upcoming'
+STATUS_UNSCHEDULED = 'unscheduled'
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def next_streak(streak, previous, watered_on, interval):
+    """تعداد آبیاری‌های پیاپی به‌موقع پس از یک آبیاری دستی جدید؛ آبیاری دیرهنگام رکورد جدیدی از ۱ شروع می‌کند"""
+    if previous is None or not interval:
+        return 1
+    on_time = (watered_on - previous).days <= interval + STREAK_GRACE_DAYS
+    return streak + 1 if on_time else 1
+
+
+def diagnosis_entry(diagnosis):
+    return {
+        'id': diagnosis.id,
+        'category': diagnosis.category,
+        'status': diagnosis.status,
+        'confidence': diagnosis.confidence,
+        'created_at': _iso(diagnosis.created_at),
+    }
+
+
+def plant_entry(plant, previous=None):
+    """ورودی یک گیاه در داشبورد؛ مقادیری که فقط از لاگ‌ها و تشخیص‌ها می‌آیند از ورودی قبلی حفظ می‌شوند"""
+    previous = previous or {}
+    return {
+        'id': plant.id,
+        'name': plant.name,
+        'species': plant.species,
+        'image': plant.image.name if plant.image else '',
+        'next_watering': _iso(plant.next_watering),
+        'last_watered': _iso(plant.last_watered),
+        'interval': plant.effective_interval,
+        'last_manual_watering': previous.get('last_manual_watering'),
+        'streak': previous.get('streak', 0),
+        'last_diagnosis': previous.get('last_diagnosis'),
+    }
+
+
+def build_entries(user_id):
+    """ساخت کامل داشبورد از دیتابیس با تعداد ثابت کوئری (گیاهان، آخرین تشخیص‌ها، آبیاری‌های دستی)"""
+    from plants.models import Plant, PlantDiagnosis, WateringLog
+
+    latest_diagnosis = PlantDiagnosis.objects.filter(plant=OuterRef('pk')).order_by('-created_at', '-id')
+    plants = list(
+        Plant.objects.filter(user_id=user_id, is_active=True)
+        .annotate(last_diagnosis_id=Subquery(latest_diagnosis.values('id')[:1]))
+    )
+    diagnoses = PlantDiagnosis.objects.in_bulk(
+        [plant.last_diagnosis_id for plant in plants if plant.last_diagnosis_id]
+    )
+    waterings = defaultdict(list)
+    rows = (
+        WateringLog.objects.filter(plant__in=plants, source=WateringLog.SOURCE_MANUAL)
+        .order_by('plant_id', 'watered_at').values_list('plant_id', 'watered_at')
+    )
+    for plant_id, watered_at in rows:
+        waterings[plant_id].append(watered_at.date())
+
+    entries = {}
+    for plant in plants:
+        streak, previous = 0, None
+        for watered_on in waterings[plant.id]:
+            streak = next_streak(streak, previous, watered_on, plant.effective_interval)
+            previous = watered_on
+        entry = plant_entry(plant, {'streak': streak, 'last_manual_watering': _iso(previous)})
+        if plant.last_diagnosis_id in diagnoses:
+            entry['last_diagnosis'] = diagnosis_entry(diagnoses[plant.last_diagnosis_id])
+        entries[str(plant.id)] = entry
+    return entries
+
+
+def get_dashboard(user):
+    """داشبورد ذخیره‌شده کاربر؛ فقط اگر وجود نداشته باشد یا stale شده باشد دوباره ساخته می‌شود"""
+    from plants.models import CareDashboard
+
+    dashboard = CareDashboard.objects.filter(user=user).first()
+    if dashboard is None or dashboard.is_stale:
+        entries = build_entries(user.pk)
+        dashboard, _ = CareDashboard.objects.update_or_create(
+            user=user, defaults={'plants': entries, 'is_stale': False},
+        )
+    return dashboard
+
+
+def _patch(user_id, change):
+    """
+    اعمال تغییر افزایشی روی داشبورد موجود در یک تراکنش (قفل ردیف برای جلوگیری از گم شدن به‌روزرسانی‌های همزمان).
+    داشبوردی که هنوز ساخته نشده یا stale است دست نمی‌خورد؛ هنگام اولین خواندن کامل ساخته می‌شود.
+    """
+    from plants.models import CareDashboard
+
+    with transaction.atomic():
+        dashboard = CareDashboard.objects.select_for_update().filter(user_id=user_id, is_stale=False).first()
+        if dashboard is None:
+            return
+        if change(dashboard.plants) is not False:
+            dashboard.save(update_fields=['plants', 'updated_at'])
+
+
+def plant_saved(plant, update_fields=None, created=False):
+    if update_fields and not PLANT_FIELDS.intersection(update_fields):
+        return
+
+    reactivated = []
+
+    def change(entries):
+        key = str(plant.id)
+        if not plant.is_active:
+            return entries.pop(key, None) is not None
+        if key not in entries and not created:
+            # گیاه دوباره فعال‌شده سابقه آبیاری و تشخیص دارد که در entry خالی نیست؛ داشبورد کامل بازسازی می‌شود
+            reactivated.append(key)
+            return False
+        entries[key] = plant_entry(plant, entries.get(key))
+
+    _patch(plant.user_id, change)
+    if reactivated:
+        mark_stale(user_ids=[plant.user_id])
+
+
+def plant_deleted(plant):
+    _patch(plant.user_id, lambda entries: entries.pop(str(plant.id), None) is not None)
+
+
+def manual_watering_recorded(log):
+    plant = log.plant
+
+    def change(entries):
+        entry = entries.get(str(plant.id))
+        if entry is None:
+            return False
+        watered_on = log.watered_at.date()
+        previous = date.fromisoformat(entry['last_manual_watering']) if entry['last_manual_watering'] else None
+        entry['streak'] = next_streak(entry['streak'], previous, watered_on, entry['interval'])
+        entry['last_manual_watering'] = watered_on.isoformat()
+
+    _patch(plant.user_id, change)
+
+
+def diagnosis_saved(diagnosis):
+    def change(entries):
+        entry = entries.get(str(diagnosis.plant_id))
+        if entry is None:
+            return False
+        current = entry['last_diagnosis']
+        if current and current['id'] != diagnosis.id and current['created_at'] > _iso(diagnosis.created_at):
+            return False
+        entry['last_diagnosis'] = diagnosis_entry(diagnosis)
+
+    _patch(diagnosis.plant.user_id, change)
+
+
+def diagnosis_deleted(diagnosis):
+    from plants.models import Plant, PlantDiagnosis
+
+    # در حذف آبشاری گیاه، خود گیاه دیگر وجود ندارد و ورودی آن هم حذف شده است
+    user_id = Plant.objects.filter(pk=diagnosis.plant_id).values_list('user_id', flat=True).first()
+    if user_id is None:
+        return
+
+    def change(entries):
+        entry = entries.get(str(diagnosis.plant_id))
+        if entry is None or not entry['last_diagnosis'] or entry['last_diagnosis']['id'] != diagnosis.id:
+            return False
+        latest = PlantDiagnosis.objects.filter(plant_id=diagnosis.plant_id).order_by('-created_at', '-id').first()
+        entry['last_diagnosis'] = diagnosis_entry(latest) if latest else None
+
+    _patch(user_id, change)
+
+
+def mark_stale(user_ids=None, plant_ids=None):
+    """برای به‌روزرسانی‌های گروهی که سیگنال ندارند (یادآوری‌های گروهی، بازمحاسبه شبانه)؛ None یعنی همه کاربران"""
+    from plants.models import CareDashboard
+
+    dashboards = CareDashboard.objects.filter(is_stale=False)
+    if plant_ids is not None:
+        dashboards = dashboards.filter(user__plants__id__in=plant_ids)
+    if user_ids is not None:
+        dashboards = dashboards.filter(user_id__in=user_ids)
+    return CareDashboard.objects.filter(pk__in=dashboards.values('pk')).update(is_stale=True)
+
+
+def render_dashboard(dashboard, today=None, request=None):
+    """خروجی API: وضعیت آبیاری هر گیاه و شمارنده‌ها نسبت به امروز محاسبه می‌شوند (بدون کوئری)"""
+    today = today or date.today()
+    plants, counts = [], defaultdict(int)
+    for entry in dashboard.plants.values():
+        entry = dict(entry)
+        next_watering = date.fromisoformat(entry['next_watering']) if entry['next_watering'] else None
+        if next_watering is None:
+            entry['status'] = STATUS_UNSCHEDULED
+        elif next_watering < today:
+            entry['status'] = STATUS_OVERDUE
+            entry['days_overdue'] = (today - next_watering).days
+        elif next_watering == today:
+            entry['status'] = STATUS_DUE_TODAY
+        else:
+            entry['status'] = STATUS_UPCOMING
+        counts[entry['status']] += 1
+        if entry['image']:
+            url = default_storage.url(entry['image'])
+            entry['image'] = request.build_absolute_uri(url) if request else url
+        plants.append(entry)
+
+    plants.sort(key=lambda entry: (entry['next_watering'] is None, entry['next_watering'] or '', entry['name']))
+    return {
+        'date': today.isoformat(),
+        'summary': {
+            'plants': len(plants),
+            'due_today': counts[STATUS_DUE_TODAY],
+            'overdue': counts[STATUS_OVERDUE],
+            'best_streak': max((entry['streak'] for entry in plants), default=0),
+        },
+        'plants': plants,
+        'updated_at': dashboard.updated_at.isoformat() if dashboard.updated_at else None,
+    }
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class DiagnosisResultCache:
+    """
+    کش نتایج Plant.id بر اساس هش محتوای تصویر (content-addressed).
+    کلید از هش بایت‌های تصویر به همراه تنظیمات payload (modifiers، زبان و ...) ساخته می‌شود،
+    بنابراین آپلود دوباره همان عکس بدون فراخوانی API پولی پاسخ داده می‌شود.
+    """
+    KEY_PREFIX = 'plantid:result:'
+    HITS_KEY = 'plantid:cache:hits'
+    MISSES_KEY = 'plantid:cache:misses'
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, backend=None, timeout=None, max_item_bytes=None):
+        self.backend = backend or cache
+        self.timeout = timeout if timeout is not None else settings.AI_DIAGNOSIS_CACHE_TIMEOUT
+        self.max_item_bytes = max_item_bytes or settings.AI_DIAGNOSIS_CACHE_MAX_ITEM_BYTES
+
+    @classmethod
+    def hash_file(cls, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def make_key(cls, image_digests, options):
+        digest = hashlib.sha256()
+        for image_digest in image_digests:
+            digest.update(image_digest.encode())
+        digest.update(json.dumps(options, sort_keys=True, ensure_ascii=False).encode())
+        return cls.KEY_PREFIX + digest.hexdigest()
+
+    def get(self, key):
+        result = self.backend.get(key)
+        self._incr(self.HITS_KEY if result is not None else self.MISSES_KEY)
+        return result
+
+    def set(self, key, result):
+        size = len(json.dumps(result, ensure_ascii=False).encode())
+        if size > self.max_item_bytes:
+            logger.info(f"پاسخ Plant.id با حجم {size} بایت بزرگ‌تر از سقف کش است و ذخیره نشد.")
+            return False
+        self.backend.set(key, result, timeout=self.timeout)
+        return True
+
+    def stats(self):
+        hits = self.backend.get(self.HITS_KEY, 0)
+        misses = self.backend.get(self.MISSES_KEY, 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+        }
+
+    def reset_stats(self):
+        self.backend.delete_many([self.HITS_KEY, self.MISSES_KEY])
+
+    def _incr(self, key):
+        # شمارنده‌ها TTL ندارند تا با سیاست volatile-lru ردیس حذف نشوند
+        self.backend.add(key, 0, timeout=None)
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            self.backend.set(key, 1, timeout=None)
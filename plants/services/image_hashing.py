@@ -0,0 +1,134 @@
+import math
+from PIL import Image, ImageOps
+
+HASH_SIZE = 8
+PHASH_IMAGE_SIZE = 32
+
+_DCT_TABLE = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * PHASH_IMAGE_SIZE)) for x in range(PHASH_IMAGE_SIZE)]
+    for u in range(HASH_SIZE)
+]
+
+
+def _grayscale(image, size):
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    image = ImageOps.exif_transpose(image)
+    return image.convert('L').resize(size, Image.Resampling.LANCZOS)
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def average_hash(image):
+    """aHash: هر پیکسل نسبت به میانگین روشنایی تصویر ۸×۸"""
+    pixels = list(_grayscale(image, (HASH_SIZE, HASH_SIZE)).getdata())
+    avg = sum(pixels) / len(pixels)
+    return _bits_to_int(p > avg for p in pixels)
+
+
+def difference_hash(image):
+    """dHash: مقایسه هر پیکسل با همسایه سمت راستش در تصویر ۹×۸"""
+    gray = _grayscale(image, (HASH_SIZE + 1, HASH_SIZE))
+    pixels = list(gray.getdata())
+    bits = []
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits.append(pixels[offset + col] > pixels[offset + col + 1])
+    return _bits_to_int(bits)
+
+
+def perceptual_hash(image):
+    """pHash: ضرایب فرکانس پایین DCT تصویر ۳۲×۳۲ نسبت به میانه‌شان"""
+    gray = _grayscale(image, (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE))
+    pixels = list(gray.getdata())
+    rows = [pixels[i * PHASH_IMAGE_SIZE:(i + 1) * PHASH_IMAGE_SIZE] for i in range(PHASH_IMAGE_SIZE)]
+
+    # DCT جداپذیر: ابتدا روی سطرها و سپس روی ستون‌ها، فقط برای ۸ ضریب اول
+    row_dct = [[sum(c * p for c, p in zip(_DCT_TABLE[u], row)) for u in range(HASH_SIZE)] for row in rows]
+    coefficients = []
+    for v in range(HASH_SIZE):
+        for u in range(HASH_SIZE):
+            coefficients.append(sum(_DCT_TABLE[v][y] * row_dct[y][u] for y in range(PHASH_IMAGE_SIZE)))
+
+    median = sorted(coefficients)[len(coefficients) // 2]
+    return _bits_to_int(c > median for c in coefficients)
+
+
+def compute_hashes(image):
+    """محاسبه pHash و dHash به صورت رشته هگز ۱۶ کاراکتری برای ذخیره در دیتابیس"""
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+        image.load()
+    return {
+        'phash': hash_to_hex(perceptual_hash(image)),
+        'dhash': hash_to_hex(difference_hash(image)),
+    }
+
+
+def hash_to_hex(value):
+    return f"{value:016x}"
+
+
+def hex_to_hash(value):
+    return int(value, 16)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    درخت Burkhard-Keller روی فاصله همینگ برای جستجوی هش‌های نزدیک.
+    هر گره: (مقدار هش، آیتم‌ها، فرزندان بر اساس فاصله)
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+
+        node = self.root
+        while True:
+            node_value, items, children = node
+            distance = hamming_distance(value, node_value)
+            if distance == 0:
+                items.append(item)
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """همه آیتم‌ها با فاصله حداکثر max_distance؛ خروجی به ترتیب فاصله"""
+        if self.root is None:
+            return []
+
+        results = []
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                results.extend((distance, item) for item in items)
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in children.items() if low <= d <= high)
+
+        results.sort(key=lambda r: r[0])
+        return results
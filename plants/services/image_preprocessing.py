@@ -0,0 +1,92 @@
+import io
+import logging
+import time
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION_TAG = 0x0112
+
+FORMAT_CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+}
+
+
+class ImagePreprocessor:
+    """
+    آماده‌سازی تصویر پیش از ارسال به Plant.id:
+    کوچک‌سازی تا ضلع حداکثر، حذف EXIF (پس از اعمال چرخش آن) و فشرده‌سازی مجدد با کیفیت قابل تنظیم.
+    اگر خروجی از JPEG اصلی کوچک‌تر نشود، همان تصویر با اندازه و جدول‌های کوانتیزاسیون اصلی (quality='keep') و بدون
+    متادیتا (فقط تگ چرخش) دوباره ذخیره می‌شود؛ فایل آپلودشده هیچ‌وقت با EXIF (مثلاً مختصات GPS) ارسال نمی‌شود.
+    برای JPEG از draft استفاده می‌شود تا تصویر از ابتدا با وضوح کمتر decode شود و کل عکس در حافظه باز نشود.
+    """
+
+    def __init__(self, max_side=1024, image_format='JPEG', quality=85):
+        image_format = image_format.upper()
+        if image_format not in FORMAT_CONTENT_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+
+    @property
+    def content_type(self):
+        return FORMAT_CONTENT_TYPES[self.image_format]
+
+    def options(self):
+        return {'max_side': self.max_side, 'format': self.image_format, 'quality': self.quality}
+
+    def process(self, path):
+        """خروجی: (بایت‌های تصویر پردازش‌شده، آمار شامل حجم قبل/بعد و زمان صرف‌شده)"""
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            f.seek(0, io.SEEK_END)
+            original_bytes = f.tell()
+            f.seek(0)
+
+            image = Image.open(f)
+            resize = max(image.size) > self.max_side
+            if resize:
+                image.draft('RGB', (self.max_side, self.max_side))
+            image = ImageOps.exif_transpose(image)
+            if resize:
+                image.thumbnail((self.max_side, self.max_side), Image.Resampling.LANCZOS)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            output = io.BytesIO()
+            image.save(output, format=self.image_format, quality=self.quality, optimize=True)
+            data, size = output.getvalue(), image.size
+            if len(data) >= original_bytes:
+                # فشرده‌سازی مجدد حجم را کم نکرد (تصویر کوچک یا از قبل بهینه‌شده)
+                f.seek(0)
+                stripped = self.strip_metadata(Image.open(f))
+                if stripped is not None and len(stripped[0]) < len(data):
+                    data, size = stripped
+
+        stats = {
+            'original_bytes': original_bytes,
+            'processed_bytes': len(data),
+            'bytes_saved': original_bytes - len(data),
+            'width': size[0],
+            'height': size[1],
+            'preprocess_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+        return data, stats
+
+    @staticmethod
+    def strip_metadata(image):
+        """
+        ذخیره دوباره JPEG با همان اندازه و کیفیت و بدون EXIF/ICC/توضیحات؛ فقط تگ چرخش نگه داشته می‌شود تا تصویر
+        درست نمایش داده شود. خروجی: (بایت‌ها، ابعاد) یا None برای فرمت‌های دیگر.
+        """
+        if image.format != 'JPEG':
+            return None
+        exif = Image.Exif()
+        orientation = image.getexif().get(ORIENTATION_TAG)
+        if orientation:
+            exif[ORIENTATION_TAG] = orientation
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality='keep', optimize=True, exif=exif)
+        return output.getvalue(), image.size
@@ -0,0 +1,165 @@
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .image_hashing import BKTree, compute_hashes, hamming_distance, hex_to_hash
+
+logger = logging.getLogger(__name__)
+
+KIND_PLANT = 'plant'
+KIND_DIAGNOSIS = 'diagnosis'
+
+
+class NearDuplicateIndex:
+    """
+    ایندکس درون‌حافظه‌ای هش‌های ادراکی تصاویر Plant و PlantDiagnosis.
+
+    ایندکس فقط از ستون‌های هش دیتابیس ساخته می‌شود (نه اسکن MEDIA_ROOT) و به صورت افزایشی
+    به‌روز می‌شود: رکوردهای جدیدِ همین پروسه از طریق سیگنال اضافه می‌شوند و رکوردهای
+    پروسه‌های دیگر با کوئری id > آخرین شناسه دیده‌شده پیش از هر جستجو؛ رکوردهایی که بدون هش دیده شده‌اند
+    تا هش شدن دوباره خوانده می‌شوند. هر آیتم درخت هش خودش را دارد و با عوض شدن تصویر، آیتم قبلی کنار گذاشته
+    می‌شود؛ تطابق‌ها در find_reusable_diagnosis یک بار دیگر با هش فعلی ردیف در دیتابیس بررسی می‌شوند.
+    """
+    REBUILD_INTERVAL = timedelta(days=1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.tree = BKTree()
+        self.entries = {}
+        self.pending = {KIND_PLANT: set(), KIND_DIAGNOSIS: set()}
+        self.last_ids = {KIND_PLANT: 0, KIND_DIAGNOSIS: 0}
+        self.built_at = timezone.now()
+
+    def add(self, kind, obj_id, phash_hex, dhash_hex):
+        if not phash_hex:
+            return
+        with self._lock:
+            self._add(kind, obj_id, phash_hex, dhash_hex)
+
+    def _add(self, kind, obj_id, phash_hex, dhash_hex):
+        key = (kind, obj_id)
+        self.pending[kind].discard(obj_id)
+        if self.entries.get(key) == phash_hex:
+            return
+        # BKTree حذف ندارد؛ آیتم هش قبلی در درخت می‌ماند و در search با entries کنار گذاشته می‌شود
+        self.entries[key] = phash_hex
+        self.tree.add(hex_to_hash(phash_hex), (kind, obj_id, phash_hex, hex_to_hash(dhash_hex) if dhash_hex else None))
+
+    def refresh(self):
+        from plants.models import Plant, PlantDiagnosis
+
+        with self._lock:
+            # بازسازی روزانه تا رکوردهای خارج از بازه استفاده مجدد از حافظه حذف شوند
+            if timezone.now() - self.built_at > self.REBUILD_INTERVAL:
+                self._reset()
+
+            cutoff = timezone.now() - timedelta(days=settings.AI_DIAGNOSIS_REUSE_DAYS)
+            sources = (
+                (KIND_PLANT, Plant.objects.filter(uploaded_at__gte=cutoff)),
+                (KIND_DIAGNOSIS, PlantDiagnosis.objects.filter(created_at__gte=cutoff)),
+            )
+            for kind, queryset in sources:
+                if self.pending[kind]:
+                    # ردیف‌هایی که پس از درج هش شده‌اند (خطای موقت سیگنال یا backfill)
+                    rows = queryset.filter(id__in=self.pending[kind]).exclude(image_phash='')
+                    for obj_id, phash_hex, dhash_hex in rows.values_list('id', 'image_phash', 'image_dhash'):
+                        self._add(kind, obj_id, phash_hex, dhash_hex)
+
+                rows = (
+                    queryset.filter(id__gt=self.last_ids[kind])
+                    .order_by('id')
+                    .values_list('id', 'image_phash', 'image_dhash')
+                )
+                for obj_id, phash_hex, dhash_hex in rows.iterator(chunk_size=2000):
+                    if phash_hex:
+                        self._add(kind, obj_id, phash_hex, dhash_hex)
+                    else:
+                        self.pending[kind].add(obj_id)
+                    self.last_ids[kind] = obj_id
+
+    def search(self, phash_hex, dhash_hex=None, max_distance=None, max_dhash_distance=None):
+        """لیست (فاصله، نوع، شناسه) برای تصاویر نزدیک؛ اگر dHash داده شود به عنوان تایید دوم بررسی می‌شود"""
+        if max_distance is None:
+            max_distance = settings.AI_DIAGNOSIS_NEAR_DUPLICATE_MAX_DISTANCE
+        if max_dhash_distance is None:
+            max_dhash_distance = settings.AI_DIAGNOSIS_NEAR_DUPLICATE_DHASH_MAX_DISTANCE
+
+        self.refresh()
+        dhash = hex_to_hash(dhash_hex) if dhash_hex else None
+        with self._lock:
+            candidates = [
+                (distance, item) for distance, item in self.tree.search(hex_to_hash(phash_hex), max_distance)
+                if self.entries.get(item[:2]) == item[2]
+            ]
+
+        results = []
+        for distance, (kind, obj_id, _, candidate_dhash) in candidates:
+            if dhash is not None and candidate_dhash is not None:
+                if hamming_distance(dhash, candidate_dhash) > max_dhash_distance:
+                    continue
+            results.append((distance, kind, obj_id))
+        return results
+
+
+near_duplicate_index = NearDuplicateIndex()
+
+
+def hash_image_field(image_field):
+    """محاسبه هش‌ها از فایل ذخیره‌شده؛ در صورت خطا دیکشنری خالی برمی‌گرداند"""
+    try:
+        image_field.open('rb')
+        try:
+            return compute_hashes(image_field)
+        finally:
+            image_field.close()
+    except Exception as e:
+        logger.warning(f"⚠️ محاسبه هش ادراکی برای تصویر {image_field.name} ناموفق بود: {e}")
+        return {}
+
+
+def find_reusable_diagnosis(diagnosis_instance):
+    """
+    یافتن تشخیص کامل‌شده اخیرِ همین کاربر برای تصویری تقریباً یکسان (برش یا فشرده‌سازی مجدد).
+    تطابق با تصویر یک Plant، آخرین تشخیص کامل‌شده همان گیاه را برمی‌گرداند.
+    """
+    from plants.models import Plant, PlantDiagnosis
+
+    if not settings.AI_DIAGNOSIS_NEAR_DUPLICATE_ENABLED or not diagnosis_instance.image_phash:
+        return None
+
+    matches = near_duplicate_index.search(diagnosis_instance.image_phash, diagnosis_instance.image_dhash)
+    if not matches:
+        return None
+
+    cutoff = timezone.now() - timedelta(days=settings.AI_DIAGNOSIS_REUSE_DAYS)
+    reusable = PlantDiagnosis.objects.filter(
+        plant__user_id=diagnosis_instance.plant.user_id,
+        status=PlantDiagnosis.STATUS_COMPLETED,
+        created_at__gte=cutoff,
+    ).exclude(pk=diagnosis_instance.pk)
+
+    diagnosis_ids = [obj_id for _, kind, obj_id in matches if kind == KIND_DIAGNOSIS]
+    plant_ids = [obj_id for _, kind, obj_id in matches if kind == KIND_PLANT]
+
+    # ایندکس ممکن است هش تصویری را داشته باشد که در پروسه دیگری عوض شده؛ تطابق با هش فعلی ردیف تایید می‌شود
+    phash = hex_to_hash(diagnosis_instance.image_phash)
+    max_distance = settings.AI_DIAGNOSIS_NEAR_DUPLICATE_MAX_DISTANCE
+
+    def still_matches(phash_hex):
+        return bool(phash_hex) and hamming_distance(phash, hex_to_hash(phash_hex)) <= max_distance
+
+    by_id = reusable.filter(pk__in=diagnosis_ids).in_bulk() if diagnosis_ids else {}
+    for _, kind, obj_id in matches:
+        if kind == KIND_DIAGNOSIS and obj_id in by_id and still_matches(by_id[obj_id].image_phash):
+            return by_id[obj_id]
+
+    if plant_ids:
+        current = Plant.objects.filter(pk__in=plant_ids).values_list('pk', 'image_phash')
+        plant_ids = [plant_id for plant_id, phash_hex in current if still_matches(phash_hex)]
+    if plant_ids:
+        return reusable.filter(plant_id__in=plant_ids).order_by('-created_at').first()
+    return None
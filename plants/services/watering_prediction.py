@@ -0,0 +1,236 @@
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .care_dashboard import mark_stale
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+# اندازه دسته شناسه کاربران در UPDATE علامت‌گذاری داشبوردها
+STALE_CHUNK_SIZE = 1000
+
+
+def normalize_species(species):
+    return ' '.join((species or '').lower().split())
+
+
+def posterior_interval(interval_sum, interval_weight, prior):
+    """
+    میانگین پسین فاصله آبیاری: prior (میانگین گونه یا فاصله واردشده کاربر) با وزن
+    WATERING_PREDICTION_PRIOR_WEIGHT مشاهده فرضی، ترکیب‌شده با میانگین وزنی نمایی فاصله‌های ثبت‌شده.
+    با آرایه‌های NumPy هم کار می‌کند.
+    """
+    k = settings.WATERING_PREDICTION_PRIOR_WEIGHT
+    return (k * prior + interval_sum) / (k + interval_weight)
+
+
+def species_prior(species):
+    from plants.models import SpeciesWateringPrior
+
+    normalized = normalize_species(species)
+    if not normalized:
+        return None
+    return (
+        SpeciesWateringPrior.objects
+        .filter(species=normalized, plant_count__gte=settings.WATERING_PREDICTION_SPECIES_MIN_PLANTS)
+        .values_list('mean_interval', flat=True).first()
+    )
+
+
+def record_watering(plant, watered_at=None):
+    """
+    به‌روزرسانی افزایشی پیش‌بینی با یک آبیاری جدید کاربر (قبل از ثبت WateringLog آن فراخوانی می‌شود).
+    فاصله از آخرین آبیاری دستی محاسبه می‌شود؛ یادآوری‌های خودکار در آن اثری ندارند.
+    """
+    from plants.models import WateringLog
+
+    if not settings.WATERING_PREDICTION_ENABLED:
+        return
+    previous = (
+        WateringLog.objects.filter(plant=plant, source=WateringLog.SOURCE_MANUAL)
+        .order_by('-watered_at').values_list('watered_at', flat=True).first()
+    )
+    if previous is None:
+        return
+    interval = ((watered_at or timezone.now()) - previous).total_seconds() / SECONDS_PER_DAY
+    if not settings.WATERING_PREDICTION_MIN_INTERVAL <= interval <= settings.WATERING_PREDICTION_MAX_INTERVAL:
+        return
+
+    decay = settings.WATERING_PREDICTION_DECAY
+    plant.interval_sum = decay * plant.interval_sum + interval
+    plant.interval_weight = decay * plant.interval_weight + 1
+    prior = species_prior(plant.species) or plant.watering_frequency
+    plant.predicted_interval = round(posterior_interval(plant.interval_sum, plant.interval_weight, prior), 2)
+
+
+def interval_statistics(plant_ids, timestamps):
+    """
+    آماره‌های کافی میانگین وزنی نمایی برای همه گیاهان به صورت برداری.
+    plant_ids و timestamps (ثانیه) باید بر اساس (plant_id, زمان) مرتب باشند.
+    خروجی: (شناسه‌های یکتا، مجموع وزنی فاصله‌ها، مجموع وزن‌ها)؛ جدیدترین فاصله وزن ۱ و هر فاصله قدیمی‌تر
+    ضریب decay می‌گیرد، همان نتیجه‌ای که record_watering به صورت افزایشی می‌سازد.
+    """
+    if plant_ids.size < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+    intervals = np.diff(timestamps) / SECONDS_PER_DAY
+    valid = (
+        (plant_ids[1:] == plant_ids[:-1])
+        & (intervals >= settings.WATERING_PREDICTION_MIN_INTERVAL)
+        & (intervals <= settings.WATERING_PREDICTION_MAX_INTERVAL)
+    )
+    owners, intervals = plant_ids[1:][valid], intervals[valid]
+    if not owners.size:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+    ids, starts, counts = np.unique(owners, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(ids.size), counts)
+    age = np.repeat(starts + counts - 1, counts) - np.arange(owners.size)
+    weights = settings.WATERING_PREDICTION_DECAY ** age
+    interval_sum = np.bincount(group, weights=weights * intervals, minlength=ids.size)
+    interval_weight = np.bincount(group, weights=weights, minlength=ids.size)
+    return ids, interval_sum, interval_weight
+
+
+def pooled_species_means(species_codes, species_count, interval_sum, interval_weight):
+    """میانگین فاصله هر گونه از همه کاربران (وزن‌دار با تعداد مشاهده هر گیاه) و تعداد گیاهان دارای سابقه"""
+    has_history = (interval_weight > 0) & (species_codes >= 0)
+    codes = species_codes[has_history]
+    plant_counts = np.bincount(codes, minlength=species_count)
+    sums = np.bincount(codes, weights=interval_sum[has_history], minlength=species_count)
+    weights = np.bincount(codes, weights=interval_weight[has_history], minlength=species_count)
+    means = np.divide(sums, weights, out=np.full(species_count, np.nan), where=weights > 0)
+    return means, plant_counts
+
+
+def write_predictions(rows, batch_size=5000):
+    """
+    نوشتن نتایج با executemany روی یک UPDATE ساده به ازای هر گیاه؛ bulk_update جنگو برای هر دسته یک CASE بزرگ
+    می‌سازد که در این حجم چند برابر کندتر است. next_watering خالی (گیاه بدون last_watered) تغییر نمی‌کند.
+    """
+    from plants.models import Plant
+
+    qn = connection.ops.quote_name
+    sql = (
+        f"UPDATE {qn(Plant._meta.db_table)} SET {qn('predicted_interval')} = %s, {qn('interval_sum')} = %s, "
+        f"{qn('interval_weight')} = %s, {qn('next_watering')} = COALESCE(%s, {qn('next_watering')}) "
+        f"WHERE {qn('id')} = %s"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def manual_logs(first_id, last_id):
+    from plants.models import WateringLog
+
+    return (
+        WateringLog.objects.filter(source=WateringLog.SOURCE_MANUAL, plant_id__gte=first_id, plant_id__lte=last_id)
+        .order_by('plant_id', 'watered_at').values_list('plant_id', 'watered_at')
+    )
+
+
+def load_manual_logs(first_id, last_id):
+    rows = list(manual_logs(first_id, last_id))
+    plant_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    timestamps = np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    return plant_ids, timestamps
+
+
+def recompute_predictions():
+    """
+    بازمحاسبه شبانه همه پیش‌بینی‌ها: لاگ‌های دستی در دسته‌هایی از گیاهان خوانده و آماره‌ها با NumPy محاسبه می‌شوند،
+    سپس prior هر گونه از همه کاربران تجمیع و میانگین پسین و next_watering هر گیاه به صورت برداری به‌دست می‌آید.
+    """
+    from plants.models import Plant, SpeciesWateringPrior
+
+    started = time.perf_counter()
+    rows = list(
+        Plant.objects.filter(is_active=True).order_by('id')
+        .values_list('id', 'species', 'watering_frequency', 'last_watered', 'user_id', 'predicted_interval', 'next_watering')
+    )
+    plants = rows
+    if not rows:
+        return {'plants': 0, 'updated': 0, 'dashboards': 0, 'species': 0, 'logs': 0, 'seconds': 0.0}
+
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    frequencies = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=len(rows))
+    last_watered = np.array([row[3] or np.datetime64('NaT') for row in rows], dtype='datetime64[D]')
+    species_names, species_codes = np.unique([normalize_species(row[1]) for row in rows], return_inverse=True)
+    species_codes = species_codes.astype(np.int64)
+    blank = np.flatnonzero(species_names == '')
+    if blank.size:
+        species_codes[species_codes == blank[0]] = -1
+
+    interval_sum = np.zeros(ids.size)
+    interval_weight = np.zeros(ids.size)
+    batch_size = settings.WATERING_PREDICTION_BATCH_SIZE
+    log_count = 0
+    for start in range(0, ids.size, batch_size):
+        batch_ids = ids[start:start + batch_size]
+        plant_ids, timestamps = load_manual_logs(batch_ids[0], batch_ids[-1])
+        log_count += plant_ids.size
+        stat_ids, sums, weights = interval_statistics(plant_ids, timestamps)
+        # لاگ گیاهان غیرفعال داخل همین بازه شناسه کنار گذاشته می‌شوند
+        positions = np.minimum(np.searchsorted(ids, stat_ids), ids.size - 1)
+        known = ids[positions] == stat_ids
+        interval_sum[positions[known]] = sums[known]
+        interval_weight[positions[known]] = weights[known]
+
+    means, plant_counts = pooled_species_means(species_codes, species_names.size, interval_sum, interval_weight)
+    trusted = plant_counts >= settings.WATERING_PREDICTION_SPECIES_MIN_PLANTS
+    prior = frequencies.copy()
+    has_species_prior = (species_codes >= 0) & trusted[np.maximum(species_codes, 0)]
+    prior[has_species_prior] = means[species_codes[has_species_prior]]
+
+    has_history = interval_weight > 0
+    predicted = posterior_interval(interval_sum, interval_weight, prior)
+    next_watering = last_watered + np.maximum(1, np.rint(predicted)).astype('timedelta64[D]')
+
+    SpeciesWateringPrior.objects.bulk_create(
+        [SpeciesWateringPrior(species=str(species_names[code]), mean_interval=round(float(means[code]), 2),
+                              plant_count=int(plant_counts[code]))
+         for code in np.flatnonzero(plant_counts)],
+        update_conflicts=True, unique_fields=['species'], update_fields=['mean_interval', 'plant_count', 'updated_at'],
+    )
+
+    indexes = np.flatnonzero(has_history)
+    if not settings.WATERING_PREDICTION_ENABLED:
+        next_watering[:] = np.datetime64('NaT')
+    rows = [
+        (
+            round(float(predicted[index]), 2),
+            float(interval_sum[index]),
+            float(interval_weight[index]),
+            None if np.isnat(next_watering[index]) else next_watering[index].item(),
+            int(ids[index]),
+        )
+        for index in indexes
+    ]
+    write_predictions(rows)
+    # فقط داشبورد کاربرانی که فاصله پیش‌بینی‌شده یا تاریخ آبیاری یکی از گیاهانشان عوض شده دوباره ساخته می‌شود
+    changed_users = sorted({
+        plants[index][4] for index, row in zip(indexes, rows)
+        if (row[0], row[3]) != (plants[index][5], plants[index][6])
+    })
+    for start in range(0, len(changed_users), STALE_CHUNK_SIZE):
+        mark_stale(user_ids=changed_users[start:start + STALE_CHUNK_SIZE])
+
+    summary = {
+        'plants': int(ids.size),
+        'updated': len(rows),
+        'dashboards': len(changed_users),
+        'species': int(trusted.sum()),
+        'logs': log_count,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    logger.info(
+        f"💧 پیش‌بینی آبیاری: {summary['updated']}/{summary['plants']} گیاه، {summary['species']} گونه، "
+        f"{summary['logs']} لاگ در {summary['seconds']} ثانیه"
+    )
+    return summary
@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Plant, PlantDiagnosis, WateringLog
+from .services import care_dashboard
+from subscription.services import entitlement
+from .services.near_duplicate_index import (
+    KIND_DIAGNOSIS, KIND_PLANT, hash_image_field, near_duplicate_index,
+)
+
+
+def _index_image(sender, instance, kind):
+    if not instance.image or instance.image_phash:
+        return
+
+    hashes = hash_image_field(instance.image)
+    if not hashes:
+        return
+
+    sender.objects.filter(pk=instance.pk).update(image_phash=hashes['phash'], image_dhash=hashes['dhash'])
+    instance.image_phash = hashes['phash']
+    instance.image_dhash = hashes['dhash']
+    transaction.on_commit(
+        lambda: near_duplicate_index.add(kind, instance.pk, hashes['phash'], hashes['dhash'])
+    )
+
+
+@receiver(post_save, sender=Plant)
+def index_plant_image(sender, instance, **kwargs):
+    _index_image(sender, instance, KIND_PLANT)
+
+
+@receiver(post_save, sender=PlantDiagnosis)
+def index_diagnosis_image(sender, instance, **kwargs):
+    _index_image(sender, instance, KIND_DIAGNOSIS)
+
+
+# ======================================================
+# نگهداری افزایشی داشبورد مراقبت کاربر (CareDashboard)
+@receiver(post_save, sender=Plant)
+def update_dashboard_plant(sender, instance, created=False, update_fields=None, **kwargs):
+    care_dashboard.plant_saved(instance, update_fields, created=created)
+
+
+@receiver(post_delete, sender=Plant)
+def remove_dashboard_plant(sender, instance, **kwargs):
+    care_dashboard.plant_deleted(instance)
+
+
+@receiver(post_save, sender=WateringLog)
+def update_dashboard_streak(sender, instance, created, **kwargs):
+    if created and instance.source == WateringLog.SOURCE_MANUAL:
+        care_dashboard.manual_watering_recorded(instance)
+
+
+@receiver(post_save, sender=PlantDiagnosis)
+def update_dashboard_diagnosis(sender, instance, **kwargs):
+    care_dashboard.diagnosis_saved(instance)
+
+
+@receiver(post_delete, sender=PlantDiagnosis)
+def remove_dashboard_diagnosis(sender, instance, **kwargs):
+    care_dashboard.diagnosis_deleted(instance)
+
+
+# ======================================================
+# حذف تشخیص سهمیه رایگان کاربر را برمی‌گرداند (شمارنده کش entitlement)
+@receiver(post_delete, sender=PlantDiagnosis)
+def refund_diagnosis_quota(sender, instance, **kwargs):
+    user_id = Plant.objects.filter(pk=instance.plant_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        entitlement.refund(user_id, entitlement.KIND_DIAGNOSIS)
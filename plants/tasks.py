@@ -0,0 +1,61 @@
+from celery import shared_task
+import logging
+from .models import PlantDiagnosis
+from .services.ai_diagnosis_service import run_diagnosis, mark_diagnosis_failed
+from .services.watering_prediction import recompute_predictions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, default_retry_delay=30, max_retries=3)
+def run_ai_diagnosis(self, diagnosis_id):
+    """اجرای تشخیص هوش مصنوعی خارج از چرخه درخواست و اطلاع‌رسانی نتیجه به کاربر"""
+    try:
+        diagnosis = PlantDiagnosis.objects.select_related('plant__user').get(id=diagnosis_id)
+    except PlantDiagnosis.DoesNotExist:
+        logger.error(f"❌ تشخیص با شناسه {diagnosis_id} یافت نشد. نادیده گرفته شد.")
+        return
+
+    if diagnosis.status == PlantDiagnosis.STATUS_COMPLETED:
+        return
+
+    diagnosis.status = PlantDiagnosis.STATUS_PROCESSING
+    diagnosis.save(update_fields=['status'])
+
+    try:
+        run_diagnosis(diagnosis)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        logger.error(f"حداکثر دفعات تلاش مجدد برای تشخیص {diagnosis_id} از حد مجاز گذشت.")
+        mark_diagnosis_failed(diagnosis, e)
+
+    notify_diagnosis_ready(diagnosis)
+
+
+def notify_diagnosis_ready(diagnosis):
+    from notifications.models import FCMDevice
+    from notifications.firebase_service import deactivate_invalid_tokens, send_multicast
+
+    user = diagnosis.plant.user
+    if diagnosis.status == PlantDiagnosis.STATUS_COMPLETED:
+        title = f"نتیجه تشخیص {diagnosis.plant.name} آماده است"
+        body = diagnosis.diagnosis
+    else:
+        title = f"تشخیص {diagnosis.plant.name} انجام نشد"
+        body = "لطفاً تصویر واضح‌تری آپلود کنید و دوباره امتحان کنید."
+    data = {
+        "diagnosis_id": str(diagnosis.id),
+        "plant_id": str(diagnosis.plant_id),
+        "notification_type": "diagnosis_ready",
+        "status": diagnosis.status,
+    }
+
+    tokens = list(FCMDevice.objects.filter(user=user, is_active=True).values_list('registration_id', flat=True))
+    deactivate_invalid_tokens(tokens, send_multicast(tokens, title, body, data))
+
+
+@shared_task
+def recompute_watering_predictions():
+    """بازمحاسبه شبانه فاصله آبیاری همه گیاهان از روی WateringLog (برداری با NumPy)"""
+    return recompute_predictions()
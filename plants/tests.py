@@ -1,3 +1,429 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from subscription.services import entitlement
+from .models import CareDashboard, Plant, PlantDiagnosis, SpeciesWateringPrior, WateringLog
+from .services.care_dashboard import build_entries
+from .services.ai_diagnosis_service import PlantDiagnosisService
+from .services.diagnosis_cache import DiagnosisResultCache
+from .services.image_preprocessing import ImagePreprocessor
+from .serializers import PlantSerializer
+from .services.image_hashing import BKTree, compute_hashes, hamming_distance, hex_to_hash
+from .services.near_duplicate_index import find_reusable_diagnosis, near_duplicate_index
+from .services.watering_prediction import recompute_predictions
+from .tasks import run_ai_diagnosis
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name='leaf.png', color=(30, 140, 60)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueuedDiagnosisTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='gardener', password='pass', phone_number='09120000001')
+        self.plant = Plant.objects.create(user=self.user, name='Ficus', image=make_image('plant.png'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk_diagnose(self, plants):
+        with mock.patch('plants.views.group') as group:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    '/plants/diagnose/bulk/',
+                    {f'images_{plant.id}': [make_image(), make_image()] for plant in plants},
+                    format='multipart',
+                )
+        return response, group
+
+    def test_async_mode_queues_diagnosis_and_returns_202(self):
+        with mock.patch('plants.views.run_ai_diagnosis.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    f'/plants/{self.plant.id}/diagnose/?mode=async',
+                    {'plant': self.plant.id, 'image': make_image(), 'images': [make_image()]},
+                    format='multipart',
+                )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], PlantDiagnosis.STATUS_PENDING)
+        delay.assert_called_once_with(response.data['id'])
+
+        status_response = self.client.get(f"/plants/diagnoses/{response.data['id']}/status/")
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.data['status'], PlantDiagnosis.STATUS_PENDING)
+
+    def test_bulk_diagnosis_queues_one_task_per_plant_and_returns_202(self):
+        other = Plant.objects.create(user=self.user, name='Monstera', image=make_image('other.png'))
+
+        response, group = self.bulk_diagnose([self.plant, other])
+
+        self.assertEqual(response.status_code, 202)
+        diagnoses = response.data['diagnoses']
+        self.assertEqual(sorted(d['plant'] for d in diagnoses), sorted([self.plant.id, other.id]))
+        self.assertEqual({d['status'] for d in diagnoses}, {PlantDiagnosis.STATUS_PENDING})
+        self.assertEqual([len(d['images']) for d in diagnoses], [2, 2])
+        tasks = list(group.call_args.args[0])
+        self.assertEqual(sorted(task.args[0] for task in tasks), sorted(d['id'] for d in diagnoses))
+        group.return_value.apply_async.assert_called_once_with()
+
+    def test_bulk_diagnosis_rejects_plants_of_other_users(self):
+        stranger = User.objects.create_user(username='stranger', password='pass', phone_number='09120000003')
+        foreign = Plant.objects.create(user=stranger, name='Aloe', image=make_image('aloe.png'))
+
+        response, group = self.bulk_diagnose([self.plant, foreign])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(PlantDiagnosis.objects.exists())
+        group.assert_not_called()
+        self.assertEqual(entitlement.remaining(self.user, entitlement.KIND_DIAGNOSIS), settings.ENTITLEMENT_FREE_DIAGNOSES)
+
+    @override_settings(ENTITLEMENT_FREE_DIAGNOSES=3)
+    def test_bulk_diagnosis_charges_one_free_diagnosis_per_plant(self):
+        plants = [self.plant] + [
+            Plant.objects.create(user=self.user, name=f'Plant {i}', image=make_image(f'p{i}.png')) for i in range(3)
+        ]
+
+        response, _ = self.bulk_diagnose(plants)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PlantDiagnosis.objects.exists())
+
+        response, _ = self.bulk_diagnose(plants[:2])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(entitlement.remaining(self.user, entitlement.KIND_DIAGNOSIS), 1)
+
+    def test_task_completes_pending_diagnosis(self):
+        diagnosis = PlantDiagnosis.objects.create(
+            plant=self.plant, image=make_image(), status=PlantDiagnosis.STATUS_PENDING
+        )
+        ai_output = {'suggestions': [{'probability': 0.9, 'plant_name': 'Ficus elastica', 'plant_details': {}}]}
+
+        with mock.patch('plants.services.ai_diagnosis_service.PlantDiagnosisService.diagnose', return_value=ai_output):
+            run_ai_diagnosis.apply(args=[diagnosis.id])
+
+        diagnosis.refresh_from_db()
+        self.assertEqual(diagnosis.status, PlantDiagnosis.STATUS_COMPLETED)
+        self.assertEqual(diagnosis.confidence, 0.9)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DiagnosisResultCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cacher', password='pass', phone_number='09120000002')
+        self.plant = Plant.objects.create(user=self.user, name='Cactus', image=make_image('plant.png'))
+
+    def test_same_image_bytes_hit_cache(self):
+        first = PlantDiagnosis.objects.create(plant=self.plant, image=make_image('10.png'))
+        second = PlantDiagnosis.objects.create(plant=self.plant, image=make_image('10.png'))
+        ai_output = {'suggestions': [{'probability': 0.8, 'plant_name': 'Cactus'}]}
+
+        with mock.patch.object(PlantDiagnosisService, 'call_api', return_value=ai_output) as call_api:
+            PlantDiagnosisService(first.image, api_key='key').diagnose()
+            result = PlantDiagnosisService(second.image, api_key='key').diagnose()
+
+        self.assertEqual(call_api.call_count, 1)
+        self.assertEqual(result, ai_output)
+        self.assertEqual(DiagnosisResultCache().stats()['hits'], 1)
+
+
+class PerceptualHashTest(TestCase):
+    SAMPLES_DIR = settings.BASE_DIR / 'media' / 'plants'
+
+    def phash_distance(self, a, b):
+        return hamming_distance(hex_to_hash(compute_hashes(a)['phash']), hex_to_hash(compute_hashes(b)['phash']))
+
+    def test_recompressed_image_is_near_duplicate(self):
+        original = Image.open(self.SAMPLES_DIR / '10.jpg').convert('RGB')
+        buffer = io.BytesIO()
+        original.resize((original.width // 2, original.height // 2)).save(buffer, format='JPEG', quality=40)
+        buffer.seek(0)
+
+        self.assertLessEqual(self.phash_distance(original, buffer), settings.AI_DIAGNOSIS_NEAR_DUPLICATE_MAX_DISTANCE)
+        self.assertGreater(
+            self.phash_distance(original, self.SAMPLES_DIR / 'file2.png'),
+            settings.AI_DIAGNOSIS_NEAR_DUPLICATE_MAX_DISTANCE,
+        )
+
+    def sample(self, name):
+        return SimpleUploadedFile(name, (self.SAMPLES_DIR / name).read_bytes())
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, AI_DIAGNOSIS_NEAR_DUPLICATE_ENABLED=True)
+    def test_replaced_plant_photo_is_not_reused(self):
+        near_duplicate_index._reset()
+        user = User.objects.create_user(username='rephoto', password='pass', phone_number='09120000031')
+        with self.captureOnCommitCallbacks(execute=True):
+            plant = Plant.objects.create(user=user, name='Ficus', image=self.sample('10.jpg'))
+            PlantDiagnosis.objects.create(plant=plant, image=self.sample('file.png'), status=PlantDiagnosis.STATUS_COMPLETED)
+            upload = PlantDiagnosis.objects.create(plant=plant, image=self.sample('10_izJ0yso.jpg'))
+        self.assertIsNotNone(find_reusable_diagnosis(upload))
+
+        request = mock.Mock(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer = PlantSerializer(plant, data={'image': self.sample('file2.png')}, partial=True,
+                                         context={'request': request})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        self.assertIsNone(find_reusable_diagnosis(upload))
+
+        # تصویری که در پروسه دیگری عوض شده و ایندکس این پروسه از آن خبر ندارد
+        with self.captureOnCommitCallbacks(execute=True):
+            plant.image = self.sample('10.jpg')
+            plant.image_phash = ''
+            plant.save()
+        self.assertIsNotNone(find_reusable_diagnosis(upload))
+        Plant.objects.filter(pk=plant.pk).update(image_phash=compute_hashes(self.SAMPLES_DIR / 'file2.png')['phash'])
+        self.assertIsNone(find_reusable_diagnosis(upload))
+
+    def test_bk_tree_returns_items_within_distance(self):
+        tree = BKTree()
+        tree.add(0b0000, 'a')
+        tree.add(0b0001, 'b')
+        tree.add(0b0111, 'c')
+        tree.add(0b1111, 'd')
+
+        self.assertEqual([item for _, item in tree.search(0b0000, 1)], ['a', 'b'])
+        self.assertEqual(len(tree.search(0b0000, 4)), 4)
+
+
+class ImagePipelineTest(TestCase):
+    def test_preprocessor_downsamples_and_strips_exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        path = os.path.join(TEMP_MEDIA_ROOT, 'large.jpg')
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        Image.new('RGB', (3000, 2000), (20, 120, 40)).save(path, format='JPEG', exif=exif)
+
+        data, stats = ImagePreprocessor(max_side=512, quality=80).process(path)
+
+        processed = Image.open(io.BytesIO(data))
+        self.assertEqual(max(processed.size), 512)
+        self.assertEqual(len(processed.getexif()), 0)
+        self.assertEqual(stats['processed_bytes'], len(data))
+
+    def test_preprocessor_keeps_original_quality_without_exif_when_recompression_is_larger(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        exif[0x0112] = 6
+        path = os.path.join(TEMP_MEDIA_ROOT, 'small.jpg')
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        Image.frombytes('RGB', (200, 150), os.urandom(200 * 150 * 3)).save(path, format='JPEG', quality=30, exif=exif)
+
+        data, stats = ImagePreprocessor(max_side=512, quality=95).process(path)
+
+        processed = Image.open(io.BytesIO(data))
+        self.assertEqual(processed.size, (200, 150))
+        self.assertEqual(dict(processed.getexif()), {0x0112: 6})
+        self.assertEqual((stats['width'], stats['height']), (200, 150))
+        self.assertLessEqual(stats['processed_bytes'], stats['original_bytes'])
+
+    def test_streamed_body_is_valid_json(self):
+        service = PlantDiagnosisService(image_field=None, api_key='secret', result_cache=False)
+        service.BODY_CHUNK_SIZE = 3 * 4
+        images = [os.urandom(100), os.urandom(7)]
+
+        body = json.loads(b''.join(service.iter_request_body(images)))
+
+        self.assertEqual(body['api_key'], 'secret')
+        self.assertEqual(body['modifiers'], PlantDiagnosisService.MODIFIERS)
+        self.assertEqual([base64.b64decode(image) for image in body['images']], images)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MultiImageDiagnosisTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='multi', password='pass', phone_number='09120000003')
+        self.plant = Plant.objects.create(user=self.user, name='Monstera', image=make_image('plant.png'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_all_images_are_sent_in_one_call_and_stored(self):
+        ai_output = {
+            'images': [{'file_name': 'a.jpg', 'url': 'https://x/a.jpg'}, {'file_name': 'b.jpg', 'url': 'https://x/b.jpg'}],
+            'suggestions': [{'probability': 0.7, 'plant_name': 'Monstera deliciosa'}],
+        }
+        images = [make_image('a.png', (10, 200, 10)), make_image('b.png', (200, 10, 10))]
+
+        with mock.patch.object(PlantDiagnosisService, 'call_api', return_value=ai_output) as call_api:
+            response = self.client.post(
+                f'/plants/{self.plant.id}/diagnose/',
+                {'plant': self.plant.id, 'image': make_image(), 'images': images},
+                format='multipart',
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(call_api.call_count, 1)
+        body = json.loads(b''.join(call_api.call_args.args[0]))
+        self.assertEqual(len(body['images']), 2)
+
+        diagnosis = PlantDiagnosis.objects.get(pk=response.data['id'])
+        stored = list(diagnosis.images.values_list('position', 'result'))
+        self.assertEqual([position for position, _ in stored], [0, 1])
+        self.assertEqual(stored[1][1]['file_name'], 'b.jpg')
+
+    async def test_async_view_diagnoses_with_async_client(self):
+        ai_output = {'suggestions': [{'probability': 0.9, 'plant_name': 'Monstera deliciosa'}]}
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.user)))()
+
+        with mock.patch.object(PlantDiagnosisService, 'acall_api', new=mock.AsyncMock(return_value=ai_output)) as acall_api:
+            response = await self.async_client.post(
+                f'/plants/{self.plant.id}/diagnose-async/',
+                {'images': [make_image('a.png', (10, 200, 10))]},
+                headers={'Authorization': f'Bearer {token}'},
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(acall_api.await_count, 1)
+        self.assertEqual(response.json()['status'], PlantDiagnosis.STATUS_COMPLETED)
+        self.assertIn('Monstera deliciosa', response.json()['diagnosis'])
+
+
+class WateringPredictionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='waterer', password='pass', phone_number='09120000051')
+
+    def make_plant(self, species, days_ago):
+        plant = Plant.objects.create(user=self.user, name=species, species=species, image='plants/a.png',
+                                     watering_frequency=7)
+        now = timezone.now()
+        for days in days_ago:
+            log = WateringLog.objects.create(plant=plant)
+            WateringLog.objects.filter(id=log.id).update(watered_at=now - timezone.timedelta(days=days))
+        WateringLog.objects.create(plant=plant, source=WateringLog.SOURCE_REMINDER)  # در پیش‌بینی شمرده نمی‌شود
+        Plant.objects.filter(id=plant.id).update(last_watered=(now - timezone.timedelta(days=days_ago[-1])).date())
+        return plant
+
+    def test_nightly_batch_learns_intervals_and_matches_incremental_update(self):
+        plants = [self.make_plant('Monstera', [12, 8, 4]) for _ in range(3)]
+        newcomer = self.make_plant(' monstera ', [2])
+
+        summary = recompute_predictions()
+
+        self.assertEqual(summary['updated'], 3)
+        self.assertAlmostEqual(SpeciesWateringPrior.objects.get(species='monstera').mean_interval, 4.0)
+        plants[0].refresh_from_db()
+        # فاصله واقعی ۴ روزه جایگزین ۷ روز واردشده توسط کاربر می‌شود
+        self.assertAlmostEqual(plants[0].predicted_interval, 4.0)
+        self.assertEqual(plants[0].next_watering, plants[0].last_watered + timezone.timedelta(days=4))
+
+        # آبیاری دستی امروز: فاصله ۲ روزه با prior گونه (۴ روز) ترکیب می‌شود
+        newcomer.refresh_from_db()
+        newcomer.mark_watered_today()
+        self.assertAlmostEqual(newcomer.predicted_interval, (2 * 4.0 + 2) / 3, places=2)
+        incremental = (newcomer.interval_sum, newcomer.interval_weight)
+
+        # بازمحاسبه شبانه همان آماره‌ها را می‌سازد؛ فقط prior گونه با سابقه گیاه جدید به‌روز می‌شود
+        recompute_predictions()
+        newcomer.refresh_from_db()
+        self.assertAlmostEqual(newcomer.interval_sum, incremental[0], places=2)
+        self.assertAlmostEqual(newcomer.interval_weight, incremental[1])
+        prior = SpeciesWateringPrior.objects.get(species='monstera').mean_interval
+        self.assertAlmostEqual(newcomer.predicted_interval, (2 * prior + incremental[0]) / 3, places=2)
+        self.assertEqual(newcomer.next_watering, newcomer.last_watered + timezone.timedelta(days=3))
+
+    def test_nightly_batch_marks_only_changed_dashboards_stale(self):
+        self.make_plant('Monstera', [12, 8, 4])
+        other = User.objects.create_user(username='unchanged', password='pass', phone_number='09120000052')
+        CareDashboard.objects.bulk_create([CareDashboard(user=self.user), CareDashboard(user=other)])
+
+        self.assertEqual(recompute_predictions()['dashboards'], 1)
+        self.assertEqual(list(CareDashboard.objects.filter(is_stale=True).values_list('user_id', flat=True)), [self.user.id])
+
+        CareDashboard.objects.update(is_stale=False)
+        self.assertEqual(recompute_predictions()['dashboards'], 0)
+        self.assertFalse(CareDashboard.objects.filter(is_stale=True).exists())
+
+
+class CareDashboardTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dashboard', password='pass', phone_number='09120000061')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_plants(self, count, next_watering):
+        return [
+            Plant.objects.create(user=self.user, name=f'Plant {i}', image='plants/a.png', next_watering=next_watering)
+            for i in range(count)
+        ]
+
+    def test_constant_queries_regardless_of_plant_count(self):
+        self.make_plants(2, timezone.now().date())
+        self.client.get('/plants/dashboard/')  # ساخت اولیه
+        with self.assertNumQueries(1):
+            self.client.get('/plants/dashboard/')
+
+        self.make_plants(20, timezone.now().date() - timezone.timedelta(days=2))
+        with self.assertNumQueries(1):
+            response = self.client.get('/plants/dashboard/')
+        self.assertEqual(response.data['summary'], {'plants': 22, 'due_today': 2, 'overdue': 20, 'best_streak': 0})
+
+    def test_signals_keep_dashboard_in_sync_with_full_rebuild(self):
+        plant, other = self.make_plants(2, timezone.now().date())
+        self.client.get('/plants/dashboard/')
+
+        log = WateringLog.objects.create(plant=plant)
+        WateringLog.objects.filter(id=log.id).update(watered_at=timezone.now() - timezone.timedelta(days=5))
+        CareDashboard.objects.update(is_stale=True)
+        self.client.get('/plants/dashboard/')
+
+        plant.refresh_from_db()
+        plant.mark_watered_today()
+        diagnosis = PlantDiagnosis.objects.create(plant=other, image='diagnoses/a.png', diagnosis='ok',
+                                                  care_instructions='-', category='pest')
+        other.name = 'Renamed'
+        other.save()
+
+        stored = CareDashboard.objects.get(user=self.user).plants
+        self.assertEqual(stored[str(plant.id)]['streak'], 2)
+        self.assertEqual(stored[str(other.id)]['last_diagnosis']['id'], diagnosis.id)
+        self.assertEqual(stored, build_entries(self.user.id))
+
+        diagnosis.delete()
+        other.delete()
+        self.assertEqual(CareDashboard.objects.get(user=self.user).plants, build_entries(self.user.id))
+
+    def test_reactivated_plant_keeps_its_history(self):
+        plant, = self.make_plants(1, timezone.now().date())
+        plant.mark_watered_today()
+        PlantDiagnosis.objects.create(plant=plant, image='diagnoses/a.png', diagnosis='ok', care_instructions='-')
+        self.client.get('/plants/dashboard/')
+
+        plant.refresh_from_db()
+        plant.is_active = False
+        plant.save()
+        plant.is_active = True
+        plant.save()
+
+        entry = self.client.get('/plants/dashboard/').data['plants'][0]
+        self.assertEqual(entry['streak'], 1)
+        self.assertIsNotNone(entry['last_diagnosis'])
+        self.assertEqual(CareDashboard.objects.get(user=self.user).plants, build_entries(self.user.id))
@@ -3,9 +3,14 @@ from django.urls import path
 from .views import (
     PlantListCreateView,
     PlantRetrieveUpdateDestroyView,
+    CareDashboardView,
     PlantDiagnosisCreateWithAIView,
+    AsyncPlantDiagnosisCreateView,
+    PlantDiagnosisBulkCreateView,
     PlantDiagnosisListView,
     PlantDiagnosisRetrieveUpdateDestroyView,
+    PlantDiagnosisStatusView,
+    DiagnosisCacheStatsView,
     WateringLogCreateView,
     WateringLogListView,
     WateringScheduleListCreateView,
@@ -15,14 +20,23 @@ from .views import (
 urlpatterns = [
     path('plants/', PlantListCreateView.as_view(), name='plant-list-create'),
 
+    path('dashboard/', CareDashboardView.as_view(), name='care-dashboard'),
+
     path('<int:pk>/', PlantRetrieveUpdateDestroyView.as_view(), name='plant-retrieve-update-destroy'),
 
     path('<int:pk>/diagnose/', PlantDiagnosisCreateWithAIView.as_view(), name='plant-diagnose-create'),
+    path('<int:pk>/diagnose-async/', AsyncPlantDiagnosisCreateView.as_view(), name='plant-diagnose-create-async'),
+
+    path('diagnose/bulk/', PlantDiagnosisBulkCreateView.as_view(), name='plant-diagnose-bulk'),
 
     path('diagnoses/', PlantDiagnosisListView.as_view(), name='diagnosis-list'),
 
     path('diagnoses/<int:pk>/', PlantDiagnosisRetrieveUpdateDestroyView.as_view(), name='diagnosis-retrieve-update-destroy'),
 
+    path('diagnoses/cache-stats/', DiagnosisCacheStatsView.as_view(), name='diagnosis-cache-stats'),
+
+    path('diagnoses/<int:pk>/status/', PlantDiagnosisStatusView.as_view(), name='diagnosis-status'),
+
     path('<int:pk>/water/', WateringLogCreateView.as_view(), name='wateringlog-create'),
 
     path('<int:pk>/watering-logs/', WateringLogListView.as_view(), name='wateringlog-list'),
@@ -1,12 +1,31 @@
 from .models import Plant, PlantDiagnosis, WateringLog, WateringSchedule
-from .serializers import PlantSerializer, PlantDiagnosisSerializer, WateringLogSerializer, WateringScheduleSerializer
-from .services.ai_diagnosis_service import PlantDiagnosisService
+from .serializers import (
+    PlantSerializer, PlantDiagnosisSerializer, PlantDiagnosisStatusSerializer, WateringLogSerializer,
+    WateringScheduleSerializer,
+)
+from .services.ai_diagnosis_service import run_diagnosis, arun_diagnosis, mark_diagnosis_failed
+from .services.care_dashboard import get_dashboard, render_dashboard
+from .services.diagnosis_cache import DiagnosisResultCache
+from .tasks import run_ai_diagnosis
 from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError as DRFValidationError
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from subscription.services import entitlement, metering
+from utils.async_auth import aauthenticate, error_response
+from utils.pagination import TimeCursorPagination, UploadedAtCursorPagination, WateredAtCursorPagination
+from celery import group
 
 # ======================================================
 # لیست‌گیری و ایجاد گیاه جدید
@@ -14,9 +33,10 @@ class PlantListCreateView(generics.ListCreateAPIView):
     queryset = Plant.objects.all()
     serializer_class = PlantSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = UploadedAtCursorPagination
 
     def get_queryset(self):
-        return Plant.objects.filter(user=self.request.user).order_by('-uploaded_at')
+        return Plant.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
         serializer.save()
@@ -36,6 +56,46 @@ class PlantRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         return obj
 
 
+# ======================================================
+# داشبورد صفحه اصلی: همه گیاهان، موعد آبیاری، آخرین تشخیص و رکورد آبیاری در یک درخواست
+class CareDashboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        dashboard = get_dashboard(request.user)
+        return Response(render_dashboard(dashboard, request=request))
+
+
+# ======================================================
+def validate_image_count(uploaded_images):
+    if len(uploaded_images) > settings.AI_DIAGNOSIS_MAX_IMAGES:
+        raise DRFValidationError(
+            {"images": f"حداکثر {settings.AI_DIAGNOSIS_MAX_IMAGES} تصویر برای هر تشخیص مجاز است."})
+
+
+def check_free_diagnosis_quota(user, requested=1):
+    # مصرف اتمیک سهمیه رایگان و سقف‌های پلن از شمارنده‌های کش؛ در حالت گرم هیچ کوئری اجرا نمی‌شود
+    try:
+        free_remaining = entitlement.consume(user, entitlement.KIND_DIAGNOSIS, requested)
+    except entitlement.QuotaExceeded as e:
+        raise DRFValidationError(
+            {"subscription": f"شما به سقف {e.limit} تشخیص رایگان رسیده‌اید. برای تشخیص‌های بیشتر، لطفاً اشتراک تهیه کنید."})
+    try:
+        metering.consume(user, metering.FEATURE_DIAGNOSIS, requested)
+    except entitlement.QuotaExceeded as e:
+        if free_remaining is not None:
+            entitlement.refund(user.pk, entitlement.KIND_DIAGNOSIS, requested)
+        raise DRFValidationError(
+            {"subscription": f"سقف {e.limit} تشخیص {metering.WINDOW_LABELS[e.window]} پلن شما تمام شده است."})
+
+
+def release_diagnosis_quota(user, requested=1):
+    # برگرداندن سهمیه درخواستی که تشخیصی نساخت (مثلاً خطای اعتبارسنجی فرم)
+    if entitlement.remaining(user, entitlement.KIND_DIAGNOSIS) is not None:
+        entitlement.refund(user.pk, entitlement.KIND_DIAGNOSIS, requested)
+    metering.release(user, metering.FEATURE_DIAGNOSIS, requested)
+
+
 # ======================================================
 # آپلود تصویر گیاه و انجام تشخیص خودکار با هوش مصنوعی
 class PlantDiagnosisCreateWithAIView(generics.CreateAPIView):
@@ -57,81 +117,169 @@ class PlantDiagnosisCreateWithAIView(generics.CreateAPIView):
         uploaded_images = self.request.FILES.getlist('images')
         if not uploaded_images:
             raise DRFValidationError({"images": "حداقل یک تصویر برای تشخیص لازم است."})
+        validate_image_count(uploaded_images)
 
+        check_free_diagnosis_quota(self.request.user)
 
-        diagnoses_count = PlantDiagnosis.objects.filter(plant__user=self.request.user).count()
-
-        if diagnoses_count >= 3:
-            raise DRFValidationError(
-                {"subscription": "شما به سقف 3 تشخیص رایگان رسیده‌اید. برای تشخیص‌های بیشتر، لطفاً اشتراک تهیه کنید."})
-
-        diagnosis_instance = serializer.save(plant=plant, image=uploaded_images[0])
-
+        if self.is_async_request():
+            diagnosis_instance = serializer.save(
+                plant=plant, image=uploaded_images[0], status=PlantDiagnosis.STATUS_PENDING
+            )
+            diagnosis_instance.add_images(uploaded_images)
+            transaction.on_commit(lambda: run_ai_diagnosis.delay(diagnosis_instance.id))
+            return
 
+        diagnosis_instance = serializer.save(plant=plant, image=uploaded_images[0],
+                                             status=PlantDiagnosis.STATUS_PROCESSING)
+        diagnosis_instance.add_images(uploaded_images)
 
         try:
-            ai_service = PlantDiagnosisService(
-                image_field=diagnosis_instance.image,
-                api_key=settings.AI_API_KEY
-            )
-            ai_output = ai_service.diagnose()
-
-            diagnosis_text = "مشکل خاصی پیدا نشد."
-            care_instructions_text = "توصیه‌های کلی برای مراقبت از گیاه."
-            category_text = "سایر"
-            confidence_score = 0.0
-
-            if ai_output and 'suggestions' in ai_output and ai_output['suggestions']:
-                best_suggestion = ai_output['suggestions'][0]
-                confidence_score = best_suggestion.get('probability', 0.0)
-
-                if 'health_assessment' in ai_output and not ai_output['health_assessment'].get('is_healthy', True):
-                    problems = ai_output['health_assessment'].get('diseases', []) + ai_output['health_assessment'].get(
-                        'pests', [])
-                    if problems:
-                        first_problem = problems[0]
-                        diagnosis_text = f"مشکل احتمالی: {first_problem.get('name', 'ناشناخته')}"
-                        care_instructions_text = best_suggestion.get('details', {}).get('wiki_description',
-                                                                                        'دستورالعمل مراقبتی خاصی ارائه نشده است.')
-                        category_text = "بیماری"
-                    else:
-                        diagnosis_text = "سلامت گیاه تایید نشد، اما مشکل خاصی شناسایی نشد."
-                        category_text = "ناسالم_ناشناخته"
-
-                elif best_suggestion.get('plant_name'):
-                    plant_details = best_suggestion.get('plant_details', {})
-                    common_names = plant_details.get('common_names', [])
-                    if common_names:
-                        plant_name = common_names[0]
-                    else:
-                        plant_name = best_suggestion.get('plant_name', 'ناشناخته')
-
-                    diagnosis_text = f"شناسایی گیاه: {plant_name}"
-                    care_instructions_text = plant_details.get('wiki_description', {}).get('value', '')
-                    category_text = "شناسایی_شده"
-            else:
-                diagnosis_text = "تشخیص هوش مصنوعی امکان‌پذیر نبود. لطفاً تصویر واضح‌تری آپلود کنید."
-                care_instructions_text = "لطفاً با کارشناس گیاه مشورت کنید."
-                category_text = "سایر"
-
-            diagnosis_instance.diagnosis = diagnosis_text
-            diagnosis_instance.care_instructions = care_instructions_text
-            diagnosis_instance.category = category_text
-            diagnosis_instance.confidence = confidence_score
-            diagnosis_instance.save()
+            run_diagnosis(diagnosis_instance)
 
         except Exception as e:
             import traceback
             print("An error occurred during AI diagnosis:")
             traceback.print_exc()
 
-            diagnosis_instance.diagnosis = f"تشخیص هوش مصنوعی ناموفق بود: {e}. لطفا از وضوح تصویر اطمینان حاصل کرده و دوباره امتحان کنید."
-            diagnosis_instance.care_instructions = "لطفا تصویر واضح‌تری آپلود کنید یا به صورت دستی با یک کارشناس گیاه مشورت کنید."
-            diagnosis_instance.category = "سایر"
-            diagnosis_instance.confidence = 0.0
-            diagnosis_instance.save()
+            mark_diagnosis_failed(diagnosis_instance, e)
             raise DRFValidationError(f"تشخیص هوش مصنوعی تکمیل نشد: {e}")
 
+    def is_async_request(self):
+        mode = self.request.query_params.get('mode')
+        if mode:
+            return mode == 'async'
+        return settings.AI_DIAGNOSIS_ASYNC
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if self.is_async_request():
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+# ======================================================
+# نسخه async تشخیص با هوش مصنوعی برای اجرا زیر ASGI؛ در زمان انتظار برای Plant.id
+# فقط یک coroutine معلق است و worker برای درخواست‌های دیگر آزاد می‌ماند
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncPlantDiagnosisCreateView(View):
+    http_method_names = ['post']
+
+    async def post(self, request, pk):
+        try:
+            user = await aauthenticate(request)
+        except AuthenticationFailed as e:
+            return error_response(str(e.detail), status=401)
+        if not user.is_authenticated:
+            return error_response("اطلاعات احراز هویت ارسال نشده است.", status=401)
+
+        plant = await Plant.objects.filter(pk=pk, user=user).afirst()
+        if plant is None:
+            return error_response("گیاه پیدا نشد یا شما اجازه تشخیص آن را ندارید.", status=404)
+
+        uploaded_images = request.FILES.getlist('images')
+        queued = request.GET.get('mode', 'async' if settings.AI_DIAGNOSIS_ASYNC else '') == 'async'
+        try:
+            if not uploaded_images:
+                raise DRFValidationError({"images": "حداقل یک تصویر برای تشخیص لازم است."})
+            validate_image_count(uploaded_images)
+            await sync_to_async(check_free_diagnosis_quota)(user)
+
+            try:
+                diagnosis_instance = await sync_to_async(self.create_diagnosis)(
+                    request, plant, uploaded_images,
+                    PlantDiagnosis.STATUS_PENDING if queued else PlantDiagnosis.STATUS_PROCESSING,
+                )
+            except DRFValidationError:
+                await sync_to_async(release_diagnosis_quota)(user)
+                raise
+        except DRFValidationError as e:
+            return error_response(e.detail, status=400)
+
+        if queued:
+            run_ai_diagnosis.delay(diagnosis_instance.id)
+            return await self.render(request, diagnosis_instance, status.HTTP_202_ACCEPTED)
+
+        try:
+            await arun_diagnosis(diagnosis_instance)
+        except Exception as e:
+            await sync_to_async(mark_diagnosis_failed)(diagnosis_instance, e)
+            return error_response([f"تشخیص هوش مصنوعی تکمیل نشد: {e}"], status=400)
+
+        return await self.render(request, diagnosis_instance, status.HTTP_201_CREATED)
+
+    @staticmethod
+    def create_diagnosis(request, plant, uploaded_images, diagnosis_status):
+        data = {'plant': plant.pk, 'image': uploaded_images[0], **request.POST.dict()}
+        serializer = PlantDiagnosisSerializer(data=data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        diagnosis_instance = serializer.save(plant=plant, image=uploaded_images[0], status=diagnosis_status)
+        diagnosis_instance.add_images(uploaded_images)
+        return diagnosis_instance
+
+    @staticmethod
+    async def render(request, diagnosis_instance, response_status):
+        serializer = PlantDiagnosisSerializer(diagnosis_instance, context={'request': request})
+        data = await sync_to_async(lambda: serializer.data)()
+        return JsonResponse(data, status=response_status)
+
+
+# ======================================================
+# تشخیص گروهی چند گیاه در یک درخواست؛ تصاویر هر گیاه با فیلد images_<plant_id> ارسال می‌شوند
+# و برای هر گیاه یک فراخوانی Plant.id (با همه تصاویرش) در صف Celery انجام می‌شود.
+class PlantDiagnosisBulkCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request):
+        images_by_plant = {}
+        for field in request.FILES:
+            prefix, _, plant_id = field.partition('images_')
+            if prefix or not plant_id.isdigit():
+                continue
+            images_by_plant[int(plant_id)] = request.FILES.getlist(field)
+
+        if not images_by_plant:
+            raise DRFValidationError({"images": "برای هر گیاه تصاویر را با نام images_<plant_id> ارسال کنید."})
+        if len(images_by_plant) > settings.AI_DIAGNOSIS_BULK_MAX_PLANTS:
+            raise DRFValidationError(
+                {"images": f"حداکثر {settings.AI_DIAGNOSIS_BULK_MAX_PLANTS} گیاه در هر درخواست مجاز است."})
+        for uploaded_images in images_by_plant.values():
+            validate_image_count(uploaded_images)
+
+        plants = Plant.objects.filter(user=request.user).in_bulk(images_by_plant.keys())
+        missing = sorted(set(images_by_plant) - set(plants))
+        if missing:
+            raise NotFound(f"گیاه(های) {missing} پیدا نشد یا شما اجازه تشخیص آن را ندارید.")
+
+        check_free_diagnosis_quota(request.user, requested=len(images_by_plant))
+
+        with transaction.atomic():
+            diagnoses = []
+            for plant_id, uploaded_images in images_by_plant.items():
+                diagnosis = PlantDiagnosis.objects.create(
+                    plant=plants[plant_id], image=uploaded_images[0], status=PlantDiagnosis.STATUS_PENDING
+                )
+                diagnosis.add_images(uploaded_images)
+                diagnoses.append(diagnosis)
+
+            diagnosis_ids = [diagnosis.id for diagnosis in diagnoses]
+            transaction.on_commit(lambda: group(run_ai_diagnosis.s(pk) for pk in diagnosis_ids).apply_async())
+
+        return Response(
+            {"diagnoses": PlantDiagnosisStatusSerializer(diagnoses, many=True).data},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+# ======================================================
+# وضعیت تشخیص صف‌شده؛ کلاینت تا رسیدن به completed یا failed این endpoint را poll می‌کند
+class PlantDiagnosisStatusView(generics.RetrieveAPIView):
+    serializer_class = PlantDiagnosisStatusSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return PlantDiagnosis.objects.filter(plant__user=self.request.user)
+
 
 # ======================================================
 # لیست‌گیری تشخیص‌های گیاهان کاربر
@@ -139,9 +287,26 @@ class PlantDiagnosisListView(generics.ListAPIView):
     queryset = PlantDiagnosis.objects.all()
     serializer_class = PlantDiagnosisSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TimeCursorPagination
 
     def get_queryset(self):
-        return PlantDiagnosis.objects.filter(plant__user=self.request.user).order_by('-created_at')
+        queryset = PlantDiagnosis.objects.filter(plant__user=self.request.user)
+        if PlantDiagnosisSerializer.wants_field(self.request, 'images'):
+            queryset = queryset.prefetch_related('images')
+        return queryset
+
+
+# ======================================================
+# آمار کش نتایج Plant.id (فقط ادمین)
+class DiagnosisCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(DiagnosisResultCache().stats())
+
+    def delete(self, request):
+        DiagnosisResultCache().reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 # ======================================================
@@ -187,6 +352,7 @@ class WateringLogCreateView(generics.CreateAPIView):
 class WateringLogListView(generics.ListAPIView):
     serializer_class = WateringLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WateredAtCursorPagination
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -196,7 +362,10 @@ class WateringLogListView(generics.ListAPIView):
         if not plant_id:
             raise DRFValidationError("شناسه گیاه (Plant ID) برای مشاهده تاریخچه آبیاری در URL الزامی است.")
 
-        return WateringLog.objects.filter(plant__id=plant_id, plant__user=self.request.user).order_by('-watered_at')
+        queryset = WateringLog.objects.filter(plant__id=plant_id, plant__user=self.request.user)
+        if WateringLogSerializer.wants_field(self.request, 'plant_name'):
+            queryset = queryset.select_related('plant')
+        return queryset
 
 
 # ======================================================
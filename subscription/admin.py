@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SubscriptionPlan, PaymentHistory, Subscription, Notification
+from .models import SubscriptionPlan, PaymentHistory, Subscription, Notification, FeatureQuota, FeatureUsage
 
 @admin.register(SubscriptionPlan)
 class PlanAdmin(admin.ModelAdmin):
@@ -17,3 +17,14 @@ class SubscriptionAdmin(admin.ModelAdmin):
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'message', 'created_at', 'is_read')
+
+@admin.register(FeatureQuota)
+class FeatureQuotaAdmin(admin.ModelAdmin):
+    list_display = ('plan', 'feature', 'window', 'limit')
+    list_filter = ('feature', 'window')
+
+@admin.register(FeatureUsage)
+class FeatureUsageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'feature', 'window', 'period_start', 'count', 'updated_at')
+    list_filter = ('feature', 'window')
+    raw_id_fields = ('user',)
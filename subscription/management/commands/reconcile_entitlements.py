@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from subscription.services.entitlement import reconcile_users
+
+
+class Command(BaseCommand):
+    help = (
+        "مقایسه وضعیت اشتراک denormalized کاربران (subscription_plan، subscription_expires_at) با جدول Subscription "
+        "و اصلاح اختلاف‌ها."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="فقط گزارش، بدون اصلاح")
+
+    def handle(self, *args, **options):
+        checked, drifted = reconcile_users(options['batch_size'], options['dry_run'])
+        action = "پیدا شد" if options['dry_run'] else "اصلاح شد"
+        self.stdout.write(self.style.SUCCESS(f"{checked} کاربر بررسی شد، {len(drifted)} کاربر با اختلاف {action}."))
+        if drifted:
+            self.stdout.write(f"نمونه: {drifted[:20]}")
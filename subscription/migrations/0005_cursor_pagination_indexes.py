@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0004_rename_pay_time_paymenthistory_created_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='sub_notification_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenthistory',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payment_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenthistory',
+            index=models.Index(fields=['-created_at', '-id'], name='payment_created_idx'),
+        ),
+    ]
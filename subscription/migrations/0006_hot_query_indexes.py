@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0005_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'expired_at'], name='subscription_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['expired_at'], name='subscription_active_expiry_idx'),
+        ),
+    ]
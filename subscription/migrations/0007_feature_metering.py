@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:40
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+LIFETIME_START = datetime.date(1970, 1, 1)
+
+
+def seed_free_quota_and_usage(apps, schema_editor):
+    # سقف قبلی ۳ بار استفاده کاربران بدون اشتراک و مقدار فعلی feature_usage_count به جدول‌های جدید منتقل می‌شود
+    FeatureQuota = apps.get_model('subscription', 'FeatureQuota')
+    FeatureUsage = apps.get_model('subscription', 'FeatureUsage')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    FeatureQuota.objects.get_or_create(plan=None, feature='app', window='lifetime', defaults={'limit': 3})
+    usages = (
+        FeatureUsage(user_id=user_id, feature='app', window='lifetime', period_start=LIFETIME_START, count=count)
+        for user_id, count in User.objects.filter(feature_usage_count__gt=0).values_list('id', 'feature_usage_count')
+    )
+    FeatureUsage.objects.bulk_create(usages, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0006_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        # seed_free_quota_and_usage فیلد feature_usage_count را می‌خواند
+        ('users', '0002_remove_customuser_subscription_end_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeatureQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature', models.CharField(choices=[('app', 'استفاده از گیاه\u200cیار'), ('diagnosis', 'تشخیص بیماری'), ('chat', 'چت با دستیار')], max_length=20)),
+                ('window', models.CharField(choices=[('day', 'روزانه'), ('month', 'ماهانه'), ('lifetime', 'کل')], max_length=10)),
+                ('limit', models.PositiveIntegerField()),
+                ('plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='quotas', to='subscription.subscriptionplan')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('plan', 'feature', 'window'), name='feature_quota_plan_unique'), models.UniqueConstraint(condition=models.Q(('plan__isnull', True)), fields=('feature', 'window'), name='feature_quota_free_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeatureUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature', models.CharField(choices=[('app', 'استفاده از گیاه\u200cیار'), ('diagnosis', 'تشخیص بیماری'), ('chat', 'چت با دستیار')], max_length=20)),
+                ('window', models.CharField(choices=[('day', 'روزانه'), ('month', 'ماهانه'), ('lifetime', 'کل')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feature_usages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'feature', 'window', 'period_start'), name='feature_usage_unique')],
+            },
+        ),
+        migrations.RunPython(seed_free_quota_and_usage, migrations.RunPython.noop),
+    ]
@@ -21,6 +21,13 @@ class PaymentHistory(models.Model):
     fail_reason = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # صفحه‌بندی cursor پرداخت‌های کاربر و لیست ادمین
+            models.Index(fields=['user', '-created_at', '-id'], name='payment_user_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='payment_created_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username} - {self.amount} - {self.created_at:%Y-%m-%d}'
 
@@ -31,6 +38,16 @@ class Subscription(models.Model):
     expired_at = models.DateTimeField()
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # اشتراک فعال کاربر (user, is_active, expired_at)؛ ردیف‌های غیرفعال در ایندکس partial نمی‌آیند
+            models.Index(fields=['user', 'expired_at'], condition=models.Q(is_active=True),
+                         name='subscription_user_active_idx'),
+            # یادآوری و انقضای گروهی اشتراک‌های فعال بر اساس تاریخ پایان
+            models.Index(fields=['expired_at'], condition=models.Q(is_active=True),
+                         name='subscription_active_expiry_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username} - {self.plan.name}'
 
@@ -39,6 +56,65 @@ class Notification(models.Model):
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # کلید یکتای اعلان‌های سیستمی (مثل یادآوری انقضای یک اشتراک) تا اجرای دوباره تسک اعلان تکراری نسازد
+    dedup_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='sub_notification_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.message[:20]}'
+
+
+class FeatureQuota(models.Model):  # سقف استفاده از هر قابلیت در هر بازه برای هر پلن؛ plan خالی یعنی کاربران بدون اشتراک
+    FEATURE_APP = 'app'
+    FEATURE_DIAGNOSIS = 'diagnosis'
+    FEATURE_CHAT = 'chat'
+    FEATURE_CHOICES = [
+        (FEATURE_APP, 'استفاده از گیاه‌یار'),
+        (FEATURE_DIAGNOSIS, 'تشخیص بیماری'),
+        (FEATURE_CHAT, 'چت با دستیار'),
+    ]
+    WINDOW_DAY = 'day'
+    WINDOW_MONTH = 'month'
+    WINDOW_LIFETIME = 'lifetime'
+    WINDOW_CHOICES = [
+        (WINDOW_DAY, 'روزانه'),
+        (WINDOW_MONTH, 'ماهانه'),
+        (WINDOW_LIFETIME, 'کل'),
+    ]
+
+    plan = models.ForeignKey(SubscriptionPlan, on_delete=models.CASCADE, null=True, blank=True, related_name='quotas')
+    feature = models.CharField(max_length=20, choices=FEATURE_CHOICES)
+    window = models.CharField(max_length=10, choices=WINDOW_CHOICES)
+    limit = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'feature', 'window'], name='feature_quota_plan_unique'),
+            # NULL در UniqueConstraint یکتا حساب نمی‌شود؛ سهمیه کاربران بدون اشتراک جداگانه یکتا می‌شود
+            models.UniqueConstraint(fields=['feature', 'window'], condition=models.Q(plan__isnull=True),
+                                    name='feature_quota_free_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.plan.name if self.plan else "free"} - {self.feature}/{self.window}: {self.limit}'
+
+
+class FeatureUsage(models.Model):  # مقدار تجمیعی شمارنده‌های مصرف که به صورت دوره‌ای از کش (Redis) ذخیره می‌شود
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feature_usages')
+    feature = models.CharField(max_length=20, choices=FeatureQuota.FEATURE_CHOICES)
+    window = models.CharField(max_length=10, choices=FeatureQuota.WINDOW_CHOICES)
+    period_start = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'feature', 'window', 'period_start'], name='feature_usage_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} - {self.feature}/{self.window} {self.period_start}: {self.count}'
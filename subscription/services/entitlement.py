@@ -0,0 +1,231 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+KIND_DIAGNOSIS = 'diagnosis'
+KIND_CHAT = 'chat'
+
+KEY_PREFIX = 'entitlement:'
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, kind, limit, window=None):
+        self.kind = kind
+        self.limit = limit
+        self.window = window
+        super().__init__(f"{kind} quota of {limit} exhausted" + (f" for {window}" if window else ""))
+
+
+@dataclass
+class Entitlement:
+    """وضعیت اشتراک کاربر از رکورد کش‌شده؛ انقضا هنگام خواندن با زمان فعلی سنجیده می‌شود"""
+    user_id: int
+    plan_id: int = None
+    plan_name: str = None
+    expires_at: datetime = None
+
+    @property
+    def is_subscriber(self):
+        return self.expires_at is not None and self.expires_at > timezone.now()
+
+
+def record_key(user_id):
+    return f"{KEY_PREFIX}{user_id}"
+
+
+def usage_key(user_id, kind, today=None):
+    # سهمیه چت روزانه است؛ کلید هر روز جدا و با پایان روز منقضی می‌شود
+    if kind == KIND_CHAT:
+        return f"{KEY_PREFIX}{user_id}:{kind}:{(today or date.today()).isoformat()}"
+    return f"{KEY_PREFIX}{user_id}:{kind}"
+
+
+def free_limit(kind):
+    """سقف استفاده رایگان؛ 0 یعنی نامحدود"""
+    if kind == KIND_DIAGNOSIS:
+        return settings.ENTITLEMENT_FREE_DIAGNOSES
+    return settings.ENTITLEMENT_FREE_CHAT_PER_DAY
+
+
+def active_subscriptions(user_id, now=None):
+    from subscription.models import Subscription
+
+    return Subscription.objects.filter(user_id=user_id, is_active=True, expired_at__gt=now or timezone.now())
+
+
+def load_record(user_id):
+    """رکورد اشتراک با یک کوئری: اشتراک فعالی که دیرتر از همه تمام می‌شود"""
+    row = (
+        active_subscriptions(user_id).order_by('-expired_at')
+        .values('plan_id', 'plan__name', 'expired_at').first()
+    )
+    if row is None:
+        return {}
+    return {'plan_id': row['plan_id'], 'plan_name': row['plan__name'], 'expires_at': row['expired_at']}
+
+
+def get_entitlement(user):
+    """
+    وضعیت اشتراک کاربر. برای نمونه کاربر (مثل request.user) از فیلدهای denormalized خود کاربر و بدون کوئری یا کش
+    خوانده می‌شود. برای شناسه کاربر از کش (بدون کوئری در حالت گرم)؛ رکورد با خرید، لغو یا انقضای اشتراک باطل
+    می‌شود (سیگنال‌های subscription) و TTL آن هیچ‌وقت از زمان پایان اشتراک جلوتر نمی‌رود.
+    """
+    if hasattr(user, 'subscription_expires_at'):
+        return Entitlement(user.pk, user.subscription_plan_id, None, user.subscription_expires_at)
+
+    user_id = getattr(user, 'pk', user)
+    data = cache.get(record_key(user_id))
+    if data is None:
+        data = load_record(user_id)
+        timeout = settings.ENTITLEMENT_CACHE_TIMEOUT
+        if data:
+            timeout = max(1, min(timeout, int((data['expires_at'] - timezone.now()).total_seconds())))
+        cache.set(record_key(user_id), data, timeout)
+    return Entitlement(user_id, **data)
+
+
+def count_usage(user_id, kind):
+    from chat.models import Message
+    from plants.models import PlantDiagnosis
+
+    if kind == KIND_DIAGNOSIS:
+        return PlantDiagnosis.objects.filter(plant__user_id=user_id).count()
+    return Message.objects.filter(user_id=user_id, created_at__date=timezone.localdate()).count()
+
+
+def usage(user_id, kind):
+    """تعداد استفاده ثبت‌شده؛ اگر شمارنده در کش نباشد یک بار از دیتابیس شمرده می‌شود"""
+    key = usage_key(user_id, kind)
+    used = cache.get(key)
+    if used is None:
+        # add مقدار شمارنده‌ای را که درخواست همزمان دیگری ساخته و افزایش داده بازنویسی نمی‌کند
+        cache.add(key, count_usage(user_id, kind), settings.ENTITLEMENT_CACHE_TIMEOUT)
+        used = cache.get(key, 0)
+    return used
+
+
+def remaining(user, kind):
+    """تعداد باقی‌مانده سهمیه رایگان؛ None برای مشترکان یا سهمیه نامحدود"""
+    limit = free_limit(kind)
+    user_id = getattr(user, 'pk', user)
+    if not limit or get_entitlement(user).is_subscriber:
+        return None
+    return max(0, limit - usage(user_id, kind))
+
+
+def consume(user, kind, amount=1):
+    """
+    مصرف اتمیک سهمیه با incr روی شمارنده کش (Redis INCR)؛ اگر از سقف بگذرد برگردانده و QuotaExceeded
+    بالا برده می‌شود. مشترکان و سهمیه نامحدود شمارش نمی‌شوند. خروجی: باقی‌مانده یا None.
+    """
+    limit = free_limit(kind)
+    user_id = getattr(user, 'pk', user)
+    if not limit or get_entitlement(user).is_subscriber:
+        return None
+
+    usage(user_id, kind)
+    key = usage_key(user_id, kind)
+    try:
+        used = cache.incr(key, amount)
+    except ValueError:  # کلید بین خواندن و افزایش منقضی شد
+        cache.add(key, count_usage(user_id, kind), settings.ENTITLEMENT_CACHE_TIMEOUT)
+        used = cache.incr(key, amount)
+    if used > limit:
+        cache.decr(key, amount)
+        raise QuotaExceeded(kind, limit)
+    return limit - used
+
+
+def refund(user_id, kind, amount=1):
+    """برگرداندن سهمیه (مثلاً حذف تشخیص)؛ اگر شمارنده در کش نباشد دفعه بعد از دیتابیس شمرده می‌شود"""
+    try:
+        cache.decr(usage_key(user_id, kind), amount)
+    except ValueError:
+        pass
+
+
+def invalidate(*user_ids):
+    cache.delete_many([record_key(user_id) for user_id in user_ids])
+
+
+def sync_users(user_ids, now=None):
+    """
+    به‌روزرسانی فیلدهای denormalized اشتراک (subscription_plan، subscription_expires_at) کاربران با یک UPDATE و
+    subquery از اشتراک فعالی که دیرتر از همه تمام می‌شود. در transaction فراخواننده اجرا می‌شود؛ کش پس از commit هم
+    باطل می‌شود. خروجی: تعداد کاربران به‌روزشده.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.db.models import OuterRef, Subquery
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    latest = active_subscriptions(OuterRef('pk'), now).order_by('-expired_at')
+    updated = get_user_model().objects.filter(pk__in=user_ids).update(
+        subscription_plan=Subquery(latest.values('plan_id')[:1]),
+        subscription_expires_at=Subquery(latest.values('expired_at')[:1]),
+    )
+    invalidate(*user_ids)
+    transaction.on_commit(lambda: invalidate(*user_ids))
+    return updated
+
+
+def reconcile_users(batch_size=1000, dry_run=False, now=None):
+    """
+    پیدا کردن و اصلاح کاربرانی که فیلدهای denormalized اشتراکشان با جدول Subscription نمی‌خواند (مثلاً پس از
+    تغییر مستقیم در دیتابیس). کاربران در دسته‌های batch_size تایی (keyset روی id) با مقدار مورد انتظار مقایسه می‌شوند.
+    خروجی: (تعداد بررسی‌شده، شناسه کاربرانی که اختلاف داشتند).
+    """
+    from django.contrib.auth import get_user_model
+    from django.db.models import OuterRef, Subquery
+
+    now = now or timezone.now()
+    latest = active_subscriptions(OuterRef('pk'), now).order_by('-expired_at')
+    users = get_user_model().objects.order_by('pk').annotate(
+        expected_plan=Subquery(latest.values('plan_id')[:1]),
+        expected_expiry=Subquery(latest.values('expired_at')[:1]),
+    ).values_list('pk', 'subscription_plan_id', 'subscription_expires_at', 'expected_plan', 'expected_expiry')
+
+    checked, drifted, last_id = 0, [], 0
+    while True:
+        rows = list(users.filter(pk__gt=last_id)[:batch_size])
+        if not rows:
+            return checked, drifted
+        batch = [pk for pk, plan_id, expires_at, expected_plan, expected_expiry in rows
+                 if (plan_id, expires_at) != (expected_plan, expected_expiry)]
+        if batch and not dry_run:
+            sync_users(batch, now)
+        checked += len(rows)
+        drifted.extend(batch)
+        last_id = rows[-1][0]
+
+
+def plan_name(current):
+    if current.plan_name is None and current.plan_id is not None:
+        from subscription.models import SubscriptionPlan
+
+        return SubscriptionPlan.objects.filter(pk=current.plan_id).values_list('name', flat=True).first()
+    return current.plan_name
+
+
+def summary(user):
+    entitlement = get_entitlement(user)
+    quotas = {}
+    for kind in (KIND_DIAGNOSIS, KIND_CHAT):
+        limit = free_limit(kind)
+        if not limit or entitlement.is_subscriber:
+            quotas[kind] = {'limit': None, 'remaining': None}
+        else:
+            quotas[kind] = {'limit': limit, 'remaining': max(0, limit - usage(entitlement.user_id, kind))}
+    return {
+        'is_subscriber': entitlement.is_subscriber,
+        'plan': plan_name(entitlement) if entitlement.is_subscriber else None,
+        'expires_at': entitlement.expires_at.isoformat() if entitlement.is_subscriber else None,
+        'can_diagnose': quotas[KIND_DIAGNOSIS]['remaining'] != 0,
+        'can_chat': quotas[KIND_CHAT]['remaining'] != 0,
+        'quotas': quotas,
+    }
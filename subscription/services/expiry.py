@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from subscription.models import Notification, Subscription, SubscriptionPlan
+from . import entitlement
+
+REMINDER_DAYS = 3
+# پایگاه‌داده‌هایی که UPDATE ... RETURNING دارند (SQLite از نسخه 3.35)
+UPDATE_RETURNING_VENDORS = {'postgresql', 'sqlite'}
+
+# غیرفعال‌سازی گروهی post_save ندارد؛ گیرنده‌ها (مثل analytics) ردیف‌های (id, user_id, plan_id) هر دسته را می‌گیرند
+subscriptions_expired = Signal()
+
+
+def plan_label(plan_names, plan_id):
+    name = plan_names.get(plan_id)
+    return f" در پلن {name}" if name else ""
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, start + timedelta(days=1)
+
+
+def expiring_subscriptions(start, end):
+    return Subscription.objects.filter(is_active=True, expired_at__gte=start, expired_at__lt=end).order_by('id')
+
+
+def expired_subscriptions(now):
+    # ترتیب expired_at (نه id) تا planner از ایندکس (is_active, expired_at) استفاده کند
+    return Subscription.objects.filter(is_active=True, expired_at__lt=now).order_by('expired_at')
+
+
+# ======================================================
+# یادآوری: اشتراک‌های فعالی که REMINDER_DAYS روز دیگر تمام می‌شوند
+def send_reminders(now=None, chunk_size=None):
+    """
+    ساخت اعلان یادآوری برای اشتراک‌هایی که در روز now + ۳ تمام می‌شوند، در دسته‌های chunk_size تایی (keyset روی id).
+    کلید یکتای هر یادآوری شامل تاریخ پایان است؛ اجرای دوباره تسک چیزی اضافه نمی‌کند ولی تمدید اشتراک یادآوری تازه دارد.
+    خروجی: تعداد اشتراک‌های بررسی‌شده.
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.SUBSCRIPTION_SWEEP_CHUNK_SIZE
+    start, end = day_range(timezone.localdate(now) + timedelta(days=REMINDER_DAYS))
+    plan_names = dict(SubscriptionPlan.objects.values_list('id', 'name'))
+    expiring = expiring_subscriptions(start, end)
+
+    processed, last_id = 0, 0
+    while True:
+        rows = list(expiring.filter(id__gt=last_id).values_list('id', 'user_id', 'plan_id', 'expired_at')[:chunk_size])
+        if not rows:
+            return processed
+        notifications = [
+            Notification(
+                user_id=user_id, dedup_key=f"sub-reminder:{sub_id}:{expired_at:%Y%m%d}",
+                message=(f"اشتراک شما{plan_label(plan_names, plan_id)} تا {REMINDER_DAYS} روز دیگر به پایان می‌رسد. "
+                         f"لطفاً تمدید کنید."),
+            )
+            for sub_id, user_id, plan_id, expired_at in rows
+        ]
+        Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+        processed += len(rows)
+        last_id = rows[-1][0]
+
+
+# ======================================================
+# انقضا: غیرفعال کردن گروهی اشتراک‌های تمام‌شده
+def deactivate_chunk(now, chunk_size):
+    """
+    غیرفعال کردن حداکثر chunk_size اشتراک منقضی با یک UPDATE ... RETURNING و برگرداندن (id, user_id, plan_id) آن‌ها.
+    در PostgreSQL ردیف‌ها با FOR UPDATE SKIP LOCKED انتخاب می‌شوند تا دو worker همزمان یک اشتراک را دو بار پردازش نکنند.
+    باید داخل transaction صدا زده شود.
+    """
+    expired = (
+        expired_subscriptions(now).select_for_update(skip_locked=True).values('id')[:chunk_size]
+    )
+    if connection.vendor not in UPDATE_RETURNING_VENDORS:
+        # بدون پشتیبانی RETURNING (مثل MySQL): انتخاب و به‌روزرسانی در دو کوئری داخل همان transaction قفل‌شده
+        rows = list(Subscription.objects.filter(id__in=[row['id'] for row in expired])
+                    .values_list('id', 'user_id', 'plan_id'))
+        Subscription.objects.filter(id__in=[row[0] for row in rows]).update(is_active=False)
+        return rows
+
+    subquery, params = expired.query.sql_with_params()
+    table = connection.ops.quote_name(Subscription._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET is_active = %s WHERE id IN ({subquery}) RETURNING id, user_id, plan_id",
+            (False, *params),
+        )
+        return cursor.fetchall()
+
+
+def expire_subscriptions(now=None, chunk_size=None):
+    """
+    غیرفعال کردن اشتراک‌های منقضی و ساخت اعلان پایان اشتراک، هر دسته در یک transaction جدا تا حافظه و قفل‌ها
+    محدود بمانند. سیگنال post_save اجرا نمی‌شود، پس وضعیت اشتراک کاربران در همان transaction صریحاً همگام می‌شود.
+    خروجی: تعداد اشتراک‌های غیرفعال‌شده.
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.SUBSCRIPTION_SWEEP_CHUNK_SIZE
+    plan_names = dict(SubscriptionPlan.objects.values_list('id', 'name'))
+
+    expired = 0
+    while True:
+        with transaction.atomic():
+            rows = deactivate_chunk(now, chunk_size)
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id, dedup_key=f"sub-expired:{sub_id}",
+                    message=f"اشتراک شما{plan_label(plan_names, plan_id)} به پایان رسید و دسترسی شما محدود شد.",
+                )
+                for sub_id, user_id, plan_id in rows
+            ], ignore_conflicts=True)
+            entitlement.sync_users({user_id for _, user_id, _ in rows}, now)
+            if rows:
+                subscriptions_expired.send(sender=Subscription, rows=rows)
+        expired += len(rows)
+        if len(rows) < chunk_size:
+            return expired
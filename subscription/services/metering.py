@@ -0,0 +1,264 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from subscription.models import FeatureQuota, FeatureUsage
+from .entitlement import QuotaExceeded, get_entitlement
+
+FEATURE_APP = FeatureQuota.FEATURE_APP
+FEATURE_DIAGNOSIS = FeatureQuota.FEATURE_DIAGNOSIS
+FEATURE_CHAT = FeatureQuota.FEATURE_CHAT
+WINDOW_DAY = FeatureQuota.WINDOW_DAY
+WINDOW_MONTH = FeatureQuota.WINDOW_MONTH
+WINDOW_LIFETIME = FeatureQuota.WINDOW_LIFETIME
+WINDOW_LABELS = dict(FeatureQuota.WINDOW_CHOICES)
+
+LIFETIME_START = date(1970, 1, 1)
+KEY_PREFIX = 'meter:'
+QUOTAS_KEY = 'meter:quotas'
+CURSOR_KEY = 'meter:flushed_epoch'
+
+
+# ======================================================
+# بازه‌ها و کلیدهای شمارنده
+def period_start(window, today=None):
+    today = today or timezone.localdate()
+    if window == WINDOW_DAY:
+        return today
+    if window == WINDOW_MONTH:
+        return today.replace(day=1)
+    return LIFETIME_START
+
+
+def period_end(window, start):
+    if window == WINDOW_DAY:
+        return start + timedelta(days=1)
+    if window == WINDOW_MONTH:
+        return (start + timedelta(days=32)).replace(day=1)
+    return None
+
+
+def counter_key(user_id, feature, window, start):
+    return f"{KEY_PREFIX}{feature}:{window}:{start.isoformat()}:{user_id}"
+
+
+def parse_counter_key(key):
+    feature, window, start, user_id = key[len(KEY_PREFIX):].split(':')
+    return int(user_id), feature, window, date.fromisoformat(start)
+
+
+def counter_timeout(window, start):
+    """شمارنده تا پایان بازه به اضافه METERING_COUNTER_GRACE زنده می‌ماند تا آخرین مقدار آن flush شود"""
+    end = period_end(window, start)
+    if end is None:
+        return None
+    end_at = timezone.make_aware(datetime.combine(end, datetime.min.time()))
+    return max(1, int((end_at - timezone.now()).total_seconds())) + settings.METERING_COUNTER_GRACE
+
+
+# ======================================================
+# سهمیه پلن‌ها (جدول کوچک؛ کل آن یک‌جا کش می‌شود)
+def load_quotas():
+    quotas = {}
+    for plan_id, feature, window, limit in FeatureQuota.objects.values_list('plan_id', 'feature', 'window', 'limit'):
+        quotas.setdefault(plan_id, {}).setdefault(feature, {})[window] = limit
+    return quotas
+
+
+def all_quotas():
+    quotas = cache.get(QUOTAS_KEY)
+    if quotas is None:
+        quotas = load_quotas()
+        cache.set(QUOTAS_KEY, quotas, settings.METERING_QUOTA_CACHE_TIMEOUT)
+    return quotas
+
+
+def invalidate_quotas():
+    cache.delete(QUOTAS_KEY)
+
+
+def plan_limits(user, feature, quotas):
+    """سقف‌های پلن فعلی کاربر برای یک قابلیت به صورت {window: limit}؛ plan خالی یعنی کاربر بدون اشتراک"""
+    current = get_entitlement(user)
+    plan_id = current.plan_id if current.is_subscriber else None
+    return quotas.get(plan_id, {}).get(feature, {})
+
+
+def tracked_windows(feature, quotas):
+    # مصرف روزانه همیشه برای گزارش ثبت می‌شود؛ بازه‌هایی که در هر پلنی سقف دارند هم برای همه کاربران شمرده می‌شوند
+    # تا با تغییر پلن، شمارش از صفر شروع نشود
+    windows = {WINDOW_DAY}
+    for features in quotas.values():
+        windows.update(features.get(feature, {}))
+    return sorted(windows)
+
+
+def limits(user, feature):
+    return plan_limits(user, feature, all_quotas())
+
+
+# ======================================================
+# شمارنده‌ها
+def stored_count(user_id, feature, window, start):
+    return (
+        FeatureUsage.objects.filter(user_id=user_id, feature=feature, window=window, period_start=start)
+        .values_list('count', flat=True).first() or 0
+    )
+
+
+def increment(user_id, feature, window, start, amount):
+    key = counter_key(user_id, feature, window, start)
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # شمارنده در کش نیست (اولین استفاده در بازه یا پاک شدن کش): از آخرین مقدار flush شده ادامه می‌دهیم.
+        # add مقدار شمارنده‌ای را که درخواست همزمان دیگری ساخته بازنویسی نمی‌کند
+        cache.add(key, stored_count(user_id, feature, window, start), counter_timeout(window, start))
+        return cache.incr(key, amount)
+
+
+def consume(user, feature, amount=1):
+    """
+    ثبت مصرف یک قابلیت با INCR اتمیک در کش (Redis) برای هر بازه و بررسی سقف پلن کاربر. اگر یکی از بازه‌ها از سقف
+    بگذرد، همه افزایش‌ها برگردانده و QuotaExceeded بالا برده می‌شود. هیچ نوشتنی روی دیتابیس انجام نمی‌شود؛
+    مقادیر با تسک flush_usage_counters به صورت گروهی ذخیره می‌شوند. خروجی: مصرف فعلی به صورت {window: count}.
+    """
+    user_id = getattr(user, 'pk', user)
+    quotas = all_quotas()
+    user_limits = plan_limits(user, feature, quotas)
+    today = timezone.localdate()
+
+    used, keys = {}, []
+    for window in tracked_windows(feature, quotas):
+        start = period_start(window, today)
+        count = increment(user_id, feature, window, start, amount)
+        keys.append(counter_key(user_id, feature, window, start))
+        used[window] = count
+        limit = user_limits.get(window)
+        if limit is not None and count > limit:
+            for key in keys:
+                cache.decr(key, amount)
+            raise QuotaExceeded(feature, limit, window)
+
+    for key in keys:
+        mark_dirty(key)
+    return used
+
+
+def release(user, feature, amount=1):
+    """برگرداندن مصرف درخواستی که نتیجه‌ای نداشت (مثلاً خطای Gemini)؛ شمارنده‌ای که در کش نیست تغییری نمی‌کند"""
+    user_id = getattr(user, 'pk', user)
+    today = timezone.localdate()
+    for window in tracked_windows(feature, all_quotas()):
+        key = counter_key(user_id, feature, window, period_start(window, today))
+        try:
+            cache.decr(key, amount)
+        except ValueError:
+            continue
+        mark_dirty(key)
+
+
+def usage(user, features=(FEATURE_APP, FEATURE_DIAGNOSIS, FEATURE_CHAT)):
+    """مصرف و سقف هر قابلیت در هر بازه: {feature: {window: {'used', 'limit'}}}"""
+    user_id = getattr(user, 'pk', user)
+    quotas = all_quotas()
+    today = timezone.localdate()
+    slots = [
+        (feature, window, period_start(window, today))
+        for feature in features for window in tracked_windows(feature, quotas)
+    ]
+    counts = cache.get_many([counter_key(user_id, *slot) for slot in slots])
+    user_limits = {feature: plan_limits(user, feature, quotas) for feature in features}
+
+    result = {}
+    for feature, window, start in slots:
+        count = counts.get(counter_key(user_id, feature, window, start))
+        if count is None:
+            count = stored_count(user_id, feature, window, start)
+        result.setdefault(feature, {})[window] = {'used': count, 'limit': user_limits[feature].get(window)}
+    return result
+
+
+def reset(user, feature, window=WINDOW_LIFETIME):
+    user_id = getattr(user, 'pk', user)
+    start = period_start(window)
+    key = counter_key(user_id, feature, window, start)
+    cache.set(key, 0, counter_timeout(window, start))
+    mark_dirty(key)
+
+
+# ======================================================
+# ذخیره گروهی در دیتابیس
+# هر شمارنده‌ای که در یک بازه METERING_FLUSH_INTERVAL تغییر کند یک بار در لاگ آن بازه (epoch) ثبت می‌شود.
+# flush لاگ epochهای تمام‌شده را می‌خواند و مقدار فعلی شمارنده‌ها را (نه افزایش‌ها را) upsert می‌کند؛ پس اجرای
+# دوباره یا همزمان flush مقدار را دو بار اضافه نمی‌کند.
+def current_epoch(now=None):
+    return int((now or time.time()) // settings.METERING_FLUSH_INTERVAL)
+
+
+def log_key(epoch, suffix):
+    return f"{KEY_PREFIX}log:{epoch}:{suffix}"
+
+
+def log_timeout():
+    return settings.METERING_FLUSH_INTERVAL * settings.METERING_LOG_RETENTION_EPOCHS
+
+
+def mark_dirty(key):
+    epoch = current_epoch()
+    timeout = log_timeout()
+    if not cache.add(log_key(epoch, key), 1, timeout):
+        return
+    seq_key = log_key(epoch, 'seq')
+    cache.add(seq_key, 0, timeout)
+    cache.set(log_key(epoch, cache.incr(seq_key)), key, timeout)
+
+
+def dirty_keys(first_epoch, last_epoch):
+    keys = set()
+    for epoch in range(first_epoch, last_epoch + 1):
+        seq = cache.get(log_key(epoch, 'seq')) or 0
+        for chunk_start in range(1, seq + 1, settings.METERING_FLUSH_BATCH_SIZE):
+            chunk = range(chunk_start, min(seq, chunk_start + settings.METERING_FLUSH_BATCH_SIZE - 1) + 1)
+            keys.update(cache.get_many([log_key(epoch, n) for n in chunk]).values())
+    return sorted(keys)
+
+
+def flush(now=None):
+    """
+    ذخیره مقدار شمارنده‌های تغییرکرده در FeatureUsage با bulk upsert و همگام کردن feature_usage_count کاربران
+    (مصرف کل قابلیت app). epoch جاری که هنوز در حال نوشته شدن است در اجرای بعدی ذخیره می‌شود. خروجی: تعداد ردیف‌ها.
+    """
+    epoch = current_epoch(now)
+    oldest = epoch - settings.METERING_LOG_RETENTION_EPOCHS
+    flushed = cache.get(CURSOR_KEY)
+    first = oldest if flushed is None else max(oldest, flushed + 1)
+    keys = dirty_keys(first, epoch - 1)
+
+    rows = []
+    for chunk_start in range(0, len(keys), settings.METERING_FLUSH_BATCH_SIZE):
+        counts = cache.get_many(keys[chunk_start:chunk_start + settings.METERING_FLUSH_BATCH_SIZE])
+        for key, count in counts.items():
+            user_id, feature, window, start = parse_counter_key(key)
+            rows.append(FeatureUsage(user_id=user_id, feature=feature, window=window, period_start=start, count=count))
+
+    User = get_user_model()
+    existing = set(User.objects.filter(pk__in={row.user_id for row in rows}).values_list('pk', flat=True))
+    rows = [row for row in rows if row.user_id in existing]
+    app_totals = [
+        User(pk=row.user_id, feature_usage_count=row.count) for row in rows
+        if row.feature == FEATURE_APP and row.window == WINDOW_LIFETIME
+    ]
+    with transaction.atomic():
+        FeatureUsage.objects.bulk_create(
+            rows, batch_size=settings.METERING_FLUSH_BATCH_SIZE, update_conflicts=True,
+            unique_fields=['user', 'feature', 'window', 'period_start'], update_fields=['count', 'updated_at'],
+        )
+        User.objects.bulk_update(app_totals, ['feature_usage_count'], batch_size=settings.METERING_FLUSH_BATCH_SIZE)
+    cache.set(CURSOR_KEY, epoch - 1, None)
+    return len(rows)
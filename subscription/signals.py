@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import FeatureQuota, PaymentHistory, Subscription
+from .services import entitlement, metering
+
+
+# ======================================================
+# همگام کردن وضعیت اشتراک denormalized روی کاربر با خرید، تمدید، لغو یا انقضای اشتراک و ثبت پرداخت.
+# در همان transaction تغییر اجرا می‌شود؛ کش entitlement هم همین حالا و پس از commit باطل می‌شود
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=PaymentHistory)
+def sync_entitlement(sender, instance, **kwargs):
+    entitlement.sync_users([instance.user_id])
+
+
+@receiver(post_save, sender=FeatureQuota)
+@receiver(post_delete, sender=FeatureQuota)
+def invalidate_quotas(sender, instance, **kwargs):
+    metering.invalidate_quotas()
+    transaction.on_commit(metering.invalidate_quotas)
@@ -1,17 +1,27 @@
+import logging
+
+from celery import shared_task
 from django.utils import timezone
-from .models import Subscription, Notification
+from .services import expiry, metering
+
+logger = logging.getLogger(__name__)
+
 
+@shared_task
 def send_subscription_reminders():
-    ''' پیدا کردن اشتراک‌هایی که ۳ روز مونده به پایانشون  '''
+    ''' یادآوری اشتراک‌هایی که ۳ روز مونده به پایانشون و غیرفعال کردن اشتراک‌های منقضی، به صورت گروهی '''
     now = timezone.now()
-    almost_expire = now + timezone.timedelta(days=3)
-    qs = Subscription.objects.filter(is_active=True, expired_at__date=almost_expire.date())
-    for sub in qs:
-        message = f"اشتراک شما در پلن {sub.plan.name} تا ۳ روز دیگر به پایان می‌رسد. لطفاً تمدید کنید."
-        if not Notification.objects.filter(user=sub.user, message__contains=sub.plan.name, created_at__date=now.date()).exists():
-            Notification.objects.create(user=sub.user, message=message)
-    expired = Subscription.objects.filter(is_active=True, expired_at__lt=now)
-    for sub in expired:
-        sub.is_active = False
-        sub.save()
-        Notification.objects.create(user=sub.user, message=f"اشتراک شما در پلن {sub.plan.name} به پایان رسید و دسترسی شما محدود شد.")
+    reminded = expiry.send_reminders(now)
+    expired = expiry.expire_subscriptions(now)
+    if reminded or expired:
+        logger.info(f"🔔 یادآوری اشتراک: {reminded} اشتراک رو به پایان، {expired} اشتراک منقضی غیرفعال شد.")
+    return {'reminded': reminded, 'expired': expired}
+
+
+@shared_task
+def flush_usage_counters():
+    """ذخیره گروهی شمارنده‌های مصرف قابلیت‌ها از کش در FeatureUsage"""
+    flushed = metering.flush()
+    if flushed:
+        logger.info(f"📊 {flushed} شمارنده مصرف در دیتابیس ذخیره شد.")
+    return flushed
@@ -1,3 +1,196 @@
+import time
+from io import StringIO
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from plants.models import Plant, PlantDiagnosis
+from plants.views import check_free_diagnosis_quota
+from .models import FeatureQuota, FeatureUsage, Notification, PaymentHistory, Subscription, SubscriptionPlan
+from .services import entitlement, expiry, metering
+
+User = get_user_model()
+
+
+class AdminPaymentsPaginationTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', phone_number='09120000071',
+                                              is_staff=True)
+        plans = [SubscriptionPlan.objects.create(name=f'Plan {i}', price=1000, duration_days=30) for i in range(3)]
+        PaymentHistory.objects.bulk_create([
+            PaymentHistory(user=self.admin, plan=plans[i % 3], amount=1000, is_successful=True) for i in range(25)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_cursor_pages_cover_all_payments_with_constant_queries(self):
+        seen = []
+        url = '/subscription/admin/payments/?page_size=10'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            seen.extend(payment['id'] for payment in response.data['all_payments'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_sparse_fieldset(self):
+        response = self.client.get('/subscription/admin/payments/?fields=id,amount')
+        self.assertEqual(set(response.data['all_payments'][0]), {'id', 'amount'})
+        self.assertEqual(self.client.get('/subscription/admin/payments/?fields=secret').status_code, 400)
+
+
+class EntitlementTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='free', password='pass', phone_number='09120000081')
+        self.plant = Plant.objects.create(user=self.user, name='Aloe')
+        self.plan = SubscriptionPlan.objects.create(name='Monthly', price=1000, duration_days=30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_warm_quota_check_needs_no_queries_and_stops_at_limit(self):
+        check_free_diagnosis_quota(self.user)
+        with self.assertNumQueries(0):
+            check_free_diagnosis_quota(self.user)
+            check_free_diagnosis_quota(self.user)
+            with self.assertRaises(ValidationError):
+                check_free_diagnosis_quota(self.user)
+        self.assertEqual(entitlement.remaining(self.user, entitlement.KIND_DIAGNOSIS), 0)
+
+    def test_buying_updates_denormalized_entitlement(self):
+        self.assertFalse(self.user.has_active_subscription)
+        self.client.post('/subscription/buy/', {'plan_id': self.plan.id})
+        self.user.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.user.has_active_subscription)
+            self.assertEqual(entitlement.get_entitlement(self.user).plan_id, self.plan.id)
+        for _ in range(5):
+            check_free_diagnosis_quota(self.user)
+        summary = self.client.get('/subscription/entitlement/').data
+        self.assertTrue(summary['is_subscriber'])
+        self.assertEqual(summary['plan'], 'Monthly')
+        self.assertIsNone(summary['quotas']['diagnosis']['remaining'])
+
+    def test_deleting_diagnosis_refunds_quota(self):
+        for _ in range(3):
+            check_free_diagnosis_quota(self.user)
+            PlantDiagnosis.objects.create(plant=self.plant, image='diagnoses/x.png')
+        self.assertEqual(entitlement.remaining(self.user, entitlement.KIND_DIAGNOSIS), 0)
+        PlantDiagnosis.objects.filter(plant=self.plant).first().delete()
+        self.assertEqual(entitlement.remaining(self.user, entitlement.KIND_DIAGNOSIS), 1)
+
+
+class MeteringTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='metered', password='pass', phone_number='09120000091')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def flush(self):
+        return metering.flush(now=time.time() + settings.METERING_FLUSH_INTERVAL)
+
+    def test_feature_use_never_writes_user_row_and_flushes_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            statuses = [self.client.post('/users/use-feature/').status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 403])
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')])
+
+        self.assertEqual(self.flush(), 2)
+        self.assertEqual(self.flush(), 0)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.feature_usage_count, 3)
+        self.assertEqual(
+            FeatureUsage.objects.get(user=self.user, feature=metering.FEATURE_APP, window=metering.WINDOW_LIFETIME).count, 3
+        )
+
+        cache.clear()  # شمارنده از دست رفته از مقدار ذخیره‌شده ادامه پیدا می‌کند
+        self.assertEqual(self.client.post('/users/use-feature/').status_code, 403)
+
+    def test_plan_quota_limits_subscribers(self):
+        plan = SubscriptionPlan.objects.create(name='Lite', price=1000, duration_days=30)
+        FeatureQuota.objects.create(plan=plan, feature=metering.FEATURE_DIAGNOSIS, window=metering.WINDOW_DAY, limit=4)
+        self.client.post('/subscription/buy/', {'plan_id': plan.id})
+        self.user.refresh_from_db()
+
+        check_free_diagnosis_quota(self.user, requested=3)
+        with self.assertRaises(ValidationError):
+            check_free_diagnosis_quota(self.user, requested=2)
+        check_free_diagnosis_quota(self.user)
+        usage = metering.usage(self.user)[metering.FEATURE_DIAGNOSIS][metering.WINDOW_DAY]
+        self.assertEqual(usage, {'used': 4, 'limit': 4})
+
+
+class SubscriptionExpiryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        plan = SubscriptionPlan.objects.create(name='Yearly', price=1000, duration_days=365)
+        self.users = [
+            User.objects.create_user(username=f'sub{i}', password='pass', phone_number=f'0912000010{i}') for i in range(4)
+        ]
+        now = timezone.now()
+        ends = [now - timedelta(days=1), now - timedelta(hours=1), now + timedelta(days=3), now + timedelta(days=10)]
+        self.subs = [
+            Subscription.objects.create(user=user, plan=plan if i else None, expired_at=end)
+            for i, (user, end) in enumerate(zip(self.users, ends))
+        ]
+
+    def test_chunked_run_is_set_based_and_idempotent(self):
+        for user in self.users:
+            entitlement.get_entitlement(user.pk)
+        now = timezone.now()
+        self.assertEqual(expiry.send_reminders(now, chunk_size=1), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expiry.expire_subscriptions(now, chunk_size=1), 2)
+        expiry.send_reminders(now, chunk_size=1)
+        self.assertEqual(expiry.expire_subscriptions(now, chunk_size=1), 0)
+
+        self.assertEqual(
+            list(Subscription.objects.order_by('id').values_list('is_active', flat=True)), [False, False, True, True]
+        )
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertIn('Yearly', Notification.objects.get(user=self.users[2]).message)
+        self.assertNotIn('پلن', Notification.objects.get(user=self.users[0]).message)
+        self.assertIsNone(cache.get(entitlement.record_key(self.users[0].pk)))
+        self.assertIsNotNone(cache.get(entitlement.record_key(self.users[3].pk)))
+        self.assertEqual(
+            list(User.objects.order_by('id').values_list('subscription_plan_id', flat=True)),
+            [None, None, self.subs[2].plan_id, self.subs[3].plan_id],
+        )
+
+
+class DenormalizedEntitlementTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plan = SubscriptionPlan.objects.create(name='Monthly', price=1000, duration_days=30)
+        self.user = User.objects.create_user(username='denorm', password='pass', phone_number='09120000111')
+
+    def test_subscription_changes_sync_user_and_reconcile_repairs_drift(self):
+        sub = Subscription.objects.create(user=self.user, plan=self.plan, expired_at=timezone.now() + timedelta(days=30))
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.subscription_plan_id, self.user.subscription_expires_at), (self.plan.id, sub.expired_at))
+
+        sub.is_active = False
+        sub.save()
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.has_active_subscription)
 
-# Create your tests here.
+        # تغییر مستقیم بدون سیگنال: اختلاف با دستور reconcile اصلاح می‌شود
+        Subscription.objects.filter(pk=sub.pk).update(is_active=True)
+        call_command('reconcile_entitlements', '--dry-run', stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.has_active_subscription)
+        call_command('reconcile_entitlements', '--batch-size', '1', stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.has_active_subscription)
+        self.assertEqual(entitlement.reconcile_users()[1], [])
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     PlansView, BuySubscriptionView, MyPaymentsView, MyNotificationsView,
-    SendReminderView, AdminPlansView, AdminPlanDetailView, AdminPaymentsView, AdminStatsView
+    SendReminderView, EntitlementView, AdminPlansView, AdminPlanDetailView, AdminPaymentsView, AdminStatsView
 )
 
 urlpatterns = [
@@ -10,6 +10,7 @@ urlpatterns = [
     path('my-payments/', MyPaymentsView.as_view()),
     path('my-notifications/', MyNotificationsView.as_view()),
     path('remember/', SendReminderView.as_view()),
+    path('entitlement/', EntitlementView.as_view()),
 
     path('admin/plans/', AdminPlansView.as_view()),
     path('admin/plans/<int:pk>/', AdminPlanDetailView.as_view()),
@@ -7,14 +7,22 @@ from .serializers import (
 from django.utils import timezone
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import generics
+from utils.pagination import StartAtCursorPagination, paginate
+from .services import entitlement, metering
+from .services.entitlement import active_subscriptions
+from analytics.models import DailyMetric
+from analytics.services.rollups import gauge_value
 
 
 
 class SubscriptionListCreateView(generics.ListCreateAPIView):
     serializer_class = SubscriptionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StartAtCursorPagination
+
     def get_queryset(self):
-        return Subscription.objects.filter(user=self.request.user).order_by('-started_at')
+        return Subscription.objects.filter(user=self.request.user).select_related('plan')
+
     def create(self, request, *args, **kwargs):
         plan_id = request.data.get("plan_id")
         try:
@@ -23,9 +31,8 @@ class SubscriptionListCreateView(generics.ListCreateAPIView):
             return Response({"detail": "پلن وجود ندارد."}, status=400)
         now = timezone.now()
 
-        subs = Subscription.objects.filter(user=request.user, is_active=True, expired_at__gt=now)
-        if subs.exists():
-            sub = subs.first()
+        sub = active_subscriptions(request.user.pk, now).order_by('-expired_at').first()
+        if sub:
 
             sub.expired_at = sub.expired_at + timezone.timedelta(days=plan.duration_days)
             sub.plan = plan
@@ -81,7 +88,7 @@ class BuySubscriptionView(APIView):
 
         now = timezone.now()
         user = request.user
-        active_sub = Subscription.objects.filter(user=user, is_active=True, expired_at__gte=now).last()
+        active_sub = active_subscriptions(user.pk, now).order_by('-expired_at').first()
         if active_sub:
             active_sub.expired_at += timezone.timedelta(days=plan.duration_days)
             active_sub.plan = plan
@@ -111,27 +118,43 @@ class BuySubscriptionView(APIView):
             "message": "خرید و تمدید با موفقیت انجام شد.",
             "subscription": SubscriptionSerializer(sub).data
         })
+def payments_queryset(request):
+    # پلن تو در تو با یک JOIN خوانده می‌شود، نه یک کوئری برای هر پرداخت
+    payments = PaymentHistory.objects.all()
+    if PaymentHistorySerializer.wants_field(request, 'plan'):
+        payments = payments.select_related('plan')
+    return payments
+
+
 class MyPaymentsView(APIView):
     permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return payments_queryset(self.request).filter(user=self.request.user)
+
     def get(self, request):
-        payments = PaymentHistory.objects.filter(user=request.user)
-        return Response({"history": PaymentHistorySerializer(payments, many=True).data})
+        payments, links = paginate(self, request, self.get_queryset())
+        context = {'request': request}
+        return Response({"history": PaymentHistorySerializer(payments, many=True, context=context).data, **links})
 
 class MyNotificationsView(APIView):
     permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Notification.objects.filter(user=self.request.user)
+
     def get(self, request):
-        qs = Notification.objects.filter(user=request.user).order_by('-created_at')[:50]
-        return Response({"notifications": NotificationSerializer(qs, many=True).data})
+        qs, links = paginate(self, request, self.get_queryset())
+        context = {'request': request}
+        return Response({"notifications": NotificationSerializer(qs, many=True, context=context).data, **links})
 
 class SendReminderView(APIView):
     permission_classes = [IsAuthenticated]
     def post(self, request):
-        now = timezone.now()
-        subs = Subscription.objects.filter(user=request.user, is_active=True, expired_at__gte=now)
-        if not subs.exists():
+        current = entitlement.get_entitlement(request.user)
+        if not current.is_subscriber:
             return Response({"error": "اشتراک فعالی ندارید!"}, status=400)
-        sub = subs.last()
-        days_left = (sub.expired_at - now).days
+        days_left = (current.expires_at - timezone.now()).days
         if 1 < days_left <= 3:
             Notification.objects.create(
                 user=request.user,
@@ -141,6 +164,13 @@ class SendReminderView(APIView):
         return Response({"detail": f"{days_left} روز تا پایان باقی مانده."})
 
 
+class EntitlementView(APIView):
+    # وضعیت اشتراک، سهمیه رایگان باقی‌مانده و مصرف هر قابلیت در بازه‌های پلن؛ از کش
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        return Response({**entitlement.summary(request.user), 'usage': metering.usage(request.user)})
+
+
 class AdminPlansView(APIView):
     permission_classes = [IsAdminUser]
     def get(self, request):
@@ -176,14 +206,16 @@ class AdminPlanDetailView(APIView):
 class AdminPaymentsView(APIView):
     permission_classes = [IsAdminUser]
     def get(self, request):
-        payments = PaymentHistory.objects.all().order_by('-created_at')
-        return Response({"all_payments": PaymentHistorySerializer(payments, many=True).data})
+        payments, links = paginate(self, request, payments_queryset(request))
+        context = {'request': request}
+        return Response({"all_payments": PaymentHistorySerializer(payments, many=True, context=context).data, **links})
 
 class AdminStatsView(APIView):
     permission_classes = [IsAdminUser]
     def get(self, request):
-        n_purchases = PaymentHistory.objects.filter(is_successful=True).count()
-        n_active_subs = Subscription.objects.filter(is_active=True, expired_at__gte=timezone.now()).count()
+        # از شاخص‌های تجمیعی analytics خوانده می‌شود (دو کوئری روی ایندکس، مستقل از حجم پرداخت‌ها و اشتراک‌ها)
+        n_purchases = gauge_value(DailyMetric.PURCHASES_TOTAL)
+        n_active_subs = gauge_value(DailyMetric.ACTIVE_SUBSCRIPTIONS)
         return Response({
             "فهرست کلی اشتراک ها": n_purchases,
             "اشتراک های فعال": n_active_subs
@@ -6,6 +6,6 @@ from .models import CustomUser
 class CustomUserAdmin(UserAdmin):
     list_display = (
         'username', 'first_name', 'last_name', 'phone_number',
-        'is_phone_verified', 'feature_usage_count', 'is_active'
+        'is_phone_verified', 'feature_usage_count', 'subscription_expires_at', 'is_active'
     )
-    readonly_fields = ('feature_usage_count', 'sms_code', 'sms_code_expiry')
+    readonly_fields = ('feature_usage_count', 'subscription_plan', 'subscription_expires_at', 'sms_code', 'sms_code_expiry')
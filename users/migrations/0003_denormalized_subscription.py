@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
+
+
+def backfill_subscription_state(apps, schema_editor):
+    # اشتراک فعالی که دیرتر از همه تمام می‌شود، با یک UPDATE برای همه کاربران دارای اشتراک فعال
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Subscription = apps.get_model('subscription', 'Subscription')
+    latest = Subscription.objects.filter(
+        user_id=OuterRef('pk'), is_active=True, expired_at__gt=timezone.now()
+    ).order_by('-expired_at')
+    CustomUser.objects.filter(Exists(latest)).update(
+        subscription_plan=Subquery(latest.values('plan_id')[:1]),
+        subscription_expires_at=Subquery(latest.values('expired_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0008_notification_dedup_key'),
+        ('users', '0002_remove_customuser_subscription_end_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='subscription_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='subscription_plan',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='subscription.subscriptionplan'),
+        ),
+        migrations.RunPython(backfill_subscription_state, migrations.RunPython.noop),
+    ]
@@ -8,17 +8,20 @@ class CustomUser(AbstractUser):
     feature_usage_count = models.PositiveIntegerField(default=0)  
     sms_code = models.CharField(max_length=5, blank=True, null=True)
     sms_code_expiry = models.DateTimeField(blank=True, null=True)
+    # وضعیت اشتراک فعلی (denormalized)؛ با تغییر Subscription یا PaymentHistory در همان transaction به‌روز می‌شود
+    # (subscription/services/entitlement.sync_users) و همراه کاربر احراز هویت‌شده بدون کوئری اضافه خوانده می‌شود
+    subscription_plan = models.ForeignKey('subscription.SubscriptionPlan', on_delete=models.SET_NULL, null=True,
+                                          blank=True, editable=False, related_name='+')
+    subscription_expires_at = models.DateTimeField(blank=True, null=True, editable=False)
     REQUIRED_FIELDS = ['phone_number', 'email']
 
     def reset_usage_count(self):
+        from subscription.services import metering
+
         self.feature_usage_count = 0
-        self.save()
+        self.save(update_fields=['feature_usage_count'])
+        metering.reset(self, metering.FEATURE_APP)
 
     @property
     def has_active_subscription(self):
-       
-        sub = getattr(self, "subscription_set", None)
-        if not sub:
-            return False
-        active_sub = self.subscription_set.filter(is_active=True, expire_at__gte=now()).last()
-        return bool(active_sub)
+        return self.subscription_expires_at is not None and self.subscription_expires_at > now()
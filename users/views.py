@@ -7,6 +7,8 @@ from django.utils import timezone
 from .models import CustomUser
 from .serializers import RegisterSerializer, LoginSerializer , CustomUserSerializer
 from .utils import generate_otp, send_sms
+from subscription.services import metering
+from subscription.services.entitlement import QuotaExceeded
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
@@ -136,14 +138,16 @@ class AuthFeatureView(APIView):
     def post(self, request):
         user = request.user
        
-        if hasattr(user, "has_active_subscription") and user.has_active_subscription:
+        # مشترکانی که پلنشان سقفی برای این قابلیت ندارد شمرده نمی‌شوند
+        if user.has_active_subscription and not metering.limits(user, metering.FEATURE_APP):
             return Response({"message": "دسترسی کامل به علت داشتن اشتراک فعال."})
-        
-        if user.feature_usage_count < 3:
-            user.feature_usage_count += 1
-            user.save()
-            return Response({"message": f"اجازه شماره {user.feature_usage_count} برای استفاده از گیاه‌یار."})
-        return Response({"error": "حداکثر ۳ بار حق استفاده! برای ادامه باید اشتراک بخرید."}, status=403)
+
+        # شمارش اتمیک در کش (metering)؛ جدول کاربران در این مسیر نوشته نمی‌شود و تسک flush آن را همگام می‌کند
+        try:
+            used = metering.consume(user, metering.FEATURE_APP)
+        except QuotaExceeded as e:
+            return Response({"error": f"حداکثر {e.limit} بار حق استفاده! برای ادامه باید اشتراک بخرید."}, status=403)
+        return Response({"message": f"اجازه شماره {max(used.values())} برای استفاده از گیاه‌یار."})
 
 # خروج
 from rest_framework_simplejwt.tokens import RefreshToken
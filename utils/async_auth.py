@@ -0,0 +1,24 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+
+async def aauthenticate(request):
+    """
+    احراز هویت JWT برای viewهای async جنگو (خارج از DRF).
+    بدون هدر Authorization کاربر ناشناس برمی‌گردد؛ توکن نامعتبر AuthenticationFailed می‌دهد.
+    """
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except (InvalidToken, TokenError) as e:
+        raise AuthenticationFailed(str(e))
+    if result is None:
+        return AnonymousUser()
+    return result[0]
+
+
+def error_response(detail, status):
+    return JsonResponse(detail if isinstance(detail, dict) else {'detail': detail}, status=status)
@@ -0,0 +1,490 @@
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from io import BytesIO
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .seed import seed_dataset
+
+STUB_PLANT_ID = {
+    "suggestions": [{"plant_name": "Monstera deliciosa", "probability": 0.93,
+                     "plant_details": {"common_names": ["مونسترا"]}}],
+    "health_assessment": {"is_healthy": True},
+    "images": [{"file_name": "leaf.png", "url": "https://plant.id/media/leaf.png"}],
+}
+STUB_GEMINI = {"candidates": [{"content": {"parts": [{"text": "هفته‌ای یک بار آبیاری کنید."}]}}]}
+STUB_GEMINI_STREAM = [
+    'data: {"candidates": [{"content": {"parts": [{"text": "هفته‌ای "}]}}]}\r\n\r\n',
+    'data: {"candidates": [{"content": {"parts": [{"text": "یک بار آبیاری کنید."}]}}]}\r\n\r\n',
+]
+# پرسش‌های تکراری کاربران؛ بخشی از پاسخ‌ها از کش چت می‌آیند، مثل ترافیک واقعی
+CHAT_QUESTIONS = [
+    'هر چند وقت یک بار مونسترا را آب بدهم؟', 'برگ‌های فیکوس زرد شده، چه کنم؟', 'کاکتوس به چه نوری نیاز دارد؟',
+    'بهترین خاک برای ارکیده چیست؟', 'چرا نوک برگ‌های پوتوس قهوه‌ای می‌شود؟',
+]
+
+ACTOR_ANON = 'anon'
+ACTOR_USER = 'user'
+ACTOR_ADMIN = 'admin'
+
+
+@dataclass
+class Scenario:
+    """
+    یک endpoint در ترکیب درخواست‌ها. build(bench, rng) قبل از زمان‌گیری اجرا می‌شود (ساخت داده لازم مثل گیاه تازه)
+    و دیکشنری path / data / actor / format / session (ورود با session ادمین) برمی‌گرداند. route همان الگوی urls.py است برای بررسی پوشش.
+    """
+    name: str
+    route: str
+    method: str
+    weight: int
+    build: object
+
+
+def make_image(color=(30, 140, 60)):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format='PNG')
+    return SimpleUploadedFile('leaf.png', buffer.getvalue(), content_type='image/png')
+
+
+def percentile(sorted_values, q):
+    """صدک به روش nearest-rank روی لیست مرتب‌شده"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkData:
+    """داده seed شده و شمارنده‌های یکتا برای ساخت درخواست‌ها؛ روی دیتابیس موقت بنچمارک ساخته می‌شود"""
+
+    def __init__(self, prefix, volumes):
+        from plants.models import Plant, PlantDiagnosis
+        from subscription.models import SubscriptionPlan
+
+        self.prefix = prefix
+        self.volumes = volumes
+        self.seeded = seed_dataset(volumes, prefix=prefix)
+        self.user_ids = self.seeded['user_ids']
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username=f'{prefix}-admin', phone_number=f'+99{zlib.crc32(prefix.encode()) % 10 ** 9:09d}',
+            is_staff=True, is_superuser=True,
+        )
+        self.plans = list(SubscriptionPlan.objects.filter(name__startswith=prefix).values_list('id', flat=True))
+        self.plants = defaultdict(list)
+        for plant_id, user_id in Plant.objects.filter(user_id__in=self.user_ids).values_list('id', 'user_id'):
+            self.plants[user_id].append(plant_id)
+        self.diagnoses = defaultdict(list)
+        rows = PlantDiagnosis.objects.filter(plant__user_id__in=self.user_ids).values_list('id', 'plant__user_id')
+        for diagnosis_id, user_id in rows:
+            self.diagnoses[user_id].append(diagnosis_id)
+        self.phones = dict(User.objects.filter(id__in=self.user_ids).values_list('id', 'phone_number'))
+        self.tokens = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def unique(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def token(self, user_id):
+        if user_id not in self.tokens:
+            self.tokens[user_id] = str(RefreshToken.for_user(get_user_model()(pk=user_id)).access_token)
+        return self.tokens[user_id]
+
+    def user(self, rng):
+        return rng.choice(self.user_ids)
+
+    def fresh_plant(self):
+        """کاربر و گیاه تازه بدون تشخیص قبلی، تا سقف تشخیص رایگان مانع درخواست‌های تشخیص نشود"""
+        from plants.models import Plant
+
+        n = self.unique()
+        user = get_user_model().objects.create(
+            username=f'{self.prefix}-fresh-{n}', phone_number=f'+98{zlib.crc32(self.prefix.encode()) % 1000:03d}{n:07d}',
+        )
+        plant = Plant.objects.bulk_create([Plant(user=user, name=f'{self.prefix} fresh {n}', image='plants/seed.png')])[0]
+        return user.id, plant.id
+
+    def set_sms_code(self, user_id, code='12345'):
+        get_user_model().objects.filter(pk=user_id).update(
+            sms_code=code, sms_code_expiry=timezone.now() + timezone.timedelta(minutes=5),
+        )
+        return code
+
+
+# ======================================================
+# ترکیب درخواست‌ها؛ وزن‌ها نسبت تقریبی ترافیک اپلیکیشن موبایل هستند (بیشتر خواندن لیست‌ها و داشبورد)
+
+def _user_request(path, **extra):
+    def build(bench, rng):
+        user_id = bench.user(rng)
+        plants = bench.plants[user_id] or [0]
+        diagnoses = bench.diagnoses[user_id] or [0]
+        return {
+            'actor': user_id,
+            'path': path.format(plant=rng.choice(plants), diagnosis=rng.choice(diagnoses)),
+            **extra,
+        }
+    return build
+
+
+def _admin_request(path, **extra):
+    return lambda bench, rng: {'actor': ACTOR_ADMIN, 'path': path, **extra}
+
+
+def _anon_request(path, **extra):
+    return lambda bench, rng: {'actor': ACTOR_ANON, 'path': path, **extra}
+
+
+def _create_plant(bench, rng):
+    return {'actor': bench.user(rng), 'path': '/plants/plants/', 'format': 'multipart',
+            'data': {'name': f'{bench.prefix} new plant', 'species': 'ficus', 'watering_frequency': 7,
+                     'image': make_image()}}
+
+
+def _update_plant(bench, rng):
+    user_id = bench.user(rng)
+    return {'actor': user_id, 'path': f'/plants/{rng.choice(bench.plants[user_id])}/',
+            'data': {'description': f'{bench.prefix} note {bench.unique()}'}}
+
+
+def _diagnose(path):
+    def build(bench, rng):
+        user_id, plant_id = bench.fresh_plant()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        return {'actor': user_id, 'path': path.format(plant=plant_id), 'format': 'multipart',
+                'data': {'plant': plant_id, 'image': make_image(color), 'images': [make_image(color)]}}
+    return build
+
+
+def _bulk_diagnose(bench, rng):
+    user_id, plant_id = bench.fresh_plant()
+    return {'actor': user_id, 'path': '/plants/diagnose/bulk/', 'format': 'multipart',
+            'data': {f'images_{plant_id}': [make_image()]}}
+
+
+def _water(bench, rng):
+    user_id = bench.user(rng)
+    plant_id = rng.choice(bench.plants[user_id])
+    return {'actor': user_id, 'path': f'/plants/{plant_id}/water/', 'data': {'plant': plant_id, 'note': 'benchmark'}}
+
+
+def _register(bench, rng):
+    n = bench.unique()
+    return {'actor': ACTOR_ANON, 'path': '/users/register/',
+            'data': {'username': f'{bench.prefix}-new-{n}', 'password': 'bench-pass-123', 'first_name': 'بنچ',
+                     'last_name': 'مارک', 'phone_number': f'+97{zlib.crc32(bench.prefix.encode()) % 1000:03d}{n:07d}'}}
+
+
+def _verify_phone(bench, rng):
+    user_id = bench.user(rng)
+    return {'actor': ACTOR_ANON, 'path': '/users/verify-phone/',
+            'data': {'phone_number': bench.phones[user_id], 'sms_code': bench.set_sms_code(user_id)}}
+
+
+def _login(bench, rng):
+    return {'actor': ACTOR_ANON, 'path': '/users/login/', 'data': {'phone_number': bench.phones[bench.user(rng)]}}
+
+
+def _login_username(bench, rng):
+    return {'actor': ACTOR_ANON, 'path': '/users/user-login/', 'data': {'username': f'{bench.prefix}-user-0'}}
+
+
+def _login_otp(bench, rng):
+    user_id = bench.user(rng)
+    return {'actor': ACTOR_ANON, 'path': '/users/login-otp/',
+            'data': {'phone_number': bench.phones[user_id], 'sms_code': bench.set_sms_code(user_id)}}
+
+
+def _logout(bench, rng):
+    user_id = bench.user(rng)
+    refresh = RefreshToken.for_user(get_user_model()(pk=user_id))
+    return {'actor': user_id, 'path': '/users/logout/', 'data': {'refresh': str(refresh)}}
+
+
+def _buy(bench, rng):
+    return {'actor': bench.user(rng), 'path': '/subscription/buy/', 'data': {'plan_id': rng.choice(bench.plans)}}
+
+
+def _update_plan(bench, rng):
+    plan_id = rng.choice(bench.plans)
+    return {'actor': ACTOR_ADMIN, 'path': f'/subscription/admin/plans/{plan_id}/',
+            'data': {'name': f'{bench.prefix} plan {plan_id}', 'price': 30000, 'duration_days': 30}}
+
+
+def _chat(path):
+    def build(bench, rng):
+        actor = bench.user(rng) if rng.random() < 0.7 else ACTOR_ANON
+        return {'actor': actor, 'path': path, 'data': {'message': f'{bench.prefix} {rng.choice(CHAT_QUESTIONS)}'}}
+    return build
+
+
+def _register_device(bench, rng):
+    user_id = bench.user(rng)
+    return {'actor': user_id, 'path': '/fcm/fcm-device/',
+            'data': {'registration_id': f'{bench.prefix}-device-{bench.unique()}-{"x" * 40}', 'region': 'tehran'}}
+
+
+def _delete_device(bench, rng):
+    from notifications.models import FCMDevice
+
+    user_id = bench.user(rng)
+    device = FCMDevice.objects.create(user_id=user_id, registration_id=f'{bench.prefix}-gone-{bench.unique()}-{"x" * 30}')
+    return {'actor': user_id, 'path': f'/fcm/device/delete/{device.id}/'}
+
+
+def _broadcast(bench, rng):
+    return {'actor': ACTOR_ADMIN, 'path': '/fcm/broadcast/',
+            'data': {'kind': 'region', 'value': 'tehran', 'title': 'هشدار یخبندان', 'body': 'گیاهان را داخل ببرید.',
+                     'idempotency_key': f'{bench.prefix}-{bench.unique()}'}}
+
+
+SCENARIOS = [
+    Scenario('plant_list', 'plants/plants/', 'get', 20, _user_request('/plants/plants/')),
+    Scenario('plant_create', 'plants/plants/', 'post', 2, _create_plant),
+    Scenario('care_dashboard', 'plants/dashboard/', 'get', 20, _user_request('/plants/dashboard/')),
+    Scenario('plant_detail', 'plants/<int:pk>/', 'get', 10, _user_request('/plants/{plant}/')),
+    Scenario('plant_update', 'plants/<int:pk>/', 'patch', 2, _update_plant),
+    Scenario('diagnose', 'plants/<int:pk>/diagnose/', 'post', 1, _diagnose('/plants/{plant}/diagnose/?mode=sync')),
+    Scenario('diagnose_async', 'plants/<int:pk>/diagnose-async/', 'post', 1,
+             _diagnose('/plants/{plant}/diagnose-async/?mode=sync')),
+    Scenario('diagnose_bulk', 'plants/diagnose/bulk/', 'post', 1, _bulk_diagnose),
+    Scenario('diagnosis_list', 'plants/diagnoses/', 'get', 8, _user_request('/plants/diagnoses/')),
+    Scenario('diagnosis_detail', 'plants/diagnoses/<int:pk>/', 'get', 4, _user_request('/plants/diagnoses/{diagnosis}/')),
+    Scenario('diagnosis_status', 'plants/diagnoses/<int:pk>/status/', 'get', 4,
+             _user_request('/plants/diagnoses/{diagnosis}/status/')),
+    Scenario('diagnosis_cache_stats', 'plants/diagnoses/cache-stats/', 'get', 1,
+             _admin_request('/plants/diagnoses/cache-stats/')),
+    Scenario('water_plant', 'plants/<int:pk>/water/', 'post', 8, _water),
+    Scenario('watering_logs', 'plants/<int:pk>/watering-logs/', 'get', 6, _user_request('/plants/{plant}/watering-logs/')),
+    Scenario('watering_schedules', 'plants/watering-schedules/', 'get', 2, _user_request('/plants/watering-schedules/')),
+
+    Scenario('guest_feature', 'users/guest-feature/', 'post', 1, _anon_request('/users/guest-feature/')),
+    Scenario('register', 'users/register/', 'post', 1, _register),
+    Scenario('profile', 'users/profile/', 'get', 5, _user_request('/users/profile/')),
+    Scenario('verify_phone', 'users/verify-phone/', 'post', 1, _verify_phone),
+    Scenario('login', 'users/login/', 'post', 1, _login),
+    Scenario('login_username', 'users/user-login/', 'post', 1, _login_username),
+    Scenario('login_otp', 'users/login-otp/', 'post', 1, _login_otp),
+    Scenario('use_feature', 'users/use-feature/', 'post', 2, _user_request('/users/use-feature/')),
+    Scenario('logout', 'users/logout/', 'post', 1, _logout),
+
+    Scenario('plans', 'subscription/plans/', 'get', 3, _anon_request('/subscription/plans/')),
+    Scenario('buy_subscription', 'subscription/buy/', 'post', 1, _buy),
+    Scenario('my_payments', 'subscription/my-payments/', 'get', 3, _user_request('/subscription/my-payments/')),
+    Scenario('my_notifications', 'subscription/my-notifications/', 'get', 3,
+             _user_request('/subscription/my-notifications/')),
+    Scenario('subscription_reminder', 'subscription/remember/', 'post', 1, _user_request('/subscription/remember/')),
+    Scenario('entitlement', 'subscription/entitlement/', 'get', 4, _user_request('/subscription/entitlement/')),
+    Scenario('admin_plans', 'subscription/admin/plans/', 'get', 1, _admin_request('/subscription/admin/plans/')),
+    Scenario('admin_plan_update', 'subscription/admin/plans/<int:pk>/', 'put', 1, _update_plan),
+    Scenario('admin_payments', 'subscription/admin/payments/', 'get', 1, _admin_request('/subscription/admin/payments/')),
+    Scenario('admin_stats', 'subscription/admin/stats/', 'get', 1, _admin_request('/subscription/admin/stats/')),
+    Scenario('analytics_metrics', 'analytics/metrics/', 'get', 1,
+             _admin_request('/analytics/metrics/?metric=revenue')),
+
+    Scenario('chat_ask', 'chat/ask/', 'post', 3, _chat('/chat/ask/')),
+    Scenario('chat_ask_async', 'chat/ask-async/', 'post', 3, _chat('/chat/ask-async/')),
+    Scenario('chat_stream', 'chat/ask-stream/', 'post', 1, _chat('/chat/ask-stream/')),
+    Scenario('chat_stream_async', 'chat/ask-stream-async/', 'post', 1, _chat('/chat/ask-stream-async/')),
+    Scenario('chat_cache', 'chat/cache/', 'get', 1, _admin_request('/chat/cache/')),
+    Scenario('chat_context', 'chat/context/', 'get', 2, _user_request('/chat/context/')),
+
+    Scenario('fcm_register', 'fcm/fcm-device/', 'post', 2, _register_device),
+    Scenario('fcm_devices', 'fcm/device/list/', 'get', 3, _user_request('/fcm/device/list/')),
+    Scenario('fcm_device_delete', 'fcm/device/delete/<int:pk>/', 'delete', 1, _delete_device),
+    Scenario('fcm_broadcast', 'fcm/broadcast/', 'post', 1, _broadcast),
+
+    Scenario('admin_index', 'admin/', 'get', 1, _admin_request('/admin/', session=True)),
+    Scenario('metrics', 'metrics/', 'get', 1, _admin_request('/metrics/', session=True)),
+    Scenario('swagger', 'swagger/', 'get', 1, _anon_request('/swagger/?format=openapi')),
+    Scenario('redoc', 'redoc/', 'get', 1, _anon_request('/redoc/')),
+]
+
+
+def project_routes(patterns=None, prefix=''):
+    """الگوهای URL پروژه؛ زیرمسیرهای پنل ادمین جنگو با همان admin/ شمرده می‌شوند"""
+    routes = []
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if getattr(pattern, 'app_name', None) == 'admin':
+                routes.append(route)
+            else:
+                routes.extend(project_routes(pattern.url_patterns, route))
+        else:
+            routes.append(route)
+    return routes
+
+
+def uncovered_routes(scenarios=SCENARIOS):
+    covered = {scenario.route for scenario in scenarios}
+    return [route for route in project_routes() if route not in covered]
+
+
+class BenchmarkRunner:
+    """
+    اجرای ترکیب وزنی درخواست‌ها با test Client جنگو (کل middleware و view، بدون شبکه) در concurrency thread.
+    هر endpoint حداقل یک بار اجرا می‌شود. تعداد کوئری هر درخواست روی اتصال همان thread شمرده می‌شود.
+    """
+
+    def __init__(self, bench, scenarios=SCENARIOS, random_seed=42):
+        self.bench = bench
+        self.scenarios = scenarios
+        self.rng = random.Random(random_seed)
+        self._local = threading.local()
+
+    def plan(self, total):
+        picks = self.rng.choices(self.scenarios, weights=[s.weight for s in self.scenarios],
+                                 k=max(0, total - len(self.scenarios)))
+        plan = list(self.scenarios) + picks
+        self.rng.shuffle(plan)
+        return [(scenario, scenario.build(self.bench, self.rng)) for scenario in plan]
+
+    def client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = Client()
+        return self._local.client
+
+    def headers(self, actor):
+        if actor == ACTOR_ANON:
+            return {}
+        user_id = self.bench.admin.id if actor == ACTOR_ADMIN else actor
+        return {'HTTP_AUTHORIZATION': f'Bearer {self.bench.token(user_id)}'}
+
+    def execute(self, item):
+        scenario, request = item
+        client = self.client()
+        kwargs = self.headers(request['actor'])
+        if scenario.method == 'get':
+            call = lambda: client.get(request['path'], **kwargs)
+        elif request.get('format') == 'multipart':
+            call = lambda: getattr(client, scenario.method)(request['path'], request['data'], **kwargs)
+        else:
+            call = lambda: getattr(client, scenario.method)(
+                request['path'], json.dumps(request.get('data') or {}), content_type='application/json', **kwargs,
+            )
+        if admin_session := request.get('session', False):
+            client.force_login(self.bench.admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                response = call()
+                if response.streaming:
+                    self.consume(response)
+                status = response.status_code
+            except Exception as e:
+                status = f'error: {type(e).__name__}'
+            elapsed = time.perf_counter() - started
+        if admin_session:
+            client.logout()
+        return scenario.name, status, elapsed, len(queries)
+
+    @staticmethod
+    def consume(response):
+        content = response.streaming_content
+        if hasattr(content, '__aiter__'):
+            async def drain():
+                return [chunk async for chunk in content]
+            return async_to_sync(drain)()
+        return list(content)
+
+    def run(self, total, concurrency=1):
+        plan = self.plan(total)
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(self.execute, plan))
+        else:
+            samples = [self.execute(item) for item in plan]
+        return summarize(samples, time.perf_counter() - started)
+
+
+def summarize(samples, wall_seconds):
+    """p50/p95/p99، توان عملیاتی و تعداد کوئری برای هر endpoint و کل اجرا"""
+    grouped = defaultdict(list)
+    for name, status, elapsed, queries in samples:
+        grouped[name].append((status, elapsed, queries))
+
+    def stats(rows, seconds):
+        latencies = sorted(elapsed for _, elapsed, _ in rows)
+        query_counts = [queries for _, _, queries in rows]
+        statuses = Counter(str(status) for status, _, _ in rows)
+        return {
+            'requests': len(rows),
+            'errors': sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500),
+            'statuses': dict(sorted(statuses.items())),
+            'rps': round(len(rows) / seconds, 1) if seconds else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries_mean': round(sum(query_counts) / len(query_counts), 1),
+            'queries_max': max(query_counts),
+        }
+
+    endpoints = {}
+    for name, rows in sorted(grouped.items()):
+        # توان عملیاتی یک endpoint: درخواست بر ثانیه زمان صرف‌شده در همان endpoint (معادل یک worker)
+        endpoints[name] = stats(rows, sum(elapsed for _, elapsed, _ in rows))
+    all_rows = [row for rows in grouped.values() for row in rows]
+    return {'total': {**stats(all_rows, wall_seconds), 'seconds': round(wall_seconds, 2)}, 'endpoints': endpoints}
+
+
+def build_report(result, volumes, options):
+    return {
+        'commit': current_commit(),
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'volumes': asdict(volumes),
+        'options': options,
+        'uncovered_routes': uncovered_routes(),
+        **result,
+    }
+
+
+def compare_reports(current, previous):
+    """تغییر p95 و توان عملیاتی هر endpoint نسبت به اجرای قبلی (درصد)؛ برای endpointهای مشترک"""
+    def delta(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    rows = {}
+    for name, stats in current['endpoints'].items():
+        old = previous.get('endpoints', {}).get(name)
+        if old:
+            rows[name] = {
+                'p95_ms': (old['p95_ms'], stats['p95_ms'], delta(stats['p95_ms'], old['p95_ms'])),
+                'rps': (old['rps'], stats['rps'], delta(stats['rps'], old['rps'])),
+                'queries_mean': (old['queries_mean'], stats['queries_mean']),
+            }
+    return rows
@@ -0,0 +1,205 @@
+import asyncio
+import contextlib
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from .metrics import registry
+from .profiling import OUTBOUND_LATENCY_METRIC, record_outbound
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundClient:
+    """
+    کلاینت HTTP مشترک برای یک میزبان بیرونی (Plant.id، Gemini و ...).
+    اتصال‌ها در pool نگه داشته می‌شوند (keep-alive و در صورت پشتیبانی HTTP/2)
+    تا درخواست‌های پشت‌سرهم در یک worker دوباره handshake ‌TCP/TLS انجام ندهند.
+    """
+    client_class = httpx.Client
+
+    def __init__(self, host, pool_size=None, keepalive=None, connect_timeout=None, read_timeout=None, http2=None):
+        self.host = host
+        pool_size = pool_size or settings.OUTBOUND_HTTP_POOL_SIZE
+        keepalive = keepalive or settings.OUTBOUND_HTTP_KEEPALIVE
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout or settings.OUTBOUND_HTTP_CONNECT_TIMEOUT,
+            read=read_timeout or settings.OUTBOUND_HTTP_READ_TIMEOUT,
+            write=read_timeout or settings.OUTBOUND_HTTP_READ_TIMEOUT,
+            pool=connect_timeout or settings.OUTBOUND_HTTP_CONNECT_TIMEOUT,
+        )
+        self.client = self.client_class(
+            http2=settings.OUTBOUND_HTTP2 if http2 is None else http2,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=keepalive),
+            timeout=self.timeout,
+        )
+        self.latency = registry.histogram(OUTBOUND_LATENCY_METRIC, host=host)
+
+    def apply_timeout(self, timeout, kwargs):
+        """timeout اختیاری: فقط read همین درخواست عوض می‌شود؛ connect، write و pool از تنظیمات کلاینت می‌مانند"""
+        if timeout is not None:
+            kwargs['timeout'] = httpx.Timeout(
+                connect=self.timeout.connect, read=timeout, write=self.timeout.write, pool=self.timeout.pool,
+            )
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.apply_timeout(timeout, kwargs)
+        started = time.perf_counter()
+        try:
+            return self.client.request(method, url, **kwargs)
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def observe(self, seconds):
+        self.latency.observe(seconds)
+        record_outbound(seconds)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    @contextlib.contextmanager
+    def stream(self, method, url, timeout=None, **kwargs):
+        """پاسخ بدون خواندن بدنه (برای SSE و پاسخ‌های طولانی)؛ زمان تا بسته شدن پاسخ ثبت می‌شود"""
+        self.apply_timeout(timeout, kwargs)
+        started = time.perf_counter()
+        try:
+            with self.client.stream(method, url, **kwargs) as response:
+                yield response
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncOutboundClient(OutboundClient):
+    """نسخه async برای viewهای ASGI؛ یک pool برای هر event loop"""
+    client_class = httpx.AsyncClient
+
+    async def request(self, method, url, timeout=None, **kwargs):
+        self.apply_timeout(timeout, kwargs)
+        started = time.perf_counter()
+        try:
+            return await self.client.request(method, url, **kwargs)
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, timeout=None, **kwargs):
+        self.apply_timeout(timeout, kwargs)
+        started = time.perf_counter()
+        try:
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_client(url):
+    """کلاینت اشتراکی برای میزبانِ url؛ پس از fork (مثلاً در gunicorn) کلاینت‌های جدید ساخته می‌شوند"""
+    global _clients_pid
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = OutboundClient(parts.netloc)
+        return client
+
+
+def get_async_client(url):
+    """کلاینت async اشتراکی برای میزبانِ url در event loop جاری"""
+    global _clients_pid
+    parts = urlsplit(url)
+    loop = asyncio.get_running_loop()
+    key = (f"{parts.scheme}://{parts.netloc}", id(loop))
+
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(key)
+        if client is None:
+            # کلاینت‌های loopهای بسته‌شده (مثلاً پس از asyncio.run) دیگر قابل استفاده نیستند
+            for stale_key in [k for k, c in _clients.items() if isinstance(c, AsyncOutboundClient) and c.loop.is_closed()]:
+                del _clients[stale_key]
+            client = _clients[key] = AsyncOutboundClient(parts.netloc, pool_size=settings.OUTBOUND_HTTP_ASYNC_POOL_SIZE)
+            client.loop = loop
+        return client
+
+
+def post(url, **kwargs):
+    return get_client(url).post(url, **kwargs)
+
+
+async def apost(url, **kwargs):
+    return await get_async_client(url).post(url, **kwargs)
+
+
+def stream(method, url, **kwargs):
+    return get_client(url).stream(method, url, **kwargs)
+
+
+def astream(method, url, **kwargs):
+    return get_async_client(url).stream(method, url, **kwargs)
+
+
+def latency_snapshot():
+    """خلاصه هیستوگرام تاخیر هر میزبان: تعداد، میانگین و چندک‌های تقریبی"""
+    summary = {}
+    for (_, labels), histogram in registry.histograms(OUTBOUND_LATENCY_METRIC).items():
+        host = dict(labels)['host']
+        snapshot = histogram.snapshot()
+        summary[host] = {
+            'count': snapshot['count'],
+            'avg_seconds': round(snapshot['sum'] / snapshot['count'], 4) if snapshot['count'] else 0.0,
+            'p50_seconds': histogram.quantile(0.5),
+            'p95_seconds': histogram.quantile(0.95),
+            'p99_seconds': histogram.quantile(0.99),
+        }
+    return summary
+
+
+async def aclose_loop_clients():
+    """بستن کلاینت‌های async مربوط به event loop جاری (مثلاً پیش از پایان asyncio.run)"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        keys = [key for key, client in _clients.items()
+                if isinstance(client, AsyncOutboundClient) and client.loop is loop]
+        clients = [_clients.pop(key) for key in keys]
+    for client in clients:
+        await client.aclose()
+
+
+def close_all():
+    with _clients_lock:
+        for client in _clients.values():
+            if not isinstance(client, AsyncOutboundClient):
+                client.close()
+        _clients.clear()
@@ -0,0 +1,265 @@
+import bisect
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SHARED_PREFIX = 'metrics:'
+SHARED_INDEX_KEY = 'metrics:index'
+# مجموع زمان‌ها در کش به صورت عدد صحیح (میکروثانیه) نگه داشته می‌شود تا با INCR جمع شود
+SUM_SCALE = 1_000_000
+
+
+class Histogram:
+    """هیستوگرام تجمعی ساده با باکت‌های ثابت (مشابه Prometheus) و امن برای چند thread"""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """تخمین چندک از روی باکت‌ها (کران بالای باکتی که چندک در آن می‌افتد)"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), self.counts):
+                running += bucket_count
+                if running >= target:
+                    return bound
+        return float('inf')
+
+    def values(self):
+        """شمارش هر باکت، مجموع و تعداد در یک لحظه (برای flush به کش مشترک)"""
+        with self._lock:
+            return tuple(self.counts), self.sum, self.count
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), self.counts):
+                running += bucket_count
+                cumulative.append((bound, running))
+            return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class Counter:
+    """شمارنده افزایشی امن برای چند thread"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """
+    نگهداری هیستوگرام‌ها و شمارنده‌ها بر اساس نام و برچسب‌ها در حافظه همین پروسه.
+    هر پروسه (workerهای gunicorn/uvicorn و celery) هر METRICS_FLUSH_INTERVAL ثانیه فقط افزایش‌ها را با INCR اتمیک به
+    مجموع مشترک در کش (Redis) اضافه می‌کند؛ /metrics/ مجموع همه پروسه‌ها را می‌خواند و با restart یک worker صفر نمی‌شود.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed = {}
+        self._indexed = set()
+        self._last_flush = time.monotonic()
+        self._pid = os.getpid()
+
+    def histogram(self, name, buckets=DEFAULT_LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def histograms(self, name=None):
+        return {
+            key: histogram for key, histogram in list(self._histograms.items())
+            if name is None or key[0] == name
+        }
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def counters(self, name=None):
+        return {
+            key: counter for key, counter in list(self._counters.items())
+            if name is None or key[0] == name
+        }
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._flushed.clear()
+            self._indexed.clear()
+
+    # ======================================================
+    # جمع متریک‌های همه پروسه‌ها در کش مشترک
+    def series(self):
+        """{(name, labels): (نوع، باکت‌ها، مقادیر فعلی به صورت اعداد صحیح)}"""
+        series = {}
+        for key, counter in self.counters().items():
+            series[key] = ('counter', None, (counter.value,))
+        for key, histogram in self.histograms().items():
+            counts, total, count = histogram.values()
+            series[key] = ('histogram', histogram.buckets, (*counts, round(total * SUM_SCALE), count))
+        return series
+
+    def flush(self):
+        """افزودن افزایش‌های این پروسه از flush قبلی به مجموع مشترک در کش؛ خروجی: تعداد کلیدهای به‌روزشده"""
+        with self._flush_lock:
+            if self._pid != os.getpid():
+                # مقادیر پروسه والد پیش از fork متعلق به همان پروسه است و در فرزند دوباره شمرده نمی‌شود
+                self.clear()
+                self._pid = os.getpid()
+            self._last_flush = time.monotonic()
+
+            updated = 0
+            series = self.series()
+            for key, (_, _, current) in series.items():
+                previous = self._flushed.get(key, (0,) * len(current))
+                digest = series_digest(key)
+                for field, (value, old) in enumerate(zip(current, previous)):
+                    if value != old:
+                        shared_incr(f"{SHARED_PREFIX}{digest}:{field}", value - old)
+                        updated += 1
+                self._flushed[key] = current
+
+            unconfirmed = {series_digest(key): key for key in series if key not in self._indexed}
+            if unconfirmed:
+                # فهرست سری‌ها بدون قفل به‌روز می‌شود؛ سری‌ای که در نوشتن همزمان گم شود در flush بعدی دوباره ثبت می‌شود
+                index = cache.get(SHARED_INDEX_KEY) or {}
+                self._indexed.update(key for digest, key in unconfirmed.items() if digest in index)
+                missing = {digest: key for digest, key in unconfirmed.items() if digest not in index}
+                if missing:
+                    index.update({
+                        digest: {'kind': series[key][0], 'name': key[0], 'labels': key[1], 'buckets': series[key][1]}
+                        for digest, key in missing.items()
+                    })
+                    cache.set(SHARED_INDEX_KEY, index, None)
+            return updated
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+    def maybe_flush(self):
+        """flush اگر از آخرین flush بیش از METRICS_FLUSH_INTERVAL گذشته باشد؛ خطای کش درخواست را خراب نمی‌کند"""
+        if not self.flush_due():
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"⚠️ ارسال متریک‌ها به کش مشترک ناموفق بود: {e}")
+
+
+def series_digest(key):
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+
+
+def shared_incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # کلید بدون انقضا ساخته می‌شود (Redis با volatile-lru کلیدهای بدون TTL را حذف نمی‌کند)
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def shared_registry():
+    """registry ساخته‌شده از مجموع مشترک همه پروسه‌ها (برای /metrics/)"""
+    index = cache.get(SHARED_INDEX_KEY) or {}
+    fields = {
+        digest: 1 if meta['kind'] == 'counter' else len(meta['buckets']) + 3
+        for digest, meta in index.items()
+    }
+    values = cache.get_many([f"{SHARED_PREFIX}{digest}:{field}" for digest, count in fields.items() for field in range(count)])
+
+    shared = MetricsRegistry()
+    for digest, meta in index.items():
+        current = [values.get(f"{SHARED_PREFIX}{digest}:{field}", 0) for field in range(fields[digest])]
+        labels = dict(meta['labels'])
+        if meta['kind'] == 'counter':
+            shared.counter(meta['name'], **labels).value = current[0]
+        else:
+            histogram = shared.histogram(meta['name'], buckets=meta['buckets'], **labels)
+            histogram.counts = current[:-2]
+            histogram.sum = current[-2] / SUM_SCALE
+            histogram.count = current[-1]
+    return shared
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _bound(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+def render_prometheus(metrics=None):
+    """خروجی متنی همه متریک‌ها در قالب exposition پرومتئوس (text/plain; version=0.0.4)"""
+    metrics = metrics or registry
+    lines = []
+    by_name = {}
+    for (name, labels), counter in sorted(metrics.counters().items()):
+        by_name.setdefault(name, []).append((labels, counter))
+    for name, series in by_name.items():
+        lines.append(f'# TYPE {name} counter')
+        lines.extend(f'{name}{_labels(labels)} {counter.value}' for labels, counter in series)
+
+    by_name = {}
+    for (name, labels), histogram in sorted(metrics.histograms().items()):
+        by_name.setdefault(name, []).append((labels, histogram.snapshot()))
+    for name, series in by_name.items():
+        lines.append(f'# TYPE {name} histogram')
+        for labels, snapshot in series:
+            lines.extend(
+                f'{name}_bucket{_labels(labels, le=_bound(bound))} {count}' for bound, count in snapshot['buckets']
+            )
+            lines.append(f'{name}_sum{_labels(labels)} {snapshot["sum"]}')
+            lines.append(f'{name}_count{_labels(labels)} {snapshot["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,32 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class TimeCursorPagination(CursorPagination):
+    """
+    صفحه‌بندی keyset روی ستون زمانی ایندکس‌شده: هر صفحه یک کوئری WHERE ... < cursor ORDER BY ... LIMIT است
+    و برخلاف OFFSET هزینه آن با بزرگ شدن جدول ثابت می‌ماند. id ترتیب ردیف‌های هم‌زمان را قطعی می‌کند.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class UploadedAtCursorPagination(TimeCursorPagination):
+    ordering = ('-uploaded_at', '-id')
+
+
+class WateredAtCursorPagination(TimeCursorPagination):
+    ordering = ('-watered_at', '-id')
+
+
+class StartAtCursorPagination(TimeCursorPagination):
+    ordering = ('-start_at', '-id')
+
+
+def paginate(view, request, queryset, pagination_class=TimeCursorPagination):
+    """صفحه‌بندی برای APIViewهای ساده که پاسخ را با کلید مخصوص خود برمی‌گردانند؛ خروجی: (ردیف‌ها، لینک‌ها)"""
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    return page, {'next': paginator.get_next_link(), 'previous': paginator.get_previous_link()}
@@ -0,0 +1,203 @@
+import contextlib
+import functools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_LATENCY_METRIC = 'outbound_http_request_seconds'
+REQUESTS_METRIC = 'http_requests_total'
+REQUEST_DURATION_METRIC = 'http_request_duration_seconds'
+DB_QUERIES_METRIC = 'http_request_db_queries'
+DB_DURATION_METRIC = 'http_request_db_seconds'
+OUTBOUND_DURATION_METRIC = 'http_request_outbound_seconds'
+RESPONSE_SIZE_METRIC = 'http_response_size_bytes'
+N_PLUS_ONE_METRIC = 'http_n_plus_one_total'
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+RESPONSE_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UNMATCHED_ENDPOINT = 'unmatched'
+
+_current = ContextVar('request_profile', default=None)
+# هر الگوی N+1 در هر endpoint فقط یک بار در لاگ این پروسه نوشته می‌شود
+_reported_n_plus_one = set()
+_reported_lock = threading.Lock()
+
+
+class RequestProfile:
+    """
+    اطلاعات یک درخواست نمونه‌برداری‌شده: تعداد و زمان کوئری‌ها، زمان فراخوانی سرویس‌های بیرونی و
+    تعداد تکرار هر متن SQL. SQL جنگو پارامتری است؛ متن یکسان یعنی همان کوئری با مقادیر مختلف.
+    """
+    __slots__ = ('queries', 'db_seconds', 'outbound_seconds', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.outbound_seconds = 0.0
+        self.statements = Counter()
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[sql] += 1
+
+    def repeated_statements(self, threshold):
+        return [(sql, count) for sql, count in self.statements.items() if count >= threshold]
+
+
+def current_profile():
+    return _current.get()
+
+
+def record_outbound(seconds):
+    profile = _current.get()
+    if profile is not None:
+        profile.outbound_seconds += seconds
+
+
+@contextlib.contextmanager
+def outbound_timer(host):
+    """زمان‌گیری فراخوانی سرویس بیرونی که از http_client عبور نمی‌کند (مثل Firebase Admin SDK)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.histogram(OUTBOUND_LATENCY_METRIC, host=host).observe(elapsed)
+        record_outbound(elapsed)
+
+
+def timed_outbound(host):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with outbound_timer(host):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def query_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_wrapper(sender=None, connection=None, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None and match.route else UNMATCHED_ENDPOINT
+
+
+def response_size(response):
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+class ProfilingMiddleware:
+    """
+    اندازه‌گیری هر درخواست به تفکیک endpoint (الگوی URL): زمان کل و تعداد درخواست‌ها برای همه درخواست‌ها و
+    برای نمونه‌ای با نرخ PROFILING_SAMPLE_RATE تعداد و زمان کوئری‌ها، زمان سرویس‌های بیرونی (Plant.id، Gemini، FCM)
+    و حجم پاسخ. کوئری‌های تکراری بیش از PROFILING_N_PLUS_ONE_THRESHOLD بار به عنوان N+1 گزارش می‌شوند.
+    درخواست‌های نمونه‌برداری‌نشده فقط یک perf_counter و یک ContextVar.get در هر کوئری هزینه دارند.
+    در پاسخ‌های streaming فقط کار انجام‌شده تا بازگشت view اندازه‌گیری می‌شود.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_wrapper, dispatch_uid='utils.profiling.install_query_wrapper')
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+
+        profile, token = self.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                _current.reset(token)
+        self.finish(request, response, time.perf_counter() - started, profile)
+        registry.maybe_flush()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return await self.get_response(request)
+
+        profile, token = self.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                _current.reset(token)
+        self.finish(request, response, time.perf_counter() - started, profile)
+        if registry.flush_due():
+            await sync_to_async(registry.maybe_flush)()
+        return response
+
+    @staticmethod
+    def start():
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return None, None
+        profile = RequestProfile()
+        return profile, _current.set(profile)
+
+    @staticmethod
+    def finish(request, response, seconds, profile):
+        labels = {'endpoint': endpoint_name(request), 'method': request.method}
+        registry.histogram(REQUEST_DURATION_METRIC, **labels).observe(seconds)
+        registry.counter(REQUESTS_METRIC, status=f'{response.status_code // 100}xx', **labels).inc()
+        if profile is None:
+            return
+
+        registry.histogram(DB_QUERIES_METRIC, QUERY_COUNT_BUCKETS, **labels).observe(profile.queries)
+        registry.histogram(DB_DURATION_METRIC, **labels).observe(profile.db_seconds)
+        registry.histogram(OUTBOUND_DURATION_METRIC, **labels).observe(profile.outbound_seconds)
+        size = response_size(response)
+        if size is not None:
+            registry.histogram(RESPONSE_SIZE_METRIC, RESPONSE_SIZE_BUCKETS, **labels).observe(size)
+
+        for sql, count in profile.repeated_statements(settings.PROFILING_N_PLUS_ONE_THRESHOLD):
+            registry.counter(N_PLUS_ONE_METRIC, **labels).inc()
+            key = (labels['endpoint'], labels['method'], sql)
+            with _reported_lock:
+                if key in _reported_n_plus_one:
+                    continue
+                _reported_n_plus_one.add(key)
+            logger.warning(
+                f"🔁 N+1 احتمالی در {labels['method']} {labels['endpoint']}: {count} بار اجرای کوئری یکسان: {sql[:300]}"
+            )
@@ -0,0 +1,108 @@
+import json
+import re
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# خط‌های EXPLAIN QUERY PLAN در SQLite؛ «SCAN جدول» بدون USING یعنی خواندن کل جدول
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?P<table>\S+)(?! USING)(?:\s|$)')
+
+
+def view_queryset(view_class, user, **kwargs):
+    """
+    QuerySet خود view (همان get_queryset) با ترتیب و اندازه صفحه cursor pagination آن، برای کاربر user و
+    kwargs مسیر؛ تغییر فیلتر view مستقیماً در تست برنامه اجرا دیده می‌شود.
+    """
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from utils.pagination import TimeCursorPagination
+
+    request = Request(APIRequestFactory().get('/'))
+    request.user = user
+    view = view_class(request=request, args=(), kwargs=kwargs, format_kwarg=None)
+    pagination_class = getattr(view, 'pagination_class', None) or TimeCursorPagination
+    return view.get_queryset().order_by(*pagination_class.ordering)[:pagination_class.page_size]
+
+
+def hot_queries(user_id, plant_id):
+    """
+    کوئری‌های پرتکرار API و تسک‌ها که باید همیشه از ایندکس استفاده کنند. همه از همان view یا تابع کمکی ساخته
+    می‌شوند که کد اصلی استفاده می‌کند؛ فقط برش دسته و قفل ردیف‌ها (select_for_update) اضافه نمی‌شود.
+    برای sweep یادآوری ترتیب id حذف شده است: planner می‌تواند کل کلید اصلی را به ترتیب بپیماید و فیلتر را روی
+    هر ردیف اعمال کند که در EXPLAIN شبیه استفاده از ایندکس است ولی در عمل خواندن کل جدول است.
+    """
+    from django.contrib.auth import get_user_model
+    from notifications.tasks import active_devices, due_broadcasts, due_plants
+    from plants.services.watering_prediction import manual_logs
+    from plants.views import PlantDiagnosisListView, PlantListCreateView, WateringLogListView
+    from subscription.services.entitlement import active_subscriptions
+    from subscription.services.expiry import expired_subscriptions, expiring_subscriptions
+    from subscription.views import MyNotificationsView, MyPaymentsView
+
+    now = timezone.now()
+    user = get_user_model()(pk=user_id)
+    return {
+        'plant_list': view_queryset(PlantListCreateView, user),
+        'diagnosis_list': view_queryset(PlantDiagnosisListView, user),
+        'watering_logs': view_queryset(WateringLogListView, user, pk=plant_id),
+        'manual_watering_logs': manual_logs(plant_id, plant_id + 500),
+        'due_waterings': due_plants().order_by().values_list('id', flat=True),
+        'active_subscription': active_subscriptions(user_id, now).order_by('-expired_at'),
+        'expired_subscriptions': expired_subscriptions(now),
+        'expiring_subscriptions': (
+            expiring_subscriptions(now, now + timedelta(days=1)).values_list('id', 'user_id', 'plan_id', 'expired_at')
+        ),
+        'active_devices': active_devices().filter(user_id=user_id),
+        'user_payments': view_queryset(MyPaymentsView, user),
+        'user_notifications': view_queryset(MyNotificationsView, user),
+        'broadcast_outbox': due_broadcasts(now)[:50],
+    }
+
+
+def explain(queryset):
+    """
+    برنامه اجرای کوئری به صورت خطوط متنی. در PostgreSQL با enable_seqscan=off اجرا می‌شود تا روی داده کم تست هم
+    فقط وقتی Seq Scan انتخاب شود که هیچ ایندکس قابل‌استفاده‌ای وجود نداشته باشد.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            return list(_postgres_nodes(json.loads(plan) if isinstance(plan, str) else plan))
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        raise NotImplementedError(f"EXPLAIN is not supported for {connection.vendor}")
+
+
+def _postgres_nodes(plan):
+    stack = [entry['Plan'] for entry in plan]
+    while stack:
+        node = stack.pop()
+        relation = f" on {node['Relation Name']}" if 'Relation Name' in node else ''
+        index = f" using {node['Index Name']}" if 'Index Name' in node else ''
+        yield f"{node['Node Type']}{relation}{index}"
+        stack.extend(node.get('Plans', []))
+
+
+def sequential_scans(queryset):
+    """جدول‌هایی که در برنامه اجرای کوئری به طور کامل خوانده می‌شوند"""
+    tables = []
+    for line in explain(queryset):
+        if connection.vendor == 'postgresql':
+            if line.startswith('Seq Scan on '):
+                tables.append(line.split(' on ', 1)[1])
+        else:
+            match = SQLITE_FULL_SCAN.match(line.strip())
+            if match:
+                tables.append(match.group('table'))
+    return tables
+
+
+def analyze():
+    """به‌روزرسانی آمار جداول تا planner تصمیمش را بر اساس داده seed شده بگیرد"""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
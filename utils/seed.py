@@ -0,0 +1,111 @@
+import random
+import zlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+SPECIES = ['monstera', 'ficus', 'cactus', 'pothos', 'aloe vera', 'snake plant', 'fern', 'orchid']
+REGIONS = ['tehran', 'gilan', 'fars', 'khorasan', 'isfahan']
+CATEGORIES = ['fungus', 'pest', 'watering', 'light', 'other']
+
+
+@dataclass
+class SeedVolumes:
+    users: int = 50
+    plants_per_user: int = 5
+    logs_per_plant: int = 6
+    diagnoses_per_plant: int = 1
+    devices_per_user: int = 2
+    payments_per_user: int = 2
+    messages_per_user: int = 5
+
+
+def seed_dataset(volumes=None, prefix='seed', random_seed=42):
+    """
+    تولید داده ساختگی با bulk_create (بدون سیگنال‌ها) برای تست برنامه اجرای کوئری‌ها و بنچمارک:
+    کاربران، گیاهان، لاگ آبیاری، تشخیص، دستگاه FCM، اشتراک، پرداخت و پیام چت.
+    خروجی: شمارش ردیف‌های ساخته‌شده و شناسه کاربران.
+    """
+    from chat.models import Message
+    from notifications.models import FCMDevice
+    from plants.models import Plant, PlantDiagnosis, WateringLog
+    from subscription.models import PaymentHistory, Subscription, SubscriptionPlan
+    from subscription.services.entitlement import sync_users
+    from analytics.services.rollups import rebuild
+
+    volumes = volumes or SeedVolumes()
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    today = date.today()
+    User = get_user_model()
+
+    users = User.objects.bulk_create([
+        User(username=f'{prefix}-user-{i}', phone_number=f'{zlib.crc32(prefix.encode()) % 1000:03d}{i:08d}')
+        for i in range(volumes.users)
+    ])
+    plans = SubscriptionPlan.objects.bulk_create([
+        SubscriptionPlan(name=f'{prefix} {days} days', price=days * 1000, duration_days=days) for days in (30, 90, 365)
+    ])
+
+    plants = []
+    for user in users:
+        for i in range(volumes.plants_per_user):
+            # هر گیاه در نقطه‌ای تصادفی از چرخه آبیاری خود است؛ فقط بخش کوچکی امروز سررسید دارند
+            frequency = rng.randint(3, 14)
+            last_watered = today - timedelta(days=rng.randint(0, frequency))
+            plants.append(Plant(
+                user=user, name=f'{prefix} plant {i}', species=rng.choice(SPECIES), image='plants/seed.png',
+                watering_frequency=frequency, last_watered=last_watered,
+                next_watering=last_watered + timedelta(days=frequency), is_active=rng.random() > 0.05,
+            ))
+    plants = Plant.objects.bulk_create(plants)
+    # watered_at با auto_now_add پر می‌شود؛ تاریخ‌های گذشته با bulk_update نوشته می‌شوند
+    logs = WateringLog.objects.bulk_create([
+        WateringLog(plant=plant, source=WateringLog.SOURCE_MANUAL if rng.random() > 0.3 else WateringLog.SOURCE_REMINDER)
+        for plant in plants for _ in range(volumes.logs_per_plant)
+    ])
+    for log in logs:
+        log.watered_at = now - timedelta(days=rng.uniform(0, 120))
+    WateringLog.objects.bulk_update(logs, ['watered_at'], batch_size=2000)
+
+    diagnoses = PlantDiagnosis.objects.bulk_create([
+        PlantDiagnosis(plant=plant, image='diagnoses/seed.png', diagnosis='seed', care_instructions='-',
+                       category=rng.choice(CATEGORIES), confidence=rng.random())
+        for plant in plants for _ in range(volumes.diagnoses_per_plant)
+    ])
+    devices = FCMDevice.objects.bulk_create([
+        FCMDevice(user=user, registration_id=f'{prefix}-token-{user.id}-{d}-{"x" * 20}',
+                  region=rng.choice(REGIONS), is_active=rng.random() > 0.1)
+        for user in users for d in range(volumes.devices_per_user)
+    ])
+    subscriptions = Subscription.objects.bulk_create([
+        Subscription(user=user, plan=plan, start_at=now - timedelta(days=rng.randint(0, 400)),
+                     expired_at=now + timedelta(days=rng.randint(-60, 300)), is_active=rng.random() > 0.3)
+        for user in users for plan in [rng.choice(plans)]
+    ])
+    # bulk_create سیگنال ندارد؛ وضعیت اشتراک denormalized کاربران با یک UPDATE همگام می‌شود
+    sync_users([user.id for user in users])
+    payments = PaymentHistory.objects.bulk_create([
+        PaymentHistory(user=user, plan=plan, amount=plan.price, is_successful=rng.random() > 0.1)
+        for user in users for plan in rng.sample(plans, k=min(volumes.payments_per_user, len(plans)))
+    ])
+    messages = Message.objects.bulk_create([
+        Message(user=user, text=f'{prefix} question {i}', response=f'{prefix} answer {i}')
+        for user in users for i in range(volumes.messages_per_user)
+    ])
+    # شاخص‌های روزانه هم با سیگنال به‌روز نشده‌اند؛ روز جاری از جدول‌های اصلی بازسازی می‌شود
+    rebuild(timezone.localdate(), timezone.localdate())
+
+    return {
+        'user_ids': [user.id for user in users],
+        'users': len(users),
+        'plants': len(plants),
+        'watering_logs': len(logs),
+        'diagnoses': len(diagnoses),
+        'devices': len(devices),
+        'subscriptions': len(subscriptions),
+        'payments': len(payments),
+        'messages': len(messages),
+    }
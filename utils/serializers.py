@@ -0,0 +1,36 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+
+
+def requested_fields(request):
+    """مجموعه فیلدهای درخواست‌شده در ?fields=id,name (فقط درخواست‌های خواندنی) یا None"""
+    if request is None or request.method not in SAFE_METHODS or not hasattr(request, 'query_params'):
+        return None
+    value = request.query_params.get(FIELDS_PARAM, '')
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    return fields or None
+
+
+class SparseFieldsetMixin:
+    """
+    ?fields=id,name فقط فیلدهای خواسته‌شده را سریال می‌کند (فقط در سطح اول؛ سریالایزرهای تو در تو کامل می‌مانند).
+    نام فیلد ناشناخته خطای 400 می‌دهد. views می‌توانند با wants_field از prefetch و join غیرلازم صرف‌نظر کنند.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is None:
+            return
+        unknown = fields - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({FIELDS_PARAM: f"فیلدهای نامعتبر: {', '.join(sorted(unknown))}"})
+        for name in set(self.fields) - fields:
+            self.fields.pop(name)
+
+    @staticmethod
+    def wants_field(request, name):
+        fields = requested_fields(request)
+        return fields is None or name in fields
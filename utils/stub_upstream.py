@@ -0,0 +1,112 @@
+import asyncio
+import json
+import threading
+
+
+class StubUpstream:
+    """
+    سرور HTTP/1.1 بسیار ساده روی localhost برای بنچمارک و تست؛ نقش Gemini یا Plant.id را بازی می‌کند.
+    هر درخواست پس از delay ثانیه با response_body (JSON) پاسخ داده می‌شود و اتصال keep-alive می‌ماند.
+    اگر chunks داده شود پاسخ به صورت chunked (مثل SSE) و هر بخش با delay ثانیه فاصله ارسال می‌شود.
+
+        with StubUpstream(delay=0.2) as upstream:
+            http_client.post(upstream.url, json={})
+    """
+
+    def __init__(self, delay=0.2, response_body=None, chunks=None, host='127.0.0.1', port=0):
+        self.delay = delay
+        self.chunks = [chunk.encode() if isinstance(chunk, str) else chunk for chunk in chunks or []]
+        self.response_body = json.dumps(response_body if response_body is not None else {}).encode()
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                headers = {}
+                for line in head.decode('latin-1').split('\r\n')[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                await self._read_body(reader, headers)
+
+                self.requests += 1
+                if self.chunks:
+                    await self._write_chunks(writer)
+                    continue
+                await asyncio.sleep(self.delay)
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    + f'Content-Length: {len(self.response_body)}\r\n\r\n'.encode()
+                    + self.response_body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_chunks(self, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            writer.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    @staticmethod
+    async def _read_body(reader, headers):
+        if 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+            return
+        if headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    return
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,122 @@
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .benchmark import summarize, uncovered_routes
+from .http_client import OutboundClient
+from .metrics import MetricsRegistry, registry, shared_registry
+from .profiling import (
+    DB_QUERIES_METRIC, N_PLUS_ONE_METRIC, REQUESTS_METRIC, UNMATCHED_ENDPOINT, ProfilingMiddleware,
+)
+from .query_plans import analyze, explain, hot_queries, sequential_scans
+from .seed import SeedVolumes, seed_dataset
+
+
+class QueryPlanRegressionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from plants.models import Plant
+
+        seeded = seed_dataset(SeedVolumes(users=40, plants_per_user=5, logs_per_plant=4), prefix='plans')
+        cls.user_id = seeded['user_ids'][0]
+        cls.plant_id = Plant.objects.filter(user_id=cls.user_id).values_list('id', flat=True).first()
+        analyze()
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in hot_queries(self.user_id, self.plant_id).items():
+            with self.subTest(query=name):
+                self.assertEqual(sequential_scans(queryset), [], '\n'.join(explain(queryset)))
+
+
+class BenchmarkSuiteTest(SimpleTestCase):
+    def test_every_project_route_has_a_scenario(self):
+        self.assertEqual(uncovered_routes(), [])
+
+    def test_summary_reports_percentiles_and_queries_per_endpoint(self):
+        samples = [('plant_list', 200, i / 1000, 2) for i in range(1, 101)] + [('chat_ask', 'error: ConnectError', 0.5, 1)]
+        result = summarize(samples, wall_seconds=10)
+
+        plant_list = result['endpoints']['plant_list']
+        self.assertEqual((plant_list['p50_ms'], plant_list['p95_ms'], plant_list['p99_ms']), (50.0, 95.0, 99.0))
+        self.assertEqual(plant_list['queries_mean'], 2)
+        self.assertEqual(result['endpoints']['chat_ask']['errors'], 1)
+        self.assertEqual(result['total']['requests'], 101)
+        self.assertEqual(result['total']['rps'], 10.1)
+
+
+class OutboundClientTest(SimpleTestCase):
+    def test_per_call_timeout_only_overrides_read(self):
+        client = OutboundClient('example.com', connect_timeout=2, read_timeout=9)
+        kwargs = {}
+        client.apply_timeout(None, kwargs)
+        self.assertEqual(kwargs, {})
+        client.apply_timeout(4, kwargs)
+        self.assertEqual(kwargs['timeout'], httpx.Timeout(connect=2, read=4, write=9, pool=2))
+        client.close()
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_N_PLUS_ONE_THRESHOLD=5)
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        registry.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='profiled', password='pass', phone_number='09120000091')
+
+    def test_sampled_request_records_queries_per_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/plants/plants/').status_code, 200)
+
+        labels = (('endpoint', 'plants/plants/'), ('method', 'GET'))
+        queries = registry.histograms(DB_QUERIES_METRIC)[(DB_QUERIES_METRIC, labels)].snapshot()
+        self.assertEqual(queries['count'], 1)
+        self.assertGreaterEqual(queries['sum'], 1)
+        self.assertEqual(registry.counters(REQUESTS_METRIC)[(REQUESTS_METRIC, labels + (('status', '2xx'),))].value, 1)
+
+    def test_repeated_identical_queries_are_reported_as_n_plus_one(self):
+        User = get_user_model()
+
+        def view(request):
+            for _ in range(6):
+                User.objects.filter(pk=self.user.pk).exists()
+            return HttpResponse('ok')
+
+        middleware = ProfilingMiddleware(view)
+        with self.assertLogs('utils.profiling', level='WARNING') as logs:
+            middleware(RequestFactory().get('/n-plus-one/'))
+
+        self.assertIn('N+1', logs.output[0])
+        labels = (('endpoint', UNMATCHED_ENDPOINT), ('method', 'GET'))
+        self.assertEqual(registry.counters(N_PLUS_ONE_METRIC)[(N_PLUS_ONE_METRIC, labels)].value, 1)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint_requires_token_and_renders_prometheus_text(self):
+        self.client.get('/subscription/plans/')
+
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_requests_total{endpoint="subscription/plans/",method="GET",status="2xx"} 1', body)
+
+    def test_scrape_sums_every_process_through_shared_cache(self):
+        other = MetricsRegistry()
+        labels = {'endpoint': 'plants/plants/', 'method': 'GET'}
+        other.counter(REQUESTS_METRIC, status='2xx', **labels).inc(2)
+        other.histogram(DB_QUERIES_METRIC, **labels).observe(0.2)
+        other.flush()
+        registry.counter(REQUESTS_METRIC, status='2xx', **labels).inc()
+        registry.flush()
+        other.counter(REQUESTS_METRIC, status='2xx', **labels).inc()
+        other.flush()
+
+        shared = shared_registry()
+        key = tuple(sorted(labels.items()))
+        self.assertEqual(shared.counters(REQUESTS_METRIC)[(REQUESTS_METRIC, key + (('status', '2xx'),))].value, 4)
+        queries = shared.histograms(DB_QUERIES_METRIC)[(DB_QUERIES_METRIC, key)].snapshot()
+        self.assertEqual(queries['count'], 1)
+        self.assertAlmostEqual(queries['sum'], 0.2)
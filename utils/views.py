@@ -0,0 +1,26 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from .metrics import registry, render_prometheus, shared_registry
+
+
+@require_GET
+def metrics_view(request):
+    """
+    مجموع متریک‌های همه پروسه‌ها (از کش مشترک) در قالب Prometheus؛ افزایش‌های همین پروسه پیش از خواندن flush
+    می‌شوند و پروسه‌های دیگر حداکثر METRICS_FLUSH_INTERVAL ثانیه عقب هستند. با METRICS_TOKEN دسترسی با هدر
+    Authorization: Bearer <token> است (برای scraper)؛ بدون آن فقط کاربر staff با session ادمین.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    allowed = (
+        hmac.compare_digest(authorization, f'Bearer {token}') if token
+        else request.user.is_authenticated and request.user.is_staff
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    registry.flush()
+    return HttpResponse(render_prometheus(shared_registry()), content_type='text/plain; version=0.0.4; charset=utf-8')